@@ -1,23 +1,226 @@
 
 
 from fastapi import FastAPI, HTTPException, Request, Depends, File, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 import httpx
 import logging
 import hmac
 import hashlib
+import os
+import uuid
+import time
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
-import ast
-import javalang
+import contextvars
 from typing import List, Dict
 import re
-from crewai import Agent, Task, Crew, LLM
 from urllib.parse import urlparse
+from review_queue import ReviewJobQueue
+from llm_pool import LLMExecutor
+from review_backends import ReviewBackend, create_review_backend, review_task
+from llm_router import LLMRouter
+from github_client import GitHubClient, BlobCache, RateLimitExceeded
+from review_cache import ReviewCache, review_cache_key
+from diff_ranges import changed_line_ranges, select_changed_chunks
+from python_chunker import split_python_code
+from java_chunker import split_java_code
+from tree_sitter_chunker import TreeSitterChunker, GRAMMARS
+from chunk_packing import pack_chunks, unpack_reviews, estimate_tokens
+from webhook_ingest import loads, push_job_from_payload
+from config_store import CachedConfigStore, create_config_store
+from report_builder import ReviewReport, file_section, review_title, unchanged_file_section
+from review_rules import analyze_chunks, format_findings
+import metrics
 
-app = FastAPI()
+# Review job queue settings
+REVIEW_QUEUE_DB = os.getenv("REVIEW_QUEUE_DB", "review_jobs.db")
+IN_PROCESS_WORKERS = int(os.getenv("IN_PROCESS_WORKERS", "1"))  # 0 = only separate worker.py processes drain the queue
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+QUEUE_POLL_INTERVAL = float(os.getenv("QUEUE_POLL_INTERVAL", "1.0"))
+UNCONFIGURED_RETRY_DELAY = float(os.getenv("UNCONFIGURED_RETRY_DELAY", "60"))
+# How often a worker checks whether a newer push superseded the job it is running
+SUPERSEDE_CHECK_INTERVAL = float(os.getenv("SUPERSEDE_CHECK_INTERVAL", "2.0"))
+# Finished jobs, and the delivery IDs deduplicated through them, are deleted after this long;
+# keep it above GitHub's 3-day redelivery window. Checked every JOB_SWEEP_EVERY claims (idle polls count)
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+JOB_SWEEP_EVERY = int(os.getenv("JOB_SWEEP_EVERY", "1000"))
 
-webhook_configs = {}
+review_queue = ReviewJobQueue(
+    REVIEW_QUEUE_DB,
+    max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+    retention_seconds=JOB_RETENTION_SECONDS,
+    sweep_every=JOB_SWEEP_EVERY,
+)
+# The queued job being processed in this task ({"id", "worker", "progress"}), None outside a worker
+current_job: contextvars.ContextVar = contextvars.ContextVar("current_job", default=None)
+
+# Review model backend: "ollama" calls /api/chat natively, "crewai" runs crews on the LLM pool
+REVIEW_BACKEND = os.getenv("REVIEW_BACKEND", "ollama")
+LLM_MODEL = os.getenv("LLM_MODEL", "ollama/codellama")
+# Comma-separated; the ollama backend routes calls across all of them
+OLLAMA_URLS = [url.strip() for url in os.getenv("OLLAMA_URLS", os.getenv("OLLAMA_URL", "http://127.0.0.1:11434")).split(",") if url.strip()]
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))
+OLLAMA_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", "512"))
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "300"))
+# Per-endpoint adaptive concurrency and health checking
+LLM_ENDPOINT_INITIAL_LIMIT = int(os.getenv("LLM_ENDPOINT_INITIAL_LIMIT", "4"))
+LLM_ENDPOINT_MAX_LIMIT = int(os.getenv("LLM_ENDPOINT_MAX_LIMIT", "16"))
+LLM_LATENCY_TOLERANCE = float(os.getenv("LLM_LATENCY_TOLERANCE", "2.0"))
+LLM_EJECTION_FAILURES = int(os.getenv("LLM_EJECTION_FAILURES", "3"))
+LLM_EJECTION_SECONDS = float(os.getenv("LLM_EJECTION_SECONDS", "30"))
+LLM_HEALTH_INTERVAL = float(os.getenv("LLM_HEALTH_INTERVAL", "10"))
+review_backend: ReviewBackend = None
+
+# Blocking LLM calls (CrewAI backend) run on this pool, never on the event loop
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "4"))
+llm_executor = LLMExecutor(LLM_POOL_SIZE)
+
+# Caps on concurrent review calls, per file and across all files being reviewed
+REVIEW_FILE_CONCURRENCY = int(os.getenv("REVIEW_FILE_CONCURRENCY", "4"))
+# With the router, per-endpoint limits do the real throttling, so the global cap defaults to their maximum
+REVIEW_GLOBAL_CONCURRENCY = int(os.getenv(
+    "REVIEW_GLOBAL_CONCURRENCY",
+    str(LLM_POOL_SIZE if REVIEW_BACKEND == "crewai" else LLM_ENDPOINT_MAX_LIMIT * len(OLLAMA_URLS))
+))
+review_global_semaphore = asyncio.Semaphore(REVIEW_GLOBAL_CONCURRENCY)
+
+# Estimated-token budget per detailed review call; small chunks are packed up to it, larger ones split
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "1500"))
+# Review classes from their skeleton so each method body is only sent once
+HIERARCHICAL_CLASS_REVIEW = os.getenv("HIERARCHICAL_CLASS_REVIEW", "1") == "1"
+# Files estimated above this many tokens get a map-reduce high-level review instead of one call
+HIGH_LEVEL_MAX_TOKENS = int(os.getenv("HIGH_LEVEL_MAX_TOKENS", "3000"))
+# Local static checks before the model: trivial chunks are marked Good without a call and
+# deterministic findings go into the prompts and the report
+STATIC_PREFILTER = os.getenv("STATIC_PREFILTER", "1") == "1"
+STATIC_RULES_DISABLED = [name.strip() for name in os.getenv("STATIC_RULES_DISABLED", "").split(",") if name.strip()]
+# Tree-sitter chunking for Python, Java, JavaScript and TypeScript when tree_sitter and the grammar
+# packages are installed; "0" keeps the ast/javalang chunkers and reviews only .py and .java files.
+# The last tree of up to TREE_SITTER_MAX_TREES files is kept for incremental reparsing
+TREE_SITTER_CHUNKER = os.getenv("TREE_SITTER_CHUNKER", "1") == "1"
+TREE_SITTER_MAX_TREES = int(os.getenv("TREE_SITTER_MAX_TREES", "256"))
+tree_chunker = TreeSitterChunker(TREE_SITTER_MAX_TREES) if TREE_SITTER_CHUNKER and GRAMMARS else None
+REVIEWABLE_EXTENSIONS = tuple(sorted({".py", ".java", *(tree_chunker.extensions() if tree_chunker else ())}))
+
+# Shared GitHub API client, created in the lifespan hooks
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+GITHUB_MAX_CONNECTIONS = int(os.getenv("GITHUB_MAX_CONNECTIONS", "20"))
+GITHUB_MAX_KEEPALIVE = int(os.getenv("GITHUB_MAX_KEEPALIVE", "10"))
+GITHUB_TIMEOUT = float(os.getenv("GITHUB_TIMEOUT", "30"))
+GITHUB_MAX_RETRIES = int(os.getenv("GITHUB_MAX_RETRIES", "3"))
+GITHUB_FETCH_CONCURRENCY = int(os.getenv("GITHUB_FETCH_CONCURRENCY", "8"))
+BLOB_CACHE_MAX_BYTES = int(os.getenv("BLOB_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Rate limiting: waits longer than this defer the job instead of blocking a worker
+GITHUB_MAX_RATE_LIMIT_WAIT = float(os.getenv("GITHUB_MAX_RATE_LIMIT_WAIT", "60"))
+GITHUB_RATE_LIMIT_PACE_BELOW = float(os.getenv("GITHUB_RATE_LIMIT_PACE_BELOW", "0.2"))
+GITHUB_RATE_LIMIT_RESERVE = int(os.getenv("GITHUB_RATE_LIMIT_RESERVE", "20"))
+GITHUB_ETAG_CACHE_MAX_BYTES = int(os.getenv("GITHUB_ETAG_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+github_client = None
+blob_cache = BlobCache(BLOB_CACHE_MAX_BYTES)
+
+# Persistent cache of review outputs keyed by code, prompt version and model
+REVIEW_CACHE_DB = os.getenv("REVIEW_CACHE_DB", "review_cache.db")
+REVIEW_CACHE_MAX_BYTES = int(os.getenv("REVIEW_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+review_cache = ReviewCache(REVIEW_CACHE_DB, REVIEW_CACHE_MAX_BYTES)
+
+# Metrics live in each process's memory. Behind several uvicorn workers (WEB_CONCURRENCY > 1) a
+# scrape lands on a random worker and counters seem to jump or reset, so /metrics is off there by
+# default; run reviews in worker.py processes and scrape each one's --metrics-port instead
+WEB_METRICS = os.getenv("WEB_METRICS", "1" if int(os.getenv("WEB_CONCURRENCY", "1")) <= 1 else "0") == "1"
+
+async def start_github_client():
+    global github_client
+    if github_client is None:
+        github_client = GitHubClient(
+            base_url=GITHUB_API_URL,
+            max_connections=GITHUB_MAX_CONNECTIONS,
+            max_keepalive_connections=GITHUB_MAX_KEEPALIVE,
+            timeout=GITHUB_TIMEOUT,
+            max_retries=GITHUB_MAX_RETRIES,
+            max_rate_limit_wait=GITHUB_MAX_RATE_LIMIT_WAIT,
+            etag_cache_max_bytes=GITHUB_ETAG_CACHE_MAX_BYTES,
+            rate_limit_pace_below=GITHUB_RATE_LIMIT_PACE_BELOW,
+            rate_limit_reserve=GITHUB_RATE_LIMIT_RESERVE,
+        )
+
+async def stop_github_client():
+    global github_client
+    if github_client is not None:
+        await github_client.aclose()
+        github_client = None
+
+async def start_review_backend():
+    global review_backend
+    if review_backend is None:
+        if REVIEW_BACKEND == "crewai":
+            review_backend = create_review_backend(
+                "crewai", executor=llm_executor, model=LLM_MODEL, base_url=f"{OLLAMA_URLS[0]}/api/generate"
+            )
+        else:
+            endpoints = [
+                create_review_backend(
+                    REVIEW_BACKEND,
+                    base_url=url,
+                    model=LLM_MODEL,
+                    keep_alive=OLLAMA_KEEP_ALIVE,
+                    num_ctx=OLLAMA_NUM_CTX,
+                    num_predict=OLLAMA_NUM_PREDICT,
+                    timeout=OLLAMA_TIMEOUT,
+                    max_connections=LLM_ENDPOINT_MAX_LIMIT,
+                )
+                for url in OLLAMA_URLS
+            ]
+            review_backend = LLMRouter(
+                endpoints,
+                initial_limit=LLM_ENDPOINT_INITIAL_LIMIT,
+                max_limit=LLM_ENDPOINT_MAX_LIMIT,
+                latency_tolerance=LLM_LATENCY_TOLERANCE,
+                failure_threshold=LLM_EJECTION_FAILURES,
+                ejection_seconds=LLM_EJECTION_SECONDS,
+                health_interval=LLM_HEALTH_INTERVAL,
+            )
+            review_backend.start()
+        logger.info(f"Using {REVIEW_BACKEND} review backend with model {LLM_MODEL} on {', '.join(OLLAMA_URLS)}")
+
+async def stop_review_backend():
+    global review_backend
+    if review_backend is not None:
+        await review_backend.aclose()
+        review_backend = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_github_client()
+    await start_review_backend()
+    workers = [asyncio.create_task(review_worker(f"app-{os.getpid()}-{i}")) for i in range(IN_PROCESS_WORKERS)]
+    try:
+        yield
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await stop_review_backend()
+        llm_executor.shutdown()
+        await stop_github_client()
+
+app = FastAPI(lifespan=lifespan)
+
+# Webhook configurations, shared by every worker process through the store;
+# lookups are served from an in-process cache
+CONFIG_STORE_URL = os.getenv("CONFIG_STORE_URL", "sqlite:///webhook_configs.db")
+CONFIG_CACHE_TTL = float(os.getenv("CONFIG_CACHE_TTL", "300"))
+CONFIG_CACHE_CHECK_INTERVAL = float(os.getenv("CONFIG_CACHE_CHECK_INTERVAL", "1.0"))
+webhook_configs = CachedConfigStore(
+    create_config_store(CONFIG_STORE_URL),
+    ttl=CONFIG_CACHE_TTL,
+    check_interval=CONFIG_CACHE_CHECK_INTERVAL,
+)
+# Shared secret for the admin endpoints (repository setup, cache invalidation), sent as
+# X-Admin-Token; they are refused while it is unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 
 origins = ["*"]
 app.add_middleware(
@@ -32,15 +235,25 @@ app.add_middleware(
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def verify_webhook_signature(request: Request, body: bytes, repo_url: str):
+def require_admin(request: Request):
     """
-    Verify the GitHub webhook signature to ensure the request is authentic.
+    Dependency for admin endpoints: the request must carry the ADMIN_TOKEN.
     """
-    if repo_url not in webhook_configs:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN")
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+async def verify_webhook_signature(request: Request, body: bytes, repo_url: str) -> Dict:
+    """
+    Verify the GitHub webhook signature to ensure the request is authentic,
+    and return the repository's configuration.
+    """
+    config = await webhook_configs.aget(repo_url)
+    if config is None:
         logger.error(f"Repo URL {repo_url} not found in webhook configurations")
         raise HTTPException(status_code=403, detail="Repository not configured")
     
-    config = webhook_configs[repo_url]
     signature = request.headers.get("X-Hub-Signature-256", "")
     logger.info(f"Received signature: {signature}")
     
@@ -57,224 +270,252 @@ def verify_webhook_signature(request: Request, body: bytes, repo_url: str):
         raise HTTPException(status_code=403, detail="Invalid signature")
     
     logger.info("Signature verification successful")
+    return config
 
-async def fetch_file_content(repo_url: str, file_path: str, access_token: str, branch: str = "main") -> str:
+async def fetch_files_at_commit(repo_url: str, commit_sha: str, file_paths: List[str], access_token: str) -> Dict[str, str]:
     """
-    Fetch the content of a file from GitHub.
+    Fetch several files at an exact commit in one tree lookup plus concurrent,
+    SHA-deduplicated blob downloads. Missing files are absent from the result.
     """
-    # Parse the repo URL to get owner and repo name
     parsed_url = urlparse(repo_url)
     path_parts = parsed_url.path.strip('/').split('/')
     if len(path_parts) < 2:
         raise HTTPException(status_code=400, detail="Invalid GitHub repository URL")
     
     owner, repo = path_parts[0], path_parts[1]
-    file_url = f"https://api.github.com/repos/{owner}/{repo}/contents/{file_path}?ref={branch}"
-    headers = {
-        "Authorization": f"token {access_token}",
-        "Accept": "application/vnd.github.v3.raw"
-    }
-    
-    async with httpx.AsyncClient(verify=False) as client:
-        response = await client.get(file_url, headers=headers)
-        if response.status_code == 200:
-            return response.text
-        else:
-            logger.error(f"Failed to fetch file content: {file_path}. Status code: {response.status_code}")
-            raise HTTPException(status_code=response.status_code, detail="Failed to fetch file content.")
-
-def split_python_code(file_content: str) -> List[Dict]:
-    chunks = []
-    
     try:
-        # Parse the code into an AST
-        tree = ast.parse(file_content)
-        
-        # Capture imports
-        imports = [node for node in ast.walk(tree) if isinstance(node, (ast.Import, ast.ImportFrom))]
-        if imports:
-            import_code = "\n".join(ast.unparse(imp) for imp in imports)
-            chunks.append({
-                "type": "imports",
-                "name": "imports",
-                "code": import_code
-            })
-        
-        # Capture classes, functions, and async functions
-        for node in ast.walk(tree):
-            if isinstance(node, ast.ClassDef):
-                # Capture the entire class, including methods and nested functions
-                class_code = ast.unparse(node)
-                chunks.append({
-                    "type": "class",
-                    "name": node.name,
-                    "code": class_code
-                })
-            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
-                # Capture the function, including its decorators
-                decorators = [ast.unparse(dec) for dec in node.decorator_list]
-                function_code = ast.unparse(node)
-                if decorators:
-                    function_code = "\n".join(decorators) + "\n" + function_code
-                
-                # Check if the function is part of a class
-                parent_class = None
-                for parent in ast.walk(tree):
-                    if isinstance(parent, ast.ClassDef) and node in parent.body:
-                        parent_class = parent.name
-                        break
-                
-                if parent_class:
-                    # Add the function under its class
-                    for chunk in chunks:
-                        if chunk["type"] == "class" and chunk["name"] == parent_class:
-                            if "methods" not in chunk:
-                                chunk["methods"] = []
-                            chunk["methods"].append({
-                                "type": "method",
-                                "name": node.name,
-                                "code": function_code
-                            })
-                            break
-                else:
-                    # Add as a standalone function
-                    chunks.append({
-                        "type": "function",
-                        "name": node.name,
-                        "code": function_code
-                    })
-        
-        # Capture global variables and standalone code
-        global_code = []
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Assign) and not any(isinstance(parent, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)) for parent in ast.walk(tree)):
-                global_code.append(ast.unparse(node))
-        
-        if global_code:
-            chunks.append({
-                "type": "global_code",
-                "name": "global_code",
-                "code": "\n".join(global_code)
-            })
-    
-    except SyntaxError:
-        # Fallback: Split the code into logical blocks
-        chunks.append({
-            "type": "code_block",
-            "name": "full_code",
-            "code": file_content
-        })
-    
-    return chunks
+        with metrics.STAGE_SECONDS.time(("fetch_files", repo_url, "")):
+            return await github_client.fetch_files_at_commit(
+                owner, repo, commit_sha, file_paths, access_token,
+                blob_cache=blob_cache,
+                concurrency=GITHUB_FETCH_CONCURRENCY,
+            )
+    except httpx.HTTPStatusError as e:
+        logger.error(f"Failed to fetch files at {commit_sha[:8]}: {e}")
+        raise HTTPException(status_code=e.response.status_code, detail="Failed to fetch file content.")
 
-def split_java_code(file_content: str) -> List[Dict]:
-    chunks = []
-    lines = file_content.splitlines()
+async def fetch_commit_patches(repo_url: str, commit_sha: str, access_token: str, base_sha: str = None) -> Dict[str, str]:
+    """
+    Fetch the per-file patches of a commit, or of base_sha...commit_sha when a
+    base is given. Returns an empty dict if they are unavailable, in which
+    case callers review whole files.
+    """
+    parsed_url = urlparse(repo_url)
+    path_parts = parsed_url.path.strip('/').split('/')
+    if len(path_parts) < 2:
+        raise HTTPException(status_code=400, detail="Invalid GitHub repository URL")
     
+    owner, repo = path_parts[0], path_parts[1]
     try:
-        # Parse the Java code
-        tree = javalang.parse.parse(file_content)
-        
-        # Capture package and imports first
-        package = getattr(tree, 'package', None)
-        if package:
-            package_code = f"package {package.name};"
-            chunks.append({
-                "type": "package",
-                "name": "package",
-                "code": package_code
-            })
-        
-        imports = getattr(tree, 'imports', [])
-        if imports:
-            import_code = "\n".join(f"import {imp.path};" for imp in imports)
-            chunks.append({
-                "type": "imports",
-                "name": "imports",
-                "code": import_code
-            })
-        
-        # Process class declarations
-        for type_decl in tree.types:
-            if isinstance(type_decl, javalang.tree.ClassDeclaration):
-                class_start = type_decl.position.line - 1
-                class_end = find_closing_brace(lines, class_start)
-                
-                class_code = "\n".join(lines[class_start:class_end+1])
-                methods = []
-                
-                # Process methods
-                for method in type_decl.methods:
-                    method_start = method.position.line - 1
-                    method_end = find_closing_brace(lines, method_start)
-                    
-                    method_code = "\n".join(lines[method_start:method_end+1])
-                    methods.append({
-                        "type": "method",
-                        "name": method.name,
-                        "code": method_code
-                    })
-                
-                chunks.append({
-                    "type": "class",
-                    "name": type_decl.name,
-                    "code": class_code,
-                    "methods": methods
-                })
-                
-    except javalang.parser.javaSyntaxError as e:
-        logger.error(f"Java parsing error: {e}")
-        # Fallback to simple splitting
-        chunks.append({
-            "type": "code_block",
-            "name": "full_code",
-            "code": file_content
-        })
+        with metrics.STAGE_SECONDS.time(("fetch_patches", repo_url, "")):
+            if base_sha:
+                return await github_client.get_compare_patches(owner, repo, base_sha, commit_sha, access_token)
+            return await github_client.get_commit_patches(owner, repo, commit_sha, access_token)
+    except httpx.HTTPError as e:
+        logger.warning(f"Could not fetch patches for {commit_sha[:8]}, reviewing full files: {e}")
+        return {}
+
+# Bump whenever a review prompt changes so cached reviews are not reused
+PROMPT_VERSION = "4"
+
+async def run_backend_task(task: Dict) -> str:
+    """
+    Run a single review task on the configured backend and return its output.
+    """
+    return await review_backend.review(task)
+
+async def run_review_task(file_semaphore: asyncio.Semaphore, task: Dict, kind: str, language: str, code: str) -> str:
+    """
+    Return the cached review for this code if there is one, otherwise run the
+    review task under the per-file and global concurrency caps and cache it.
+    """
+    repo = metrics.repo_label.get()
+    key = review_cache_key(kind, language, code, PROMPT_VERSION, LLM_MODEL)
+    cached = await asyncio.to_thread(review_cache.get, key)
+    if cached is not None:
+        metrics.LLM_CALLS.inc((repo, language, kind, "cached"))
+        return cached
     
-    return chunks
+    waited_from = time.perf_counter()
+    async with file_semaphore:
+        async with review_global_semaphore:
+            started = time.perf_counter()
+            metrics.STAGE_SECONDS.observe(("llm_wait", repo, language), started - waited_from)
+            try:
+                result = await run_backend_task(task)
+            except Exception:
+                metrics.LLM_CALLS.inc((repo, language, kind, "error"))
+                raise
+            metrics.LLM_CALL_SECONDS.observe((repo, language, kind), time.perf_counter() - started)
+    metrics.LLM_CALLS.inc((repo, language, kind, "ok"))
+    usage = task.get("usage") or {}
+    metrics.PROMPT_TOKENS.inc((repo, language), usage.get("prompt_tokens") or estimate_tokens(task["description"]))
+    metrics.COMPLETION_TOKENS.inc((repo, language), usage.get("completion_tokens") or estimate_tokens(str(result)))
+    review = str(result)
+    await asyncio.to_thread(review_cache.put, key, kind, language, PROMPT_VERSION, LLM_MODEL, review)
+    return review
 
-def find_closing_brace(lines: List[str], start_line: int) -> int:
+def review_language(file_name: str) -> str:
     """
-    Find the closing brace for a code block starting at start_line.
+    Language name of a reviewable file, used in prompts and metric labels.
     """
-    brace_count = 0
-    for i in range(start_line, len(lines)):
-        line = lines[i]
-        brace_count += line.count('{') - line.count('}')
-        if brace_count <= 0:
-            return i
-    return len(lines) - 1
+    if tree_chunker is not None and tree_chunker.language_for(file_name):
+        return tree_chunker.language_for(file_name)
+    return "python" if file_name.endswith(".py") else "java"
 
-llm = LLM(model="ollama/codellama", base_url="http://127.0.0.1:11434/api/generate")
+def review_format(language: str) -> str:
+    return f"""1. [STATUS] Good/Needs Fix
+                2. [ISSUES] (if any):
+                   - Type: [BUG/PERF/READ]
+                   - Where: line X
+                   - Severity: [H/M/L]
+                   - Fix: (1 line)
+                   ```{language}
+                   [CORRECTED CODE] (if needed)
+                   ```
+                3. [SUMMARY] (1 line)"""
 
-high_level_review_agent = Agent(
-    role="Code Review Expert",
-    goal="Perform a concise high-level review of the entire codebase, highlighting only critical issues.",
-    backstory="You are an experienced software engineer with expertise in code reviews.",
-    tools=[],
-    verbose=True,
-    llm=llm  
-)
+def static_findings_note(findings: List[Dict]) -> str:
+    if not findings:
+        return ""
+    return f"""
+                Static checks already found these issues; confirm each in [ISSUES] and look for others:
+                {format_findings(findings)}
+                """
 
-detailed_review_agent = Agent(
-    role="Code Enhancement Expert",
-    goal="Quickly identify and highlight code issues with specific, actionable suggestions.",
-    backstory="You are a code optimization specialist with a focus on improving code quality.",
-    tools=[],
-    verbose=True,
-    llm=llm  
-)
+def build_review_task(language: str, unit: Dict, findings: List[Dict] = None) -> Dict:
+    """
+    Build the detailed review task for a packed unit: a single chunk or method,
+    one part of an oversized one, or a group of small ones. Static check
+    findings for the unit, if any, are listed for the model to confirm.
+    """
+    note = static_findings_note(findings)
+    if len(unit["members"]) > 1:
+        description = f"""
+                STRICTLY review each of these {language} units separately. Each unit starts with a `### [n] kind name` line;
+                in a skeleton, method bodies are replaced by `...` and reviewed separately:
+                {unit['code']}
+                {note}
+                For EACH unit, repeat its `### [n] kind name` line, then respond ONLY in this format:
+                {review_format(language)}
+                """
+    elif unit['type'].endswith(" skeleton"):
+        description = f"""
+                STRICTLY review the structure of this {language} {unit['type']}. Method bodies are
+                replaced by `...` and reviewed separately; focus on the declaration, fields,
+                signatures and overall design:
+                {unit['code']}
+                {note}
+                Respond ONLY in this format:
+                {review_format(language)}
+                """
+    else:
+        description = f"""
+                STRICTLY review this {language} {unit['type']}:
+                {unit['code']}
+                {note}
+                Respond ONLY in this format:
+                {review_format(language)}
+                """
+    return review_task("detailed", description, f"Strictly formatted review of {unit['type']} {unit['name']}")
+
+HIGH_LEVEL_FORMAT = """1. [OVERVIEW] (1 sentence)
+                            2. [CRITICAL] (ONLY if issues exist)
+                               - [ISSUE] Description (severity: HIGH/MEDIUM)
+                               - [FIX] Brief suggestion
+                            3. [VERDICT] ✅ Good/⚠️ Needs Attention"""
+
+# Stand-in reviews for code the static checks found trivial
+TRIVIAL_REVIEW = """1. [STATUS] Good
+3. [SUMMARY] Trivial code (accessor, plain assignments or declarations); passed static checks, not sent to the model."""
+TRIVIAL_FILE_REVIEW = """1. [OVERVIEW] Only trivial code (accessors, plain assignments, declarations and imports); not sent to the model.
+3. [VERDICT] ✅ Good"""
+# In diff mode only the changed chunks were checked, so nothing is claimed about the rest of the file
+TRIVIAL_CHANGES_REVIEW = """1. [OVERVIEW] Only trivial changes (accessors, plain assignments, declarations and imports); not sent to the model.
+3. [VERDICT] ✅ Good"""
+
+DIGEST_LINE = re.compile(r"\[(STATUS|SUMMARY)\]|Type:|Severity:\s*\[?H|Where:|Fix:", re.IGNORECASE)
+
+def summarize_review(review: str, max_chars: int = 400) -> str:
+    """
+    Condense a detailed review to its status, summary and issue lines.
+    """
+    lines = [line.strip() for line in str(review).splitlines() if DIGEST_LINE.search(line)]
+    digest = " | ".join(lines) if lines else " ".join(str(review).split())
+    return digest[:max_chars]
+
+async def reduce_high_level_review(file_semaphore: asyncio.Semaphore, language: str, file_name: str,
+                                   chunks: List[Dict], detailed_reviews: List[Dict]) -> str:
+    """
+    Map-reduce high-level review for large files. The detailed chunk and method
+    reviews are the map step; their digests are batched under the token budget
+    and reduced, level by level, into the OVERVIEW/CRITICAL/VERDICT review, so no
+    single call has to read the whole file.
+    """
+    digests = []
+    for chunk, review in zip(chunks, detailed_reviews):
+        location = f" (lines {chunk['start_line']}-{chunk['end_line']})" if chunk.get("start_line") else ""
+        digests.append(f"- {chunk['type']} {chunk['name']}{location}: {summarize_review(review['review'])}")
+        for method in review.get("method_reviews") or []:
+            digests.append(f"  - method {method['method']}: {summarize_review(method['review'])}")
+    
+    level = 0
+    while True:
+        batches = [[]]
+        batch_tokens = 0
+        for digest in digests:
+            tokens = estimate_tokens(digest)
+            if batches[-1] and batch_tokens + tokens > CHUNK_TOKEN_BUDGET:
+                batches.append([])
+                batch_tokens = 0
+            batches[-1].append(digest)
+            batch_tokens += tokens
+        
+        if len(batches) == 1 or len(batches) >= len(digests):
+            # Done, or the digests are too large to merge further: reduce them all at once
+            findings = "\n".join(digests)
+            task = review_task(
+                "high_level",
+                f"""
+                STRICTLY write the file-level review of {language} file {file_name} from these per-chunk review findings and respond ONLY in this format:
+                {findings}
+                
+                ---
+                {HIGH_LEVEL_FORMAT}
+                """,
+                "Concise high-level review following exact format"
+            )
+            # The prompt names the file, so the file name is part of the cache key
+            return await run_review_task(file_semaphore, task, "file_reduce", language, f"{file_name}\n{findings}")
+        
+        level += 1
+        logger.info(f"Reducing {len(digests)} findings of {file_name} in {len(batches)} batches (level {level})")
+        calls = []
+        for batch in batches:
+            findings = "\n".join(batch)
+            task = review_task(
+                "high_level",
+                f"""
+                STRICTLY condense these review findings for part of {language} file {file_name} into at most 5 lines.
+                Keep every HIGH severity issue with its location:
+                {findings}
+                """,
+                "At most 5 lines of condensed findings"
+            )
+            calls.append(run_review_task(file_semaphore, task, "reduce", language, f"{file_name}\n{findings}"))
+        digests = [f"- {summarize_review(summary, max_chars=800)}" for summary in await asyncio.gather(*calls)]
 
 async def review_code_chunks(language: str, chunks: List[Dict]) -> List[Dict]:
     """
-    Review each code chunk using CrewAI agents.
+    Review each code chunk with the detailed review agent.
     """
     reviewed_chunks = []
     for chunk in chunks:
         try:
             # Create a review task for this chunk
-            review_task = Task(
-                description=f"""
+            chunk_task = review_task(
+                "detailed",
+                f"""
                 STRICTLY review this {language} {chunk['type']}:
                 {chunk['code']}
                 
@@ -290,16 +531,10 @@ async def review_code_chunks(language: str, chunks: List[Dict]) -> List[Dict]:
                    ```
                 3. [SUMMARY] (1 line)
                 """,
-                agent=detailed_review_agent,
-                expected_output=f"Strictly formatted review of {chunk['type']} {chunk['name']}"
+                f"Strictly formatted review of {chunk['type']} {chunk['name']}"
             )
             
-            crew = Crew(
-                agents=[detailed_review_agent],
-                tasks=[review_task],
-                verbose=True
-            )
-            review_output = crew.kickoff()
+            review_output = await run_backend_task(chunk_task)
             
             reviewed_chunks.append({
                 "type": chunk["type"],
@@ -317,140 +552,146 @@ async def review_code_chunks(language: str, chunks: List[Dict]) -> List[Dict]:
             })
     return reviewed_chunks
 
-async def review_repo_code(repo_url: str, commit_hash: str, commit_author: str, files_to_review: list):
+async def review_repo_code(repo_url: str, commit_hash: str, commit_authors: List[str], files_to_review: list, base_sha: str = None,
+                           diff_available: bool = True):
+    metrics.repo_label.set(repo_url)
+    metrics.REVIEWS_IN_FLIGHT.inc((repo_url,))
     try:
-        if repo_url not in webhook_configs:
+        config = await webhook_configs.aget(repo_url)
+        if config is None:
             raise HTTPException(status_code=400, detail="Repository not configured")
             
-        config = webhook_configs[repo_url]
         logger.info(f"Starting code review for repository: {repo_url}")
         review_summaries = []
-        issue_body = ""  # Initialize as empty string
+        report = ReviewReport(
+            title=review_title(commit_hash, commit_authors),
+            header=f"**Commit:** {commit_hash[:8]}\n**Author:** {', '.join(commit_authors)}\n\n",
+        )
+
+        reviewable_files = [file_name for file_name in files_to_review if file_name.endswith(REVIEWABLE_EXTENSIONS)]
+        fetched_files = await fetch_files_at_commit(repo_url, commit_hash, reviewable_files, config['access_token'])
+        diff_mode = config.get('review_mode', "diff") == "diff"
+        # Without a usable diff (diff_available=False) whole files are reviewed
+        fetch_patches = diff_mode and diff_available and reviewable_files
+        patches = await fetch_commit_patches(repo_url, commit_hash, config['access_token'], base_sha) if fetch_patches else {}
 
         for file_name in files_to_review:
             logger.info(f"Checking file: {file_name}")
-            if file_name.endswith((".py", ".java")):  
-                logger.info(f"File {file_name} matches the allowed extensions (.py or .java)")
+            if file_name.endswith(REVIEWABLE_EXTENSIONS):  
+                logger.info(f"File {file_name} matches the allowed extensions ({', '.join(REVIEWABLE_EXTENSIONS)})")
                 
                 file_path = file_name
                 try:
-                    file_content = await fetch_file_content(repo_url, file_path, config['access_token'])
+                    file_content = fetched_files.get(file_path)
+                    if file_content is None:
+                        raise HTTPException(status_code=404, detail=f"{file_path} not found at {commit_hash[:8]}")
                     logger.info(f"File content fetched successfully: {file_name}")
                     
-                    # Initialize issue_body here only when we find a file to review
-                    if not issue_body:
-                        issue_body = f"**Commit:** {commit_hash[:8]}\n**Author:** {commit_author}\n\n"
+                    language = review_language(file_name)
                     
-                    language = "python" if file_name.endswith(".py") else "java"
+                    with metrics.STAGE_SECONDS.time(("split", repo_url, language)):
+                        if tree_chunker is not None and tree_chunker.grammar_for(file_name):
+                            # Parsing blocks; other reviews keep running meanwhile
+                            chunks = await asyncio.to_thread(
+                                tree_chunker.split, file_name, file_content, key=(repo_url, file_name),
+                                commit=commit_hash, base_commit=base_sha, patch=patches.get(file_name),
+                            )
+                        elif language == "python":
+                            chunks = split_python_code(file_content)
+                        else:
+                            chunks = split_java_code(file_content)
                     
-                    if language == "python":
-                        chunks = split_python_code(file_content)
-                    else:
-                        chunks = split_java_code(file_content)
+                    # Only review the chunks touched by this commit
+                    if patches.get(file_name):
+                        chunks = select_changed_chunks(chunks, changed_line_ranges(patches[file_name]), config.get('diff_context_lines', 0))
+                        if not chunks:
+                            logger.info(f"No reviewable chunks changed in {file_name}")
+                            report.add_section(unchanged_file_section(file_name))
+                            review_summaries.append({"file": file_name, "review": "No reviewable code changed"})
+                            continue
                     
-                    # High-level review
-                    high_level_review_task = Task(
-                        description=f"""
-                        STRICTLY analyze this {language} code and respond ONLY in this format:
-                        {file_content}
-                        
-                        ---
-                        1. [OVERVIEW] (1 sentence)
-                        2. [CRITICAL] (ONLY if issues exist)
-                           - [ISSUE] Description (severity: HIGH/MEDIUM)
-                           - [FIX] Brief suggestion
-                        3. [VERDICT] ✅ Good/⚠️ Needs Attention
-                        """,
-                        agent=high_level_review_agent,
-                        expected_output="Concise high-level review following exact format"
-                    )
+                    with metrics.STAGE_SECONDS.time(("static_checks", repo_url, language)):
+                        checks = analyze_chunks(language, file_content, chunks, STATIC_RULES_DISABLED) if STATIC_PREFILTER else {}
+                    skipped = {key for key, check in checks.items() if check["trivial"]}
+                    # When everything being reviewed (the whole file, or every chunk this push changed) is
+                    # trivial, the file-level review is skipped as well
+                    all_trivial = bool(checks) and len(skipped) == len(checks)
+                    if checks:
+                        finding_count = sum(len(check["findings"]) for check in checks.values())
+                        logger.info(f"Static checks on {file_name}: {len(skipped)} of {len(checks)} chunks trivial, {finding_count} findings")
                     
-                    detailed_reviews = []
-                    for chunk in chunks:
-                        # Main chunk review
-                        detailed_review_task = Task(
-                            description=f"""
-                            STRICTLY review this {language} {chunk['type']}:
-                            {chunk['code']}
+                    # Fan out the packed chunk/method reviews and, for files under the size
+                    # threshold, the single-call high-level review
+                    file_semaphore = asyncio.Semaphore(REVIEW_FILE_CONCURRENCY)
+                    map_reduce = estimate_tokens(file_content) > HIGH_LEVEL_MAX_TOKENS and not all_trivial
+                    high_level_calls = []
+                    if not map_reduce and not all_trivial:
+                        high_level_review_task = review_task(
+                            "high_level",
+                            f"""
+                            STRICTLY analyze this {language} code and respond ONLY in this format:
+                            {file_content}
                             
-                            Respond ONLY in this format:
-                            1. [STATUS] Good/Needs Fix
-                            2. [ISSUES] (if any):
-                               - Type: [BUG/PERF/READ]
-                               - Where: line X
-                               - Severity: [H/M/L]
-                               - Fix: (1 line)
-                               ```{language}
-                               [CORRECTED CODE] (if needed)
-                               ```
-                            3. [SUMMARY] (1 line)
+                            ---
+                            {HIGH_LEVEL_FORMAT}
                             """,
-                            agent=detailed_review_agent,
-                            expected_output=f"Strictly formatted review of {chunk['type']} {chunk['name']}"
+                            "Concise high-level review following exact format"
                         )
-                        
-                        crew = Crew(
-                            agents=[detailed_review_agent],
-                            tasks=[detailed_review_task],
-                            verbose=True
-                        )
-                        chunk_review = crew.kickoff()
-
-                        # Method reviews (if any)
-                        method_reviews = []
-                        if chunk.get('methods'):
-                            for method in chunk['methods']:
-                                method_review_task = Task(
-                                    description=f"""
-                                    STRICTLY review this {language} method {method['name']}:
-                                    {method['code']}
-                                    
-                                    Same format as above.
-                                    """,
-                                    agent=detailed_review_agent,
-                                    expected_output=f"Review of method {method['name']}"
-                                )
-                                
-                                crew = Crew(
-                                    agents=[detailed_review_agent],
-                                    tasks=[method_review_task],
-                                    verbose=True
-                                )
-                                method_review = crew.kickoff()
-                                method_reviews.append({
-                                    "method": method['name'],
-                                    "review": method_review
-                                })
-                        
+                        high_level_calls.append(run_review_task(file_semaphore, high_level_review_task, "file", language, file_content))
+                    units = pack_chunks(chunks, CHUNK_TOKEN_BUDGET, language, use_skeletons=HIERARCHICAL_CLASS_REVIEW, skip=skipped)
+                    if skipped:
+                        # Trivial members would have shared packed calls; count the calls actually avoided
+                        unskipped = pack_chunks(chunks, CHUNK_TOKEN_BUDGET, language, use_skeletons=HIERARCHICAL_CLASS_REVIEW)
+                        metrics.LLM_CALLS.inc((repo_url, language, "static", "skipped"), len(unskipped) - len(units) + all_trivial)
+                    unit_calls = []
+                    for unit in units:
+                        findings = [finding for member in unit["members"] for finding in checks.get(member["key"], {}).get("findings", [])]
+                        # Findings change the prompt, so they are part of the cache key (by rule, not line)
+                        cache_code = unit['code'] + "".join(f"\n{finding['rule']}" for finding in findings)
+                        unit_calls.append(run_review_task(
+                            file_semaphore, build_review_task(language, unit, findings), unit['type'], language, cache_code
+                        ))
+                    logger.info(f"Reviewing {file_name} in {len(units)} calls for {len(chunks)} chunks")
+                    
+                    with metrics.STAGE_SECONDS.time(("review_calls", repo_url, language)):
+                        results = await asyncio.gather(*high_level_calls, *unit_calls, return_exceptions=True)
+                    for result in results:
+                        if isinstance(result, BaseException):
+                            raise result
+                    
+                    # Map unit reviews back to chunks and methods in source order
+                    unit_reviews = unpack_reviews(units, results[len(high_level_calls):])
+                    unit_reviews.update((key, TRIVIAL_REVIEW) for key in skipped)
+                    detailed_reviews = []
+                    for i, chunk in enumerate(chunks):
+                        method_reviews = [
+                            {"method": method['name'], "review": unit_reviews[("method", i, j)]}
+                            for j, method in enumerate(chunk.get('methods') or [])
+                        ]
+                        findings = [
+                            finding for key, check in checks.items() if key[1] == i for finding in check["findings"]
+                        ]
                         detailed_reviews.append({
                             "type": chunk["type"],
                             "name": chunk["name"],
                             "code": chunk["code"],
-                            "review": chunk_review,
-                            "method_reviews": method_reviews if method_reviews else None
+                            "review": unit_reviews[("chunk", i)],
+                            "method_reviews": method_reviews if method_reviews else None,
+                            "findings": sorted(findings, key=lambda finding: finding["line"])
                         })
                     
-                    # Run high-level review
-                    crew = Crew(
-                        agents=[high_level_review_agent],
-                        tasks=[high_level_review_task],
-                        verbose=True
-                    )
-                    high_level_review_result = crew.kickoff()
-                    
-                    # Add to issue body
-                    issue_body += f"## File: {file_name}\n\n"
-                    issue_body += f"**High-Level Review:**\n\n{high_level_review_result}\n\n**Detailed Reviews:**\n\n"
-                    
-                    for review in detailed_reviews:
-                        issue_body += f"**{review['type']}: {review['name']}**\n\n{review['review']}\n\n"
-                        if review.get('method_reviews'):
-                            issue_body += "**Methods:**\n\n"
-                            for method in review['method_reviews']:
-                                issue_body += f"▸ {method['method']}:\n{method['review']}\n\n"
+                    if all_trivial:
+                        high_level_review_result = TRIVIAL_CHANGES_REVIEW if patches.get(file_name) else TRIVIAL_FILE_REVIEW
+                    elif map_reduce:
+                        logger.info(f"{file_name} is over the high-level size threshold, reducing chunk reviews")
+                        with metrics.STAGE_SECONDS.time(("high_level_reduce", repo_url, language)):
+                            high_level_review_result = await reduce_high_level_review(file_semaphore, language, file_name, chunks, detailed_reviews)
+                    else:
+                        high_level_review_result = results[0]
                     
-                    issue_body += "\n---\n\n"
-                    review_summaries.append({"file": file_name, "review": issue_body})
+                    section = file_section(file_name, high_level_review_result, detailed_reviews)
+                    report.add_section(section)
+                    review_summaries.append({"file": file_name, "review": section})
                     
                 except Exception as e:
                     logger.error(f"Failed to process file: {file_name}. Error: {e}")
@@ -459,18 +700,58 @@ async def review_repo_code(repo_url: str, commit_hash: str, commit_author: str,
                         "error": str(e)
                     })
             else:
-                logger.info(f"File {file_name} does not match the allowed extensions (.py or .java)")
+                logger.info(f"File {file_name} does not match the allowed extensions ({', '.join(REVIEWABLE_EXTENSIONS)})")
         
         # Only create issue if we actually reviewed files
-        if issue_body:  # Now this will only be true if we found Python/Java files
-            issue_title = f"Code Review: {commit_author} - {commit_hash[:8]}"
-            await create_github_issue(repo_url, config['access_token'], issue_title, issue_body)
+        if report.sections:
+            pages = report.pages()
+            # A retried job resumes posting where its previous attempt stopped instead of opening a second issue
+            progress = job_progress()
+            issue_number = progress.get("issue_number")
+            if issue_number is None:
+                with metrics.STAGE_SECONDS.time(("create_issue", repo_url, "")):
+                    issue = await create_github_issue(repo_url, config['access_token'], report.title, pages[0])
+                issue_number = issue["number"]
+                await save_job_progress(issue_number=issue_number, pages_posted=1)
+            else:
+                logger.info(f"Resuming report on issue #{issue_number} after page {progress.get('pages_posted', 1)}")
+            for number, page in enumerate(pages[1:], start=2):
+                if number <= progress.get("pages_posted", 1):
+                    continue
+                with metrics.STAGE_SECONDS.time(("create_comment", repo_url, "")):
+                    await create_issue_comment(repo_url, config['access_token'], issue_number, page)
+                await save_job_progress(pages_posted=number)
+            if len(pages) > 1:
+                logger.info(f"Report split into an issue and {len(pages) - 1} comments")
         
         logger.info(f"Code review completed for {len(review_summaries)} files")
         return {"reviews": review_summaries}
+    except RateLimitExceeded:
+        # Not a failure of the review; the worker defers the job until the reset
+        raise
     except Exception as e:
         logger.error(f"Review Repo Code Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        metrics.REVIEWS_IN_FLIGHT.dec((repo_url,))
+
+def job_progress() -> Dict:
+    """
+    Progress recorded by earlier attempts of the queued job being processed.
+    """
+    job = current_job.get()
+    return job["progress"] if job is not None else {}
+
+async def save_job_progress(**progress):
+    """
+    Record progress of the queued job being processed, so a retry can resume
+    from it. Does nothing outside a queue worker.
+    """
+    job = current_job.get()
+    if job is None:
+        return
+    job["progress"].update(progress)
+    await asyncio.to_thread(review_queue.record_progress, job["id"], job["worker"], job["progress"])
 
 async def create_github_issue(repo_url: str, access_token: str, title: str, body: str):
     """
@@ -484,7 +765,7 @@ async def create_github_issue(repo_url: str, access_token: str, title: str, body
             raise HTTPException(status_code=400, detail="Invalid GitHub repository URL")
         
         owner, repo = path_parts[0], path_parts[1]
-        issues_url = f"https://api.github.com/repos/{owner}/{repo}/issues"
+        issues_url = f"/repos/{owner}/{repo}/issues"
         headers = {
             "Authorization": f"token {access_token}",
             "Accept": "application/vnd.github.v3+json"
@@ -492,25 +773,56 @@ async def create_github_issue(repo_url: str, access_token: str, title: str, body
         payload = {"title": title, "body": body}
 
         logger.info(f"Creating issue in repository: {owner}/{repo}")
-        logger.info(f"Issue title: {title}")
-        logger.info(f"Issue body: {body}")
-
-        async with httpx.AsyncClient(verify=False) as client:
-            response = await client.post(issues_url, headers=headers, json=payload)
-            if response.status_code != 201:
-                logger.error(f"Create Issue Error: {response.status_code} - {response.text}")
-                raise HTTPException(status_code=response.status_code, detail="Failed to create GitHub issue.")
-            logger.info(f"Issue created successfully: {response.json()}")
-            return response.json()
+        logger.info(f"Issue title: {title} ({len(body)} characters)")
+
+        response = await github_client.post(issues_url, headers=headers, json=payload)
+        if response.status_code != 201:
+            logger.error(f"Create Issue Error: {response.status_code} - {response.text}")
+            raise HTTPException(status_code=response.status_code, detail="Failed to create GitHub issue.")
+        logger.info(f"Issue created successfully: {response.json()}")
+        return response.json()
+    except RateLimitExceeded:
+        raise
     except Exception as e:
         logger.error(f"Create Issue Error: {e}")
         raise HTTPException(status_code=500, detail=f"Create Issue Error: {e}")
 
+async def create_issue_comment(repo_url: str, access_token: str, issue_number: int, body: str):
+    """
+    Add a comment to an issue (used for report pages after the first).
+    """
+    try:
+        parsed_url = urlparse(repo_url)
+        path_parts = parsed_url.path.strip('/').split('/')
+        if len(path_parts) < 2:
+            raise HTTPException(status_code=400, detail="Invalid GitHub repository URL")
+        
+        owner, repo = path_parts[0], path_parts[1]
+        comments_url = f"/repos/{owner}/{repo}/issues/{issue_number}/comments"
+        headers = {
+            "Authorization": f"token {access_token}",
+            "Accept": "application/vnd.github.v3+json"
+        }
+        
+        response = await github_client.post(comments_url, headers=headers, json={"body": body})
+        if response.status_code != 201:
+            logger.error(f"Create Comment Error: {response.status_code} - {response.text}")
+            raise HTTPException(status_code=response.status_code, detail="Failed to comment on GitHub issue.")
+        return response.json()
+    except RateLimitExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"Create Comment Error: {e}")
+        raise HTTPException(status_code=500, detail=f"Create Comment Error: {e}")
+
 class WebhookConfig(BaseModel):
     repo_url: str  # GitHub repository URL (e.g., https://github.com/owner/repo)
     access_token: str
     webhook_secret: str
     webhook_url: str = "https://51cd-2401-4900-1c1b-e9bf-7ce9-50d6-d34c-407e.ngrok-free.app/webhook/"
+    review_mode: str = "diff"  # "diff" reviews only changed chunks, "full" reviews whole files
+    diff_context_lines: int = 0  # Extra lines around each change when matching chunks
+    supersede_reviews: bool = True  # A newer push to a branch cancels its queued and running reviews
 
 @app.post("/webhook/")
 async def github_webhook(request: Request):
@@ -518,51 +830,274 @@ async def github_webhook(request: Request):
     Handle GitHub webhook events.
     """
     body = await request.body()
-    logger.info(f"Received webhook payload: {body.decode()}")
+    event = request.headers.get("X-GitHub-Event", "")
+    delivery_id = request.headers.get("X-GitHub-Delivery", "")
+    logger.info(f"Received {event or 'unknown'} event, delivery {delivery_id or '-'} ({len(body)} bytes)")
     
-    # First parse the JSON to get the repository URL for verification
+    # Parse the raw bytes once; the signature is then checked against the same bytes
     try:
-        payload = await request.json()
+        payload = loads(body)
         repo_url = payload.get("repository", {}).get("html_url", "")
         if not repo_url:
             raise HTTPException(status_code=400, detail="Repository URL not found in payload")
         
-        verify_webhook_signature(request, body, repo_url)
+        # Unverified input: only configured repositories get their own label
+        with metrics.STAGE_SECONDS.time(("webhook_verify", repo_url if await webhook_configs.aget(repo_url) else "", "")):
+            config = await verify_webhook_signature(request, body, repo_url)
+    except (ValueError, AttributeError) as e:
+        logger.error(f"Invalid webhook payload: {e}")
+        metrics.WEBHOOK_DELIVERIES.inc(("", "invalid"))
+        raise HTTPException(status_code=400, detail="Invalid webhook payload")
     except Exception as e:
         logger.error(f"Error verifying webhook: {e}")
+        metrics.WEBHOOK_DELIVERIES.inc(("", "rejected"))
         raise
     
-    event = request.headers.get("X-GitHub-Event", "")
-    logger.info(f"Received event: {event}")
+    if event != "push":
+        metrics.WEBHOOK_DELIVERIES.inc((event, "ignored"))
+        return {"status": "Event ignored"}
+    if not payload.get("commits"):
+        logger.info("No commits found in the payload")
+        metrics.WEBHOOK_DELIVERIES.inc((event, "no_commits"))
+        return {"status": "No commits to review"}
     
-    if event == "push":
-        commits = payload.get("commits", [])
-        if commits:
-            # Process each commit separately
-            for commit in commits:
-                commit_hash = commit.get("id", "")
-                commit_author = commit.get("author", {}).get("name", "Unknown Author")
-                if not commit_hash:
-                    continue
-                
-                added_files = commit.get("added", [])
-                modified_files = commit.get("modified", [])
-                files_to_review = added_files + modified_files
-                
-                if files_to_review:
-                    logger.info(f"Processing commit {commit_hash[:8]} by {commit_author} with {len(files_to_review)} files to review")
-                    await review_repo_code(repo_url, commit_hash, commit_author, files_to_review)
-                else:
-                    logger.info(f"No files to review in commit {commit_hash[:8]} by {commit_author}")
-            
-            return {"status": "Review process started for all commits"}
-        else:
-            logger.info("No commits found in the payload")
-            return {"status": "No commits to review"}
+    job = push_job_from_payload(payload, repo_url)
+    supersede = config.get('supersede_reviews', True)
+    # Redeliveries (to any process, or after a restart) map back to the job of the first delivery
+    job_id, created = await asyncio.to_thread(
+        review_queue.enqueue, repo_url, job, ref=job["ref"], supersede=supersede, merge=merge_push_jobs,
+        delivery_id=delivery_id or None,
+    )
+    if not created:
+        logger.info(f"Delivery {delivery_id} was already handled, acknowledging it again")
+        metrics.WEBHOOK_DELIVERIES.inc((event, "duplicate"))
+        return {"status": "Duplicate delivery", "job_id": job_id}
+    logger.info(f"Queued review job {job_id} for {repo_url} with {len(job['commits'])} commits")
+    metrics.WEBHOOK_DELIVERIES.inc((event, "queued"))
+    return JSONResponse(status_code=202, content={"status": "Review queued", "job_id": job_id})
+
+NULL_SHA = "0" * 40
+
+def plan_push_files(commits: List[Dict]) -> List[str]:
+    """
+    Collapse the commits of a push into the files that still exist at its head:
+    added/modified files are unioned in order, and a file removed by a later
+    commit is dropped (until a later commit adds it back).
+    """
+    files = {}
+    for commit in commits:
+        for file_name in commit.get("removed", []):
+            files.pop(file_name, None)
+        for file_name in commit.get("added", []) + commit.get("modified", []):
+            files[file_name] = True
+    return list(files)
+
+def merge_push_jobs(older: List[Dict], newer: Dict) -> Dict:
+    """
+    Fold superseded pushes to the same ref into the newest one: the review then
+    covers everything from the oldest push's base to the newest head, so the
+    changes of cancelled pushes are not skipped.
+    """
+    commits = {}
+    for job in older + [newer]:
+        for commit in job["commits"]:
+            commits.setdefault(commit["id"], commit)
+    return dict(newer, before=older[0].get("before", ""), commits=list(commits.values()))
+
+async def process_push_job(job: Dict):
+    """
+    Review a queued push once, at its head commit, as a single report.
+    """
+    repo_url = job["repo_url"]
+    commits = [commit for commit in job["commits"] if commit["id"]]
+    if not commits:
+        return
     
-    return {"status": "Event ignored"}     
+    head_sha = job.get("after") or commits[-1]["id"]
+    if head_sha == NULL_SHA:
+        logger.info(f"Push to {job.get('ref', '')} deleted the branch, nothing to review")
+        return
+    base_sha = job.get("before")
+    if not base_sha or base_sha == NULL_SHA:
+        base_sha = None
+    # A new branch has no base to compare against. The head commit's own patch only covers
+    # the whole push when the push is that one commit; otherwise review the full files
+    diff_available = base_sha is not None or len(commits) == 1
+    authors = list(dict.fromkeys(commit["author"] for commit in commits))
+    files_to_review = plan_push_files(commits)
+    
+    if files_to_review:
+        logger.info(f"Processing push {head_sha[:8]} ({len(commits)} commits) with {len(files_to_review)} files to review")
+        await review_repo_code(repo_url, head_sha, authors, files_to_review, base_sha=base_sha,
+                               diff_available=diff_available)
+    else:
+        logger.info(f"No files to review in push {head_sha[:8]}")
+
+async def _renew_lease(job_id: int, worker_id: str):
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        if not await asyncio.to_thread(review_queue.renew, job_id, worker_id, JOB_LEASE_SECONDS):
+            logger.warning(f"Worker {worker_id} lost the lease on job {job_id}")
+            return
+
+async def _watch_superseded(job_id: int, processing: asyncio.Task) -> bool:
+    """
+    Cancel `processing` once the job is superseded. Reviews already finished
+    stay in the review cache, so the newer job reuses them for unchanged code.
+    """
+    while not processing.done():
+        await asyncio.sleep(SUPERSEDE_CHECK_INTERVAL)
+        newer = await asyncio.to_thread(review_queue.superseded_by, job_id)
+        if newer is not None:
+            logger.info(f"Job {job_id} was superseded by job {newer}, cancelling its review")
+            processing.cancel()
+            return True
+    return False
+
+async def review_worker(worker_id: str):
+    """
+    Drain the review queue until cancelled.
+    """
+    logger.info(f"Review worker {worker_id} started")
+    while True:
+        try:
+            job = await asyncio.to_thread(review_queue.claim, worker_id, JOB_LEASE_SECONDS)
+        except Exception as e:
+            logger.error(f"Worker {worker_id} failed to claim a job: {e}")
+            job = None
+        if job is None:
+            await asyncio.sleep(QUEUE_POLL_INTERVAL)
+            continue
+        
+        job_id = job["id"]
+        if await webhook_configs.aget(job["repo_url"]) is None:
+            logger.warning(f"Deferring job {job_id}: repository {job['repo_url']} is not configured")
+            await asyncio.to_thread(review_queue.defer, job_id, worker_id, UNCONFIGURED_RETRY_DELAY, "Repository not configured")
+            continue
+        
+        logger.info(f"Worker {worker_id} processing job {job_id} (attempt {job['attempts']})")
+        renewer = asyncio.create_task(_renew_lease(job_id, worker_id))
+        # The processing task copies the context, and with it current_job
+        current_job.set({"id": job_id, "worker": worker_id, "progress": job["progress"]})
+        processing = asyncio.create_task(process_push_job(job["payload"]))
+        current_job.set(None)
+        watcher = asyncio.create_task(_watch_superseded(job_id, processing))
+        try:
+            await processing
+            if await asyncio.to_thread(review_queue.complete, job_id, worker_id):
+                logger.info(f"Job {job_id} completed")
+            else:
+                logger.warning(f"Job {job_id} finished after worker {worker_id} lost its lease; left to its new owner")
+        except asyncio.CancelledError:
+            if watcher.done() and not watcher.cancelled() and watcher.result():
+                await asyncio.to_thread(review_queue.complete, job_id, worker_id, "superseded")
+                continue
+            # Shutting down: hand the job back right away, without spending one of its attempts
+            await asyncio.shield(asyncio.to_thread(review_queue.defer, job_id, worker_id, 0, "Worker shut down"))
+            raise
+        except RateLimitExceeded as e:
+            logger.warning(f"Job {job_id} hit the GitHub rate limit, deferring it {e.retry_after:.0f}s")
+            await asyncio.to_thread(review_queue.defer, job_id, worker_id, e.retry_after, str(e))
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            await asyncio.to_thread(review_queue.fail, job_id, worker_id, str(e))
+        finally:
+            renewer.cancel()
+            watcher.cancel()
+
+async def run_workers(count: int):
+    """
+    Run `count` queue workers in the current process (used by worker.py).
+    """
+    prefix = f"{os.uname().nodename}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    await start_github_client()
+    await start_review_backend()
+    try:
+        await asyncio.gather(*(review_worker(f"{prefix}-{i}") for i in range(count)))
+    finally:
+        await stop_review_backend()
+        await stop_github_client()
+
+async def prometheus_metrics():
+    """
+    Prometheus exposition of this process's metrics.
+    """
+    metrics.QUEUE_DEPTH.set((), await asyncio.to_thread(review_queue.depth))
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics")
+async def web_metrics():
+    """
+    Prometheus scrape endpoint, when the web app runs as a single process.
+    """
+    if not WEB_METRICS:
+        raise HTTPException(
+            status_code=404,
+            detail="Metrics are per process and this app runs several; scrape each worker.py --metrics-port instead",
+        )
+    return await prometheus_metrics()
 
-@app.post("/setup-webhook/")
+@app.get("/reviews/")
+async def reviews_for_ref(repo_url: str, ref: str, limit: int = 20):
+    """
+    List the most recent review jobs for a branch, newest first.
+    """
+    return await asyncio.to_thread(review_queue.jobs_for_ref, repo_url, ref, limit)
+
+@app.get("/llm-pool/")
+async def llm_pool_stats():
+    """
+    Report LLM pool queue depth and wait times.
+    """
+    return llm_executor.stats()
+
+@app.get("/review-backend/")
+async def review_backend_stats():
+    """
+    Report the review backend and its call and token counts.
+    """
+    if review_backend is None:
+        return {"backend": REVIEW_BACKEND, "calls": 0}
+    return review_backend.stats()
+
+@app.get("/github-client/")
+async def github_client_stats():
+    """
+    Report per-token GitHub rate-limit budgets and ETag cache use.
+    """
+    if github_client is None:
+        return {}
+    return github_client.stats()
+
+@app.get("/chunker/")
+async def chunker_stats():
+    """
+    Report the tree-sitter grammars loaded and full vs incremental parse counts.
+    """
+    if tree_chunker is None:
+        return {"chunker": "builtin", "extensions": list(REVIEWABLE_EXTENSIONS)}
+    return dict(tree_chunker.stats(), chunker="tree-sitter", extensions=list(REVIEWABLE_EXTENSIONS))
+
+@app.get("/review-cache/")
+async def review_cache_stats():
+    """
+    Report review cache size and hit/miss counts.
+    """
+    return await asyncio.to_thread(review_cache.stats)
+
+@app.delete("/review-cache/", dependencies=[Depends(require_admin)])
+async def invalidate_review_cache(key: str = None, model: str = None, prompt_version: str = None, language: str = None,
+                                  all: bool = False):
+    """
+    Drop cached reviews matching the given fields; wiping the whole cache
+    takes an explicit all=true.
+    """
+    if not all and key is None and model is None and prompt_version is None and language is None:
+        raise HTTPException(status_code=400, detail="Give at least one filter, or all=true to drop every cached review")
+    removed = await asyncio.to_thread(review_cache.invalidate, key, model, prompt_version, language)
+    return {"removed": removed}
+
+@app.post("/setup-webhook/", dependencies=[Depends(require_admin)])
 async def setup_webhook(config: WebhookConfig):
     """
     Set up a webhook for the specified GitHub repository using the repository URL.
@@ -578,13 +1113,16 @@ async def setup_webhook(config: WebhookConfig):
         
         owner, repo = path_parts[0], path_parts[1]
         
-        webhook_configs[repo_url] = {
+        await asyncio.to_thread(webhook_configs.put, repo_url, {
             'access_token': config.access_token,
             'webhook_secret': config.webhook_secret,
-            'webhook_url': config.webhook_url
-        }
+            'webhook_url': config.webhook_url,
+            'review_mode': config.review_mode,
+            'diff_context_lines': config.diff_context_lines,
+            'supersede_reviews': config.supersede_reviews
+        })
         
-        webhook_url = f"https://api.github.com/repos/{owner}/{repo}/hooks"
+        webhook_url = f"/repos/{owner}/{repo}/hooks"
         headers = {
             "Authorization": f"token {config.access_token}",
             "Accept": "application/vnd.github.v3+json"
@@ -604,12 +1142,13 @@ async def setup_webhook(config: WebhookConfig):
         logger.info(f"Setting up webhook for repository: {owner}/{repo}")
         logger.info(f"Webhook URL: {payload['config']['url']}")
 
-        async with httpx.AsyncClient(verify=False) as client:
-            response = await client.post(webhook_url, headers=headers, json=payload)
-            if response.status_code != 201:
-                logger.error(f"Webhook Setup Error: {response.status_code} - {response.text}")
-                raise HTTPException(status_code=response.status_code, detail="Failed to set up webhook.")
-            return response.json()
+        response = await github_client.post(webhook_url, headers=headers, json=payload)
+        if response.status_code != 201:
+            logger.error(f"Webhook Setup Error: {response.status_code} - {response.text}")
+            raise HTTPException(status_code=response.status_code, detail="Failed to set up webhook.")
+        return response.json()
+    except RateLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
     except Exception as e:
         logger.error(f"Webhook Setup Error: {e}")
         raise HTTPException(status_code=500, detail=f"Webhook Setup Error: {e}")
@@ -0,0 +1,200 @@
+"""
+Benchmark the whole review pipeline offline: process_push_job ->
+review_repo_code -> fetch from GitHub, split, review, post the report,
+against the fake GitHub and fake Ollama servers started as subprocesses (so
+the reported peak RSS is the review service's alone).
+
+Each push modifies --files-per-push files of a --repo-files file repository;
+reports files/sec, per-push latency percentiles, model calls and peak RSS.
+
+    python benchmarks/bench_end_to_end.py --pushes 20 --files-per-push 10 --concurrent-pushes 4
+    python benchmarks/bench_end_to_end.py --review-mode diff --latency 0.5 --jitter 0.6 \\
+        --distribution lognormal --tokens-per-second 40 --ollama-servers 2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import httpx
+
+from bench_review_backend import percentile
+from fake_github import load_corpus, repo_paths
+
+REPO_URL = "https://github.com/bench/repo"
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_fake(script: str, port: int, *options) -> subprocess.Popen:
+    process = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, script), "--port", str(port), *map(str, options)])
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/stats", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{script} did not start on port {port}")
+
+def rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def push_jobs(pushes: int, files_per_push: int, commits_per_push: int, paths, seed: int):
+    """
+    Queued-job dicts shaped like push_job_from_payload's output, each push
+    continuing from the previous one's head.
+    """
+    rng = random.Random(seed)
+    head = uuid.UUID(int=rng.getrandbits(128)).hex + "00000000"
+    for _ in range(pushes):
+        changed = rng.sample(paths, min(files_per_push, len(paths)))
+        commits = []
+        for i in range(commits_per_push):
+            commits.append({
+                "id": uuid.UUID(int=rng.getrandbits(128)).hex + "00000000",
+                "author": "Bench Author",
+                "added": [],
+                "modified": changed[i::commits_per_push],
+                "removed": [],
+            })
+        yield {"repo_url": REPO_URL, "ref": "refs/heads/main", "before": head, "after": commits[-1]["id"], "commits": commits}
+        head = commits[-1]["id"]
+
+async def run(args, review_app):
+    logging.getLogger().handlers.clear()
+    logging.getLogger().addHandler(logging.NullHandler())
+    review_app.webhook_configs[REPO_URL] = {
+        "access_token": "bench-token", "webhook_secret": "bench-secret", "webhook_url": "",
+        "review_mode": args.review_mode, "diff_context_lines": 0, "supersede_reviews": False,
+    }
+    await review_app.start_github_client()
+    await review_app.start_review_backend()
+
+    paths = sorted(repo_paths(load_corpus(), args.repo_files))
+    jobs = list(push_jobs(args.pushes, args.files_per_push, args.commits_per_push, paths, args.seed))
+    semaphore = asyncio.Semaphore(args.concurrent_pushes)
+    latencies = []
+    errors = 0
+    rss_before = rss_mb()
+
+    async def one(job):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await review_app.process_push_job(job)
+            except Exception as e:
+                errors += 1
+                print(f"push {job['after'][:8]} failed: {e!r}")
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(job) for job in jobs))
+    elapsed = time.perf_counter() - started
+
+    backend_stats = review_app.review_backend.stats()
+    await review_app.stop_review_backend()
+    await review_app.stop_github_client()
+
+    files = sum(len(commit["modified"]) for job in jobs for commit in job["commits"])
+    return {
+        "pushes": len(jobs),
+        "files": files,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "files_per_second": round(files / elapsed, 2),
+        "push_p50": round(percentile(latencies, 0.50), 3),
+        "push_p95": round(percentile(latencies, 0.95), 3),
+        "push_p99": round(percentile(latencies, 0.99), 3),
+        "llm_calls": backend_stats["calls"],
+        "prompt_tokens": backend_stats["prompt_tokens"],
+        "rss_before_mb": round(rss_before, 1),
+        "peak_rss_mb": round(rss_mb(), 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pushes", type=int, default=20)
+    parser.add_argument("--files-per-push", type=int, default=10)
+    parser.add_argument("--commits-per-push", type=int, default=1)
+    parser.add_argument("--concurrent-pushes", type=int, default=4)
+    parser.add_argument("--repo-files", type=int, default=200)
+    parser.add_argument("--review-mode", choices=["full", "diff"], default="full")
+    parser.add_argument("--changed-fraction", type=float, default=0.2, help="share of each file a diff touches")
+    parser.add_argument("--github-latency", type=float, default=0.02)
+    parser.add_argument("--ollama-servers", type=int, default=1)
+    parser.add_argument("--server-concurrency", type=int, default=4, help="parallel slots per fake model server")
+    parser.add_argument("--distribution", choices=["uniform", "lognormal"], default="uniform")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second-jitter", type=float, default=0.0)
+    parser.add_argument("--completion-tokens", type=int, default=60)
+    parser.add_argument("--completion-tokens-jitter", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the results as one JSON line")
+    args = parser.parse_args()
+
+    github_port = free_port()
+    ollama_ports = [free_port() for _ in range(args.ollama_servers)]
+    servers = [start_fake(
+        "fake_github.py", github_port,
+        "--files", args.repo_files, "--changed-fraction", args.changed_fraction, "--latency", args.github_latency,
+    )]
+    for port in ollama_ports:
+        servers.append(start_fake(
+            "fake_ollama.py", port,
+            "--distribution", args.distribution, "--latency", args.latency, "--jitter", args.jitter,
+            "--tokens-per-second", args.tokens_per_second, "--tokens-per-second-jitter", args.tokens_per_second_jitter,
+            "--completion-tokens", args.completion_tokens, "--completion-tokens-jitter", args.completion_tokens_jitter,
+            "--max-concurrency", args.server_concurrency,
+        ))
+
+    workdir = tempfile.mkdtemp()
+    os.environ.update({
+        "GITHUB_API_URL": f"http://127.0.0.1:{github_port}",
+        "REVIEW_BACKEND": "ollama",
+        "OLLAMA_URLS": ",".join(f"http://127.0.0.1:{port}" for port in ollama_ports),
+        "REVIEW_CACHE_DB": os.path.join(workdir, "review_cache.db"),
+        "REVIEW_QUEUE_DB": os.path.join(workdir, "review_jobs.db"),
+        "CONFIG_STORE_URL": "memory://",
+        "IN_PROCESS_WORKERS": "0",
+    })
+    try:
+        import app as review_app
+        results = asyncio.run(run(args, review_app))
+        results["github_requests"] = httpx.get(f"http://127.0.0.1:{github_port}/stats").json()["requests"]
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f"{results['pushes']} pushes, {results['files']} files in {results['seconds']}s ({results['errors']} errors)")
+    print(f"  files/sec       {results['files_per_second']}")
+    print(f"  push latency    p50 {results['push_p50']}s  p95 {results['push_p95']}s  p99 {results['push_p99']}s")
+    print(f"  model calls     {results['llm_calls']} ({results['prompt_tokens']} prompt tokens)")
+    print(f"  GitHub requests {results['github_requests']}")
+    print(f"  peak RSS        {results['peak_rss_mb']} MB (after setup {results['rss_before_mb']} MB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark java_chunker.split_java_code (full parse and lexer-only modes)
+against the previous line-rescanning implementation.
+
+    python benchmarks/bench_java_chunker.py --methods 50 200 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import javalang
+
+from java_chunker import split_java_code
+
+def legacy_split_java_code(file_content: str):
+    """
+    The previous chunker: one javalang parse, then a find_closing_brace line
+    rescan per class and per method.
+    """
+    def find_closing_brace(lines, start_line):
+        brace_count = 0
+        for i in range(start_line, len(lines)):
+            line = lines[i]
+            brace_count += line.count('{') - line.count('}')
+            if brace_count <= 0:
+                return i
+        return len(lines) - 1
+
+    chunks = []
+    lines = file_content.splitlines()
+    tree = javalang.parse.parse(file_content)
+    for type_decl in tree.types:
+        if isinstance(type_decl, javalang.tree.ClassDeclaration):
+            class_start = type_decl.position.line - 1
+            class_end = find_closing_brace(lines, class_start)
+            methods = []
+            for method in type_decl.methods:
+                method_start = method.position.line - 1
+                method_end = find_closing_brace(lines, method_start)
+                methods.append("\n".join(lines[method_start:method_end + 1]))
+            chunks.append(("\n".join(lines[class_start:class_end + 1]), methods))
+    return chunks
+
+def synthetic_java(method_count: int) -> str:
+    parts = ["package bench;\n\nimport java.util.*;\n\npublic class Generated {\n"]
+    for index in range(method_count):
+        parts.append(
+            f"    private int field{index} = {index};\n\n"
+            f"    /** Method {index}. */\n"
+            f"    public int method{index}(List<Integer> values) {{\n"
+            f"        String marker = \"{{ not a brace }}\";\n"
+            f"        int total = 0;\n"
+            f"        for (int value : values) {{\n"
+            f"            if (value > {index}) {{\n"
+            f"                total += value;\n"
+            f"            }}\n"
+            f"        }}\n"
+            f"        return total + field{index};\n"
+            f"    }}\n\n"
+        )
+    parts.append("}\n")
+    return "".join(parts)
+
+def best_of(func, arg, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Java chunker")
+    parser.add_argument("--methods", type=int, nargs="+", default=[50, 200, 1000, 3000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'methods':>8} {'lines':>8} {'legacy s':>10} {'full s':>10} {'lexer s':>10}")
+    for count in args.methods:
+        source = synthetic_java(count)
+        legacy = best_of(legacy_split_java_code, source, args.repeat)
+        full = best_of(lambda code: split_java_code(code, fast=False), source, args.repeat)
+        lexer = best_of(lambda code: split_java_code(code, fast=True), source, args.repeat)
+        print(f"{count:>8} {source.count(chr(10)):>8} {legacy:>10.3f} {full:>10.3f} {lexer:>10.3f}")
@@ -0,0 +1,69 @@
+"""
+Micro-benchmark for python_chunker.split_python_code on synthetic files.
+
+    python benchmarks/bench_python_chunker.py --sizes 10000 20000 50000 100000
+
+Time per line should stay flat as the file grows (linear scaling).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from python_chunker import split_python_code
+
+def synthetic_python(target_lines: int) -> str:
+    """
+    Generate a module mixing imports, globals, functions and classes with
+    decorated methods and comments, roughly target_lines long.
+    """
+    parts = ["import os\nimport sys\nfrom typing import List\n\n"]
+    lines = 4
+    index = 0
+    while lines < target_lines:
+        parts.append(
+            f"CONSTANT_{index} = {index}\n\n"
+            f"def helper_{index}(values: List[int]) -> int:\n"
+            f"    # sum the values\n"
+            f"    total = 0\n"
+            f"    for value in values:\n"
+            f"        total += value * {index}\n"
+            f"    return total\n\n"
+            f"class Model{index}:\n"
+            f"    \"\"\"Synthetic class {index}.\"\"\"\n\n"
+            f"    def __init__(self, name):\n"
+            f"        self.name = name\n\n"
+            f"    @property\n"
+            f"    def label(self):\n"
+            f"        return self.name.upper()\n\n"
+            f"    async def load(self, path):\n"
+            f"        with open(path) as handle:\n"
+            f"            return handle.read()\n\n"
+        )
+        lines += 22
+        index += 1
+    return "".join(parts)
+
+def best_of(func, arg, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Python chunker")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 20000, 50000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'lines':>8} {'chunks':>8} {'seconds':>10} {'us/line':>10}")
+    for size in args.sizes:
+        source = synthetic_python(size)
+        line_count = source.count("\n")
+        chunk_count = len(split_python_code(source))
+        seconds = best_of(split_python_code, source, args.repeat)
+        print(f"{line_count:>8} {chunk_count:>8} {seconds:>10.3f} {seconds / line_count * 1e6:>10.2f}")
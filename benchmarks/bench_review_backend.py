@@ -0,0 +1,89 @@
+"""
+Benchmark review backends against the fake Ollama server: throughput and
+latency of N review calls at a given concurrency. The router backend spreads
+calls over --servers fake endpoints.
+
+    python benchmarks/bench_review_backend.py --backend ollama --requests 200 --concurrency 4 16
+    python benchmarks/bench_review_backend.py --backend router --servers 1 2 4 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn
+
+from fake_ollama import create_app
+from llm_pool import LLMExecutor
+from llm_router import LLMRouter
+from review_backends import create_review_backend, review_task
+
+SAMPLE_CODE = "\n".join(f"def handler_{i}(request):\n    return process(request, {i})\n" for i in range(20))
+
+def start_server(port: int, latency: float, jitter: float, max_concurrency: int = 0) -> uvicorn.Server:
+    app = create_app(latency, jitter, max_concurrency=max_concurrency)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+async def run(backend_kind: str, urls, requests: int, concurrency: int):
+    executor = LLMExecutor(concurrency)
+    if backend_kind == "crewai":
+        backend = create_review_backend("crewai", executor=executor, base_url=f"{urls[0]}/api/generate", verbose=False)
+    elif backend_kind == "router":
+        backend = LLMRouter([create_review_backend("ollama", base_url=url, max_connections=concurrency) for url in urls])
+        backend.start()
+    else:
+        backend = create_review_backend("ollama", base_url=urls[0], max_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        task = review_task("detailed", f"STRICTLY review this python function:\n{SAMPLE_CODE}", f"Review {i}")
+        async with semaphore:
+            started = time.perf_counter()
+            await backend.review(task)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    await backend.aclose()
+    executor.shutdown()
+    print(f"{backend_kind:>7} servers={len(urls):<3} c={concurrency:<4} {requests / elapsed:8.1f} req/s"
+          f"  p50 {percentile(latencies, 0.5) * 1000:7.1f} ms  p95 {percentile(latencies, 0.95) * 1000:7.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["ollama", "router", "crewai"], default="ollama")
+    parser.add_argument("--servers", type=int, nargs="+", default=[1], help="fake endpoints (router backend)")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--server-concurrency", type=int, default=4, help="requests each fake server runs at once (0 = unlimited)")
+    parser.add_argument("--port", type=int, default=11534)
+    args = parser.parse_args()
+
+    servers = [start_server(args.port + i, args.latency, args.jitter, args.server_concurrency) for i in range(max(args.servers))]
+    try:
+        for count in args.servers:
+            urls = [f"http://127.0.0.1:{args.port + i}" for i in range(count)]
+            for concurrency in args.concurrency:
+                asyncio.run(run(args.backend, urls, args.requests, concurrency))
+    finally:
+        for server in servers:
+            server.should_exit = True
+
+if __name__ == "__main__":
+    main()
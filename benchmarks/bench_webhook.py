@@ -0,0 +1,93 @@
+"""
+Benchmark the /webhook/ endpoint in-process (ASGI transport, no network):
+signed push deliveries per second, against the previous handler that
+decoded the body for logging and parsed it twice.
+
+    python benchmarks/bench_webhook.py --requests 2000 --commits 1 20 --duplicates 0.3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("REVIEW_QUEUE_DB", os.path.join(tempfile.mkdtemp(), "bench_jobs.db"))
+os.environ["IN_PROCESS_WORKERS"] = "0"
+os.environ.setdefault("CONFIG_STORE_URL", "memory://")
+
+import httpx
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+import app as review_app
+import webhook_ingest
+from webhook_loadgen import push_payload, signed_headers
+
+REPO_URL = "https://github.com/bench/repo"
+SECRET = "bench-secret"
+
+@review_app.app.post("/legacy-webhook/")
+async def legacy_github_webhook(request: Request):
+    """
+    The previous handler: body decoded for the log line, then parsed again.
+    """
+    body = await request.body()
+    review_app.logger.info(f"Received webhook payload: {body.decode()}")
+    payload = await request.json()
+    repo_url = payload.get("repository", {}).get("html_url", "")
+    await review_app.verify_webhook_signature(request, body, repo_url)
+    if request.headers.get("X-GitHub-Event", "") == "push" and payload.get("commits"):
+        job = review_app.push_job_from_payload(payload, repo_url)
+        job_id, _ = await asyncio.to_thread(review_app.review_queue.enqueue, repo_url, job)
+        return JSONResponse(status_code=202, content={"status": "Review queued", "job_id": job_id})
+    return {"status": "Event ignored"}
+
+async def run(path: str, requests: int, concurrency: int, commits: int, duplicates: float):
+    # One branch per push: with no worker draining the queue, pushes to a shared branch would all
+    # merge into one ever-growing pending job and the benchmark would measure that instead
+    bodies = [json.dumps(push_payload(REPO_URL, commits, ref=f"refs/heads/bench-{i}")).encode() for i in range(requests)]
+    delivered = []
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses = {}
+    transport = httpx.ASGITransport(app=review_app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            if delivered and random.random() < duplicates:
+                delivery_id, body = random.choice(delivered)
+            else:
+                delivery_id, body = str(uuid.uuid4()), bodies[i % len(bodies)]
+                delivered.append((delivery_id, body))
+            async with semaphore:
+                response = await client.post(path, content=body, headers=signed_headers(body, SECRET, delivery_id))
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+    print(f"{path:<17} commits={commits:<3} {requests / elapsed:8.0f} req/s  statuses {statuses}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--commits", type=int, nargs="+", default=[1, 20])
+    parser.add_argument("--duplicates", type=float, default=0.3, help="fraction of redeliveries")
+    args = parser.parse_args()
+
+    # Keep the log call sites (and their f-strings) but not the terminal output
+    logging.getLogger().handlers.clear()
+    logging.getLogger().addHandler(logging.NullHandler())
+    review_app.webhook_configs[REPO_URL] = {"access_token": "t", "webhook_secret": SECRET, "webhook_url": ""}
+    print(f"orjson: {'yes' if webhook_ingest.ORJSON_AVAILABLE else 'no'}")
+    for commits in args.commits:
+        for path in ("/legacy-webhook/", "/webhook/"):
+            asyncio.run(run(path, args.requests, args.concurrency, commits, args.duplicates))
+
+if __name__ == "__main__":
+    main()
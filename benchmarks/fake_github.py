@@ -0,0 +1,168 @@
+"""
+Minimal stand-in for the GitHub REST API, for offline benchmarking. Serves
+one synthetic repository built from this checkout's own Python and Java
+files (the service modules and the loose sample inputs), repeated under
+numbered directories until it has --files files.
+
+Every commit SHA exists: a file's content at a commit is its corpus source
+plus a marker line naming the commit, so each push has fresh blob SHAs and
+review cache keys, just like real new code. Commit and compare diffs report
+every file as changed, with hunks covering --changed-fraction of its lines.
+Issues and comments are accepted and counted.
+
+    python benchmarks/fake_github.py --port 9100 --files 200 --latency 0.02
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import os
+import random
+from typing import Dict, List
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RATE_LIMIT_HEADERS = {"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "4999", "X-RateLimit-Resource": "core"}
+
+def load_corpus() -> Dict[str, str]:
+    """
+    Source files of this checkout, by path relative to the repository root.
+    """
+    corpus = {}
+    for pattern in ("*.py", "*.java", "folder/*.py"):
+        for path in sorted(glob.glob(os.path.join(REPO_ROOT, pattern))):
+            with open(path, encoding="utf-8", errors="replace") as f:
+                corpus[os.path.relpath(path, REPO_ROOT)] = f.read()
+    return corpus
+
+def repo_paths(corpus: Dict[str, str], files: int) -> Dict[str, str]:
+    """
+    Map each path of the synthetic repository to the corpus file it serves.
+    Deterministic, so a benchmark client can rebuild the same listing.
+    """
+    names = sorted(corpus)
+    return {f"src/pkg{i // len(names)}/{names[i % len(names)]}": names[i % len(names)] for i in range(files)}
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha1(":".join(parts).encode()).hexdigest()
+
+def _marker(path: str, commit: str) -> str:
+    comment = "//" if path.endswith(".java") else "#"
+    return f"\n{comment} build {commit}\n"
+
+def _patch(content: str, seed: str, changed_fraction: float) -> str:
+    """
+    A unified diff with a few hunks that together cover about
+    changed_fraction of the file's lines.
+    """
+    line_count = max(content.count("\n"), 1)
+    rng = random.Random(seed)
+    changed = max(int(line_count * changed_fraction), 1)
+    hunks = []
+    for _ in range(max(min(changed // 10, 5), 1)):
+        length = max(changed // 5, 1) if changed >= 10 else changed
+        start = rng.randint(1, max(line_count - length, 1))
+        hunks.append(f"@@ -{start},{length} +{start},{length} @@\n" + "-old\n+new\n" * length)
+    return "".join(hunks)
+
+def create_app(files: int = 100, changed_fraction: float = 0.2, latency: float = 0.0) -> FastAPI:
+    """
+    Build the fake API. latency seconds are added to every request to stand
+    in for the network round trip to api.github.com.
+    """
+    app = FastAPI()
+    corpus = load_corpus()
+    paths = repo_paths(corpus, files)
+    blobs: Dict[str, tuple] = {}  # blob sha -> (path, commit), filled as trees are listed
+    app.state.counts = {}
+    app.state.issues = 0
+    app.state.issue_bytes = 0
+
+    def content_at(path: str, commit: str) -> str:
+        if path not in paths:
+            raise HTTPException(status_code=404, detail="Not Found")
+        return corpus[paths[path]] + _marker(path, commit)
+
+    def diff_files(seed: str) -> List[Dict]:
+        return [
+            {"filename": path, "status": "modified", "patch": _patch(corpus[source], f"{seed}:{path}", changed_fraction)}
+            for path, source in paths.items()
+        ]
+
+    @app.middleware("http")
+    async def simulate(request: Request, call_next):
+        parts = request.url.path.split("/")
+        if parts[1] == "repos":
+            route = "/".join(parts[4:6]) if parts[4] == "git" else parts[4]
+            app.state.counts[route] = app.state.counts.get(route, 0) + 1
+        if latency:
+            await asyncio.sleep(latency)
+        response = await call_next(request)
+        response.headers.update(RATE_LIMIT_HEADERS)
+        return response
+
+    @app.get("/repos/{owner}/{repo}/git/trees/{commit}")
+    async def tree(owner: str, repo: str, commit: str):
+        entries = []
+        for path in paths:
+            sha = _digest(commit, path)
+            blobs[sha] = (path, commit)
+            entries.append({"path": path, "mode": "100644", "type": "blob", "sha": sha})
+        return {"sha": commit, "tree": entries, "truncated": False}
+
+    @app.get("/repos/{owner}/{repo}/git/blobs/{sha}")
+    async def blob(owner: str, repo: str, sha: str):
+        if sha not in blobs:
+            raise HTTPException(status_code=404, detail="Not Found")
+        return PlainTextResponse(content_at(*blobs[sha]))
+
+    @app.get("/repos/{owner}/{repo}/contents/{path:path}")
+    async def contents(owner: str, repo: str, path: str, ref: str = "main"):
+        return PlainTextResponse(content_at(path, ref))
+
+    @app.get("/repos/{owner}/{repo}/commits/{commit}")
+    async def commit_diff(owner: str, repo: str, commit: str):
+        return {"sha": commit, "files": diff_files(commit)}
+
+    @app.get("/repos/{owner}/{repo}/compare/{spec}")
+    async def compare(owner: str, repo: str, spec: str):
+        return {"files": diff_files(spec)}
+
+    @app.post("/repos/{owner}/{repo}/issues")
+    async def create_issue(owner: str, repo: str, request: Request):
+        body = (await request.json()).get("body", "")
+        app.state.issues += 1
+        app.state.issue_bytes += len(body)
+        number = app.state.issues
+        return JSONResponse(status_code=201, content={"number": number, "html_url": f"https://github.com/{owner}/{repo}/issues/{number}"})
+
+    @app.post("/repos/{owner}/{repo}/issues/{number}/comments")
+    async def create_comment(owner: str, repo: str, number: int, request: Request):
+        app.state.issue_bytes += len((await request.json()).get("body", ""))
+        return JSONResponse(status_code=201, content={"id": number})
+
+    @app.post("/repos/{owner}/{repo}/hooks")
+    async def create_hook(owner: str, repo: str):
+        return JSONResponse(status_code=201, content={"id": 1})
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": app.state.counts, "issues": app.state.issues, "issue_bytes": app.state.issue_bytes, "files": len(paths)}
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--files", type=int, default=100, help="files in the synthetic repository")
+    parser.add_argument("--changed-fraction", type=float, default=0.2, help="share of each file's lines a diff touches")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.files, args.changed_fraction, args.latency), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
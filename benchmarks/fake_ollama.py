@@ -0,0 +1,119 @@
+"""
+Minimal stand-in for an Ollama server, for offline benchmarking. Answers
+/api/chat and /api/generate with a canned review after a simulated model
+delay: a base latency plus the time to generate the completion tokens at the
+simulated token rate. Latency, token rate and completion length are each
+drawn from a uniform (mean +/- spread) or lognormal (median, sigma = spread)
+distribution.
+
+    python benchmarks/fake_ollama.py --port 11434 --latency 0.2 --tokens-per-second 40
+    python benchmarks/fake_ollama.py --distribution lognormal --latency 0.5 --jitter 0.6 \
+        --tokens-per-second 30 --tokens-per-second-jitter 0.3 --completion-tokens 150 --completion-tokens-jitter 0.5
+"""
+import argparse
+import asyncio
+import random
+
+from fastapi import FastAPI, Request
+
+CANNED_REVIEW = """1. [STATUS] Needs Fix
+2. [ISSUES]:
+   - Type: READ
+   - Where: line 1
+   - Severity: L
+   - Fix: Add a docstring.
+3. [SUMMARY] Minor readability issue."""
+
+def sample(mean: float, spread: float, distribution: str) -> float:
+    if not spread:
+        return mean
+    if distribution == "lognormal":
+        return mean * random.lognormvariate(0.0, spread)
+    return max(mean + random.uniform(-spread, spread), 0.0)
+
+def create_app(latency: float = 0.2, jitter: float = 0.0, tokens_per_second: float = 0.0,
+               completion_tokens: int = 60, max_concurrency: int = 0, distribution: str = "uniform",
+               tokens_per_second_jitter: float = 0.0, completion_tokens_jitter: float = 0.0) -> FastAPI:
+    """
+    Build the fake server. Each request waits a sampled latency, plus the
+    sampled completion length divided by the sampled token rate when a rate
+    is given. With max_concurrency, only that many requests are served at
+    once, like a GPU box with a fixed number of parallel slots.
+    """
+    app = FastAPI()
+    slots = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+    app.state.requests = 0
+    app.state.in_flight = 0
+    app.state.peak_in_flight = 0
+
+    async def simulate(prompt_chars: int) -> dict:
+        app.state.requests += 1
+        app.state.in_flight += 1
+        app.state.peak_in_flight = max(app.state.peak_in_flight, app.state.in_flight)
+        tokens = max(int(sample(completion_tokens, completion_tokens_jitter, distribution)), 1)
+        try:
+            delay = sample(latency, jitter, distribution)
+            if tokens_per_second:
+                delay += tokens / max(sample(tokens_per_second, tokens_per_second_jitter, distribution), 0.1)
+            if slots is None:
+                await asyncio.sleep(delay)
+            else:
+                async with slots:
+                    await asyncio.sleep(delay)
+        finally:
+            app.state.in_flight -= 1
+        return {
+            "done": True,
+            "prompt_eval_count": prompt_chars // 4,
+            "eval_count": tokens,
+            "total_duration": int(delay * 1e9),
+        }
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        prompt_chars = sum(len(message.get("content", "")) for message in body.get("messages", []))
+        stats = await simulate(prompt_chars)
+        return {"model": body.get("model", ""), "message": {"role": "assistant", "content": CANNED_REVIEW}, **stats}
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        stats = await simulate(len(body.get("prompt", "")))
+        return {"model": body.get("model", ""), "response": CANNED_REVIEW, **stats}
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": "codellama:latest"}]}
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": app.state.requests, "in_flight": app.state.in_flight, "peak_in_flight": app.state.peak_in_flight}
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--distribution", choices=["uniform", "lognormal"], default="uniform")
+    parser.add_argument("--latency", type=float, default=0.2, help="base seconds per request (mean or median)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latency spread: +/- seconds, or lognormal sigma")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="simulated generation rate (0 = off)")
+    parser.add_argument("--tokens-per-second-jitter", type=float, default=0.0)
+    parser.add_argument("--completion-tokens", type=int, default=60)
+    parser.add_argument("--completion-tokens-jitter", type=float, default=0.0)
+    parser.add_argument("--max-concurrency", type=int, default=0, help="requests served at once (0 = unlimited)")
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(
+        create_app(
+            args.latency, args.jitter, args.tokens_per_second, args.completion_tokens, args.max_concurrency,
+            args.distribution, args.tokens_per_second_jitter, args.completion_tokens_jitter,
+        ),
+        host=args.host, port=args.port, log_level="warning",
+    )
+
+if __name__ == "__main__":
+    main()
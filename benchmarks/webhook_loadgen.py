@@ -0,0 +1,319 @@
+"""
+Load generator for a running review service: replays GitHub push deliveries
+against its /webhook/ over real HTTP, each signed with X-Hub-Signature-256
+for the configured secret, and reports ack latency, errors and how the review
+backlog (review_queue_depth on /metrics) grows while it runs.
+
+Deliveries are synthetic pushes, or replayed from a JSON Lines file whose
+lines are either a raw push payload or {"event": ..., "delivery_id": ...,
+"payload": {...}}. The repository URL in replayed payloads is rewritten to
+--repo-url so the signature matches the configured repository.
+
+Open loop (--rate, requests/second, fixed or Poisson arrivals) measures
+latency from each request's scheduled send time, so a stalled server shows
+up as queueing rather than as a slower client. Closed loop (--concurrency)
+keeps that many requests in flight.
+
+With supersede_reviews on (the default), a push merges into the pending job
+of its branch, so review_queue_depth cannot exceed the number of branches
+pushed to (--branches for synthetic pushes, 50 by default). A backlog
+stuck at that value means the workers are behind, not that it stopped
+growing; raise --branches to see how far behind.
+
+    python benchmarks/webhook_loadgen.py --url http://127.0.0.1:8000 --secret s3cret --configure \\
+        --admin-token $ADMIN_TOKEN --rate 50 100 200 --duration 30
+    python benchmarks/webhook_loadgen.py --url http://127.0.0.1:8000 --secret s3cret \\
+        --concurrency 64 --requests 5000 --replay deliveries.jsonl
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import re
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import httpx
+
+DEFAULT_REPO_URL = "https://github.com/bench/repo"
+# Ack latency histogram bucket upper bounds, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+QUEUE_DEPTH_RE = re.compile(r"^review_queue_depth\s+([0-9.eE+-]+)$", re.MULTILINE)
+
+def push_payload(repo_url: str, commits: int, ref: str = "refs/heads/main", files_per_commit: int = 10) -> Dict:
+    """
+    A push event shaped like GitHub's, including the fields the handler ignores.
+    """
+    owner, name = repo_url.rstrip("/").split("/")[-2:]
+    person = {"name": "Bench Author", "email": "bench@example.com", "username": "bench"}
+    return {
+        "ref": ref,
+        "before": uuid.uuid4().hex + "00000000",
+        "after": uuid.uuid4().hex + "00000000",
+        "repository": {
+            "id": 1, "name": name, "full_name": f"{owner}/{name}", "html_url": repo_url,
+            "owner": {"login": owner, "id": 1, "url": f"https://api.github.com/users/{owner}"},
+            "description": "x" * 200, "topics": ["a", "b", "c"],
+        },
+        "pusher": person,
+        "sender": {"login": "bench", "id": 1, "avatar_url": "https://example.com/a.png"},
+        "commits": [
+            {
+                "id": uuid.uuid4().hex + "00000000",
+                "message": "Change things\n\n" + "details " * 40,
+                "timestamp": "2024-01-01T00:00:00Z",
+                "url": f"{repo_url}/commit/{i}",
+                "author": person,
+                "committer": person,
+                "added": [f"src/new_{i}.py"],
+                "modified": [f"src/module_{j}.py" for j in range(files_per_commit)],
+                "removed": [],
+            }
+            for i in range(commits)
+        ],
+        "head_commit": None,
+    }
+
+def signed_headers(body: bytes, secret: str, delivery_id: str, event: str = "push") -> Dict[str, str]:
+    return {
+        "Content-Type": "application/json",
+        "User-Agent": "GitHub-Hookshot/loadgen",
+        "X-GitHub-Event": event,
+        "X-GitHub-Delivery": delivery_id,
+        "X-Hub-Signature-256": "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest(),
+    }
+
+def load_replay(path: str, repo_url: str) -> List[Dict]:
+    """
+    Deliveries from a JSON Lines file, as {"event", "delivery_id", "body"}.
+    """
+    deliveries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            payload = record.get("payload", record)
+            payload.setdefault("repository", {})["html_url"] = repo_url
+            deliveries.append({
+                "event": record.get("event", "push"),
+                "delivery_id": record.get("delivery_id"),
+                "body": json.dumps(payload).encode(),
+            })
+    return deliveries
+
+def synthetic_deliveries(repo_url: str, count: int, commits: int, branches: int) -> List[Dict]:
+    return [
+        {
+            "event": "push",
+            "delivery_id": None,
+            "body": json.dumps(push_payload(repo_url, commits, ref=f"refs/heads/load-{i % branches}")).encode(),
+        }
+        for i in range(count)
+    ]
+
+class Results:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.backlog: List[tuple] = []  # (seconds since start, queue depth)
+
+    def record(self, status: str, latency: Optional[float] = None):
+        """
+        Count a request outcome; only requests actually sent have a latency.
+        """
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if latency is not None:
+            self.latencies.append(latency)
+
+    @property
+    def errors(self) -> int:
+        return sum(count for status, count in self.statuses.items() if not status.startswith("2"))
+
+    def summary(self, elapsed: float) -> Dict:
+        ordered = sorted(self.latencies)
+
+        def pick(fraction):
+            return round(ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] * 1000, 2) if ordered else None
+
+        histogram = {}
+        for latency in ordered:
+            ms = latency * 1000
+            bucket = next((f"<={bound}ms" for bound in LATENCY_BUCKETS_MS if ms <= bound), f">{LATENCY_BUCKETS_MS[-1]}ms")
+            histogram[bucket] = histogram.get(bucket, 0) + 1
+        requests = sum(self.statuses.values())
+        summary = {
+            "requests": requests,
+            "seconds": round(elapsed, 3),
+            "achieved_rps": round(len(ordered) / elapsed, 1) if elapsed else None,
+            "error_rate": round(self.errors / requests, 4) if requests else None,
+            "statuses": self.statuses,
+            "ack_ms": {"p50": pick(0.50), "p90": pick(0.90), "p99": pick(0.99), "max": pick(1.0)},
+            "histogram_ms": histogram,
+        }
+        if len(self.backlog) >= 2:
+            (first_at, first), (last_at, last) = self.backlog[0], self.backlog[-1]
+            summary["backlog"] = {
+                "start": first,
+                "end": last,
+                "max": max(depth for _, depth in self.backlog),
+                "growth_per_second": round((last - first) / (last_at - first_at), 2) if last_at > first_at else 0.0,
+            }
+        return summary
+
+async def queue_depth(client: httpx.AsyncClient) -> Optional[float]:
+    try:
+        response = await client.get("/metrics")
+    except httpx.HTTPError:
+        return None
+    match = QUEUE_DEPTH_RE.search(response.text) if response.status_code == 200 else None
+    return float(match.group(1)) if match else None
+
+async def watch_backlog(client: httpx.AsyncClient, results: Results, started: float, interval: float):
+    while True:
+        depth = await queue_depth(client)
+        if depth is not None:
+            results.backlog.append((time.perf_counter() - started, depth))
+        await asyncio.sleep(interval)
+
+async def run(args, deliveries: List[Dict], rate: float = 0.0, concurrency: int = 0) -> Dict:
+    results = Results()
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    timeout = httpx.Timeout(args.timeout)
+    sent: List[Dict] = []
+
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout) as client:
+        async def send(delivery: Dict, scheduled: float):
+            if sent and random.random() < args.duplicates:
+                # A redelivery of something already sent, as GitHub does on timeouts
+                delivery = random.choice(sent)
+            else:
+                delivery = dict(delivery, delivery_id=(args.keep_delivery_ids and delivery["delivery_id"]) or str(uuid.uuid4()))
+                sent.append(delivery)
+            headers = signed_headers(delivery["body"], args.secret, delivery["delivery_id"], delivery["event"])
+            try:
+                response = await client.post("/webhook/", content=delivery["body"], headers=headers)
+                status = str(response.status_code)
+            except httpx.TimeoutException:
+                status = "timeout"
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            results.record(status, time.perf_counter() - scheduled)
+
+        started = time.perf_counter()
+        watcher = asyncio.create_task(watch_backlog(client, results, started, args.backlog_interval))
+        stop_at = started + args.duration if args.duration else None
+        total = args.requests if not args.duration else None
+        tasks = set()
+        try:
+            if rate:
+                # Open loop: send on schedule, whatever is still in flight (up to max_in_flight)
+                scheduled = started
+                i = 0
+                while (total is None or i < total) and (stop_at is None or scheduled < stop_at):
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    if len(tasks) >= args.max_in_flight:
+                        # Never sent, so kept out of the latency histogram
+                        results.record("client-saturated")
+                    else:
+                        task = asyncio.create_task(send(deliveries[i % len(deliveries)], scheduled))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                    i += 1
+                    scheduled += random.expovariate(rate) if args.arrival == "poisson" else 1.0 / rate
+            else:
+                # Closed loop: each of `concurrency` senders starts its next request when the last one is acked
+                counter = iter(range(total if total is not None else 1 << 62))
+
+                async def sender():
+                    for i in counter:
+                        if stop_at is not None and time.perf_counter() >= stop_at:
+                            return
+                        await send(deliveries[i % len(deliveries)], time.perf_counter())
+
+                await asyncio.gather(*(sender() for _ in range(concurrency)))
+            if tasks:
+                await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - started
+            # One last backlog sample after the final ack
+            depth = await queue_depth(client)
+            if depth is not None:
+                results.backlog.append((time.perf_counter() - started, depth))
+        finally:
+            watcher.cancel()
+    return results.summary(elapsed)
+
+def print_summary(label: str, summary: Dict):
+    ack = summary["ack_ms"]
+    print(f"{label}: {summary['requests']} requests in {summary['seconds']}s ({summary['achieved_rps']} req/s), "
+          f"error rate {summary['error_rate']:.2%}")
+    print(f"  ack ms   p50 {ack['p50']}  p90 {ack['p90']}  p99 {ack['p99']}  max {ack['max']}")
+    print(f"  statuses {summary['statuses']}")
+    width = max(summary["histogram_ms"].values(), default=1)
+    for bucket, count in sorted(summary["histogram_ms"].items(), key=lambda item: float(item[0].strip("<=>ms"))):
+        print(f"  {bucket:>9} {count:7d} {'#' * max(int(40 * count / width), 1)}")
+    if "backlog" in summary:
+        backlog = summary["backlog"]
+        print(f"  backlog  {backlog['start']:.0f} -> {backlog['end']:.0f} (max {backlog['max']:.0f}), "
+              f"{backlog['growth_per_second']:+} jobs/s")
+        if summary.get("branches"):
+            print(f"           (capped at {summary['branches']} branches while pushes supersede/merge per branch)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="base URL of the review service")
+    parser.add_argument("--secret", required=True, help="webhook secret configured for --repo-url")
+    parser.add_argument("--repo-url", default=DEFAULT_REPO_URL)
+    parser.add_argument("--configure", action="store_true",
+                        help="register --repo-url and --secret through /setup-webhook/ first")
+    parser.add_argument("--admin-token", default="", help="the service's ADMIN_TOKEN, needed by --configure")
+    parser.add_argument("--replay", help="JSON Lines file of deliveries to replay")
+    parser.add_argument("--keep-delivery-ids", action="store_true",
+                        help="send replayed deliveries with their recorded X-GitHub-Delivery IDs")
+    parser.add_argument("--commits", type=int, default=3, help="commits per synthetic push")
+    parser.add_argument("--branches", type=int, default=50, help="branches synthetic pushes are spread over")
+    parser.add_argument("--duplicates", type=float, default=0.0, help="fraction of requests that are redeliveries")
+    parser.add_argument("--rate", type=float, nargs="+", help="open loop: target requests/second (one run per value)")
+    parser.add_argument("--arrival", choices=["fixed", "poisson"], default="poisson")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16], help="closed loop: requests in flight")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per run, unless --duration is set")
+    parser.add_argument("--duration", type=float, default=0.0, help="seconds per run")
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--backlog-interval", type=float, default=1.0)
+    parser.add_argument("--json", action="store_true", help="print each run's results as one JSON line")
+    args = parser.parse_args()
+
+    if args.configure:
+        response = httpx.post(f"{args.url}/setup-webhook/", json={
+            "repo_url": args.repo_url, "access_token": "loadgen", "webhook_secret": args.secret,
+        }, headers={"X-Admin-Token": args.admin_token}, timeout=args.timeout)
+        # The configuration is stored before GitHub is called, so a failed hook creation still leaves it usable
+        print(f"setup-webhook: {response.status_code}")
+
+    if args.replay:
+        deliveries = load_replay(args.replay, args.repo_url)
+    else:
+        deliveries = synthetic_deliveries(args.repo_url, 256, args.commits, args.branches)
+
+    runs = [("rate", value) for value in args.rate] if args.rate else [("concurrency", value) for value in args.concurrency]
+    for mode, value in runs:
+        if mode == "rate":
+            summary = asyncio.run(run(args, deliveries, rate=value))
+        else:
+            summary = asyncio.run(run(args, deliveries, concurrency=int(value)))
+        summary[mode] = value
+        if not args.replay:
+            summary["branches"] = args.branches
+        if args.json:
+            print(json.dumps(summary))
+        else:
+            print_summary(f"{mode}={value}", summary)
+
+if __name__ == "__main__":
+    main()
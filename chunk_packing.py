@@ -0,0 +1,173 @@
+import re
+from typing import Collection, Dict, List, Tuple
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z_]+|\d+|\S")
+GROUP_HEADER = re.compile(r"^[\s#*]*\[(\d+)\]", re.MULTILINE)
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap local estimate of LLM tokens for source code: identifiers count
+    roughly one token per four characters, numbers and punctuation one each.
+    """
+    total = 0
+    for piece in TOKEN_PATTERN.findall(text):
+        total += (len(piece) + 3) // 4 if piece[0].isalpha() or piece[0] == "_" else 1
+    return total
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip())
+
+def _statement_boundaries(lines: List[str], language: str) -> List[int]:
+    """
+    Line indexes where a new body-level statement starts: lines at the
+    shallowest body indentation that are outside open brackets (Python) or
+    directly inside the outermost block (Java) and do not close a block.
+    """
+    body_lines = lines[1:]
+    if body_lines and body_lines[-1].strip().startswith("}"):
+        # A closing brace sits at the header's indentation, not the body's
+        body_lines = body_lines[:-1]
+    body = [line for line in body_lines if line.strip()]
+    if not body:
+        return []
+    level = min(_indent(line) for line in body)
+    openers, closers = ("([{", ")]}") if language == "python" else ("{", "}")
+    depth = sum(lines[0].count(c) for c in openers) - sum(lines[0].count(c) for c in closers)
+    base = depth
+    boundaries = []
+    for number, line in enumerate(body_lines, start=1):
+        stripped = line.strip()
+        if stripped and depth == base and _indent(line) == level and not stripped.startswith(("}", ")", "]")):
+            boundaries.append(number)
+        depth += sum(line.count(c) for c in openers) - sum(line.count(c) for c in closers)
+    return boundaries
+
+def split_oversized(code: str, budget: int, language: str) -> List[str]:
+    """
+    Split code into consecutive parts of at most `budget` estimated tokens,
+    cutting only at statement boundaries when possible.
+    """
+    lines = code.splitlines()
+    cut_points = set(_statement_boundaries(lines, language))
+    parts = []
+    current = []
+    current_tokens = 0
+    for number, line in enumerate(lines):
+        line_tokens = estimate_tokens(line) + 1
+        at_boundary = number in cut_points or not cut_points
+        if current and current_tokens + line_tokens > budget and at_boundary:
+            parts.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        parts.append("\n".join(current))
+    return parts
+
+def _pack_sequence(members: List[Dict], budget: int, language: str, group_type: str) -> List[Dict]:
+    units = []
+    group: List[Dict] = []
+    group_tokens = 0
+
+    def flush():
+        nonlocal group, group_tokens
+        if len(group) == 1:
+            member = group[0]
+            units.append({"type": member["type"], "name": member["name"], "code": member["code"], "members": group})
+        elif group:
+            units.append({
+                "type": group_type,
+                "name": ", ".join(member["name"] for member in group),
+                "code": "\n\n".join(f"### [{number}] {member['type']} {member['name']}\n{member['code']}" for number, member in enumerate(group, start=1)),
+                "members": group,
+            })
+        group, group_tokens = [], 0
+
+    for member in members:
+        tokens = estimate_tokens(member["code"])
+        if tokens > budget:
+            flush()
+            parts = split_oversized(member["code"], budget, language)
+            for number, part in enumerate(parts, start=1):
+                units.append({
+                    "type": member["type"],
+                    "name": f"{member['name']} (part {number}/{len(parts)})",
+                    "code": part,
+                    "members": [member],
+                    "part": (number, len(parts)),
+                })
+            continue
+        if group and group_tokens + tokens > budget:
+            flush()
+        group.append(member)
+        group_tokens += tokens
+    flush()
+    return units
+
+def pack_chunks(chunks: List[Dict], budget: int, language: str, use_skeletons: bool = False,
+                skip: Collection[Tuple] = ()) -> List[Dict]:
+    """
+    Turn chunks (and their methods) into the fewest review units that each fit
+    the token budget: adjacent small top-level chunks are merged, adjacent
+    small methods of a class are merged, and oversized ones are split.
+
+    With use_skeletons, a class is reviewed from its skeleton (fields,
+    signatures, docstrings) whenever that elides anything, since method bodies
+    are reviewed on their own. This holds even when none of its methods are
+    left to review (diff mode dropped the unchanged ones).
+
+    Each unit lists its `members`; a member's `key` is ("chunk", i) or
+    ("method", i, j) and is used by unpack_reviews to map results back.
+    Members whose key is in skip are left out (reviewed some other way).
+    """
+    top_level = []
+    for i, chunk in enumerate(chunks):
+        if ("chunk", i) in skip:
+            continue
+        if use_skeletons and chunk.get("skeleton") and chunk["skeleton"] != chunk["code"]:
+            top_level.append({"key": ("chunk", i), "type": f"{chunk['type']} skeleton", "name": chunk["name"], "code": chunk["skeleton"]})
+        else:
+            top_level.append({"key": ("chunk", i), "type": chunk["type"], "name": chunk["name"], "code": chunk["code"]})
+    units = _pack_sequence(top_level, budget, language, "group")
+    for i, chunk in enumerate(chunks):
+        methods = [
+            {"key": ("method", i, j), "type": "method", "name": method["name"], "code": method["code"]}
+            for j, method in enumerate(chunk.get("methods") or [])
+            if ("method", i, j) not in skip
+        ]
+        units.extend(_pack_sequence(methods, budget, language, "methods"))
+    return units
+
+def _split_group_review(review: str, count: int) -> Dict[int, str]:
+    sections = {}
+    matches = list(GROUP_HEADER.finditer(review))
+    for index, match in enumerate(matches):
+        number = int(match.group(1))
+        if not 1 <= number <= count or number in sections:
+            continue
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(review)
+        # Drop the rest of the header line (the unit name)
+        line_end = review.find("\n", match.end(), end)
+        sections[number] = review[line_end if line_end != -1 else end:end].strip()
+    return sections
+
+def unpack_reviews(units: List[Dict], reviews: List[str]) -> Dict[Tuple, str]:
+    """
+    Map unit reviews back to the original chunk/method keys. Group reviews are
+    split on their `### [n]` headers; a member without its own section gets
+    the whole group review. Parts of a split chunk are joined in order.
+    """
+    results: Dict[Tuple, List[str]] = {}
+    for unit, review in zip(units, reviews):
+        review = str(review)
+        members = unit["members"]
+        if "part" in unit:
+            number, count = unit["part"]
+            results.setdefault(members[0]["key"], []).append(f"(part {number}/{count})\n{review}")
+        elif len(members) == 1:
+            results.setdefault(members[0]["key"], []).append(review)
+        else:
+            sections = _split_group_review(review, len(members))
+            for number, member in enumerate(members, start=1):
+                results.setdefault(member["key"], []).append(sections.get(number, review))
+    return {key: "\n\n".join(parts) for key, parts in results.items()}
@@ -0,0 +1,229 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+class ConfigStore(ABC):
+    """
+    Interface for where webhook configurations live. version() must change
+    whenever any configuration changes (in this process or another) so caches
+    can be invalidated; stores that cannot tell return None and caches fall
+    back to their TTL.
+    """
+
+    @abstractmethod
+    def get(self, repo_url: str) -> Optional[Dict]:
+        """
+        The configuration of repo_url, or None if it is not configured.
+        """
+
+    @abstractmethod
+    def put(self, repo_url: str, config: Dict):
+        """
+        Create or replace the configuration of repo_url.
+        """
+
+    @abstractmethod
+    def delete(self, repo_url: str) -> bool:
+        """
+        Remove the configuration of repo_url; returns whether there was one.
+        """
+
+    def version(self) -> Optional[object]:
+        return None
+
+    def close(self):
+        pass
+
+class MemoryConfigStore(ConfigStore):
+    """
+    Per-process store; configurations are lost on restart.
+    """
+
+    def __init__(self):
+        self._configs: Dict[str, Dict] = {}
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self, repo_url: str) -> Optional[Dict]:
+        with self._lock:
+            return self._configs.get(repo_url)
+
+    def put(self, repo_url: str, config: Dict):
+        with self._lock:
+            self._configs[repo_url] = dict(config)
+            self._version += 1
+
+    def delete(self, repo_url: str) -> bool:
+        with self._lock:
+            self._version += 1
+            return self._configs.pop(repo_url, None) is not None
+
+    def version(self) -> Optional[object]:
+        return self._version
+
+class SQLiteConfigStore(ConfigStore):
+    """
+    Configurations in a local SQLite file shared by every worker process on
+    the host. The file and its -wal/-shm files hold access tokens and webhook
+    secrets, so they are created readable by their owner only.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        created = not os.path.exists(db_path)
+        # The umask is process-wide; stores are created at startup, before any other threads
+        previous_umask = os.umask(0o077)
+        try:
+            self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        finally:
+            os.umask(previous_umask)
+        if created:
+            for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+                if os.path.exists(path):
+                    os.chmod(path, 0o600)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS webhook_configs (
+                repo_url TEXT PRIMARY KEY,
+                config TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def get(self, repo_url: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT config FROM webhook_configs WHERE repo_url = ?", (repo_url,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, repo_url: str, config: Dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO webhook_configs (repo_url, config, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(repo_url) DO UPDATE SET config = excluded.config, updated_at = excluded.updated_at",
+                (repo_url, json.dumps(config), time.time()),
+            )
+
+    def delete(self, repo_url: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM webhook_configs WHERE repo_url = ?", (repo_url,))
+            return cursor.rowcount == 1
+
+    def version(self) -> Optional[object]:
+        # data_version changes when another connection commits; our own writes show in total_changes
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0], self._conn.total_changes
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def create_config_store(url: str) -> ConfigStore:
+    """
+    Build a store from a URL: "sqlite:///path/to/file.db" or "memory://".
+    """
+    if url.startswith("sqlite:///"):
+        return SQLiteConfigStore(url[len("sqlite:///"):])
+    if url.startswith("memory:"):
+        return MemoryConfigStore()
+    raise ValueError(f"Unsupported config store: {url}")
+
+class CachedConfigStore:
+    """
+    In-process read-through cache in front of a ConfigStore, so looking up a
+    repository's configuration (e.g. for every webhook signature check) is a
+    dict lookup. The backing store's version() is polled at most every
+    check_interval seconds and the cache is dropped when it changes; entries
+    also expire after ttl. Unknown repositories are cached too, for
+    negative_ttl, so unsigned noise does not reach the store.
+
+    Supports `in`, `[]` and `[]=` so it can stand in for a plain dict.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, store: ConfigStore, ttl: float = 300.0, negative_ttl: float = 5.0, check_interval: float = 1.0):
+        self.store = store
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, tuple] = {}  # repo_url -> (expires at, config or _MISSING)
+        self._version = store.version()
+        self._checked_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _check_version(self, now: float):
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        version = self.store.version()
+        if version is not None and version != self._version:
+            self._version = version
+            self._entries.clear()
+
+    def get(self, repo_url: str, default=None) -> Optional[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(now)
+            entry = self._entries.get(repo_url)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return default if entry[1] is self._MISSING else entry[1]
+        self.misses += 1
+        config = self.store.get(repo_url)
+        with self._lock:
+            if config is None:
+                self._entries[repo_url] = (now + self.negative_ttl, self._MISSING)
+            else:
+                self._entries[repo_url] = (now + self.ttl, config)
+        return default if config is None else config
+
+    async def aget(self, repo_url: str, default=None) -> Optional[Dict]:
+        """
+        get() for the event loop: a fresh cache hit is returned directly, and
+        anything that needs the backing store (a miss or a due version poll)
+        runs in a thread.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(repo_url)
+            if now - self._checked_at < self.check_interval and entry is not None and entry[0] > now:
+                self.hits += 1
+                return default if entry[1] is self._MISSING else entry[1]
+        return await asyncio.to_thread(self.get, repo_url, default)
+
+    def put(self, repo_url: str, config: Dict):
+        self.store.put(repo_url, config)
+        with self._lock:
+            self._entries[repo_url] = (time.monotonic() + self.ttl, dict(config))
+            self._version = self.store.version()
+
+    def delete(self, repo_url: str) -> bool:
+        removed = self.store.delete(repo_url)
+        with self._lock:
+            self._entries.pop(repo_url, None)
+            self._version = self.store.version()
+        return removed
+
+    def __contains__(self, repo_url: str) -> bool:
+        return self.get(repo_url) is not None
+
+    def __getitem__(self, repo_url: str) -> Dict:
+        config = self.get(repo_url)
+        if config is None:
+            raise KeyError(repo_url)
+        return config
+
+    def __setitem__(self, repo_url: str, config: Dict):
+        self.put(repo_url, config)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,75 @@
+import re
+from typing import Dict, List, Tuple
+
+HUNK_HEADER = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+HUNK_SPAN = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@", re.MULTILINE)
+
+def hunk_spans(patch: str) -> List[Tuple[int, int, int, int]]:
+    """
+    (old_start, old_count, new_start, new_count) of each hunk of a unified
+    diff, as written in its header; a missing count means 1. A zero count
+    hunk's start is the line *before* the insertion or deletion point.
+    """
+    return [
+        (int(old_start), int(old_count or 1), int(new_start), int(new_count or 1))
+        for old_start, old_count, new_start, new_count in HUNK_SPAN.findall(patch)
+    ]
+
+def changed_line_ranges(patch: str) -> List[Tuple[int, int]]:
+    """
+    Return the merged 1-based line ranges of the new file touched by a unified
+    diff patch. A pure deletion marks the lines on both sides of where it
+    happened, so the chunk it was cut from is still considered changed even
+    when it lost its last lines.
+    """
+    changed = []
+    new_line = 0
+    for line in patch.splitlines():
+        header = HUNK_HEADER.match(line)
+        if header:
+            new_line = int(header.group(1))
+            continue
+        if not new_line or line.startswith("\\"):
+            continue
+        if line.startswith("+"):
+            changed.append(new_line)
+            new_line += 1
+        elif line.startswith("-"):
+            changed.extend((max(new_line - 1, 1), new_line))
+        else:
+            new_line += 1
+
+    ranges = []
+    for number in sorted(set(changed)):
+        if ranges and number <= ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], number)
+        else:
+            ranges.append((number, number))
+    return ranges
+
+def _overlaps(item: Dict, ranges: List[Tuple[int, int]], context: int) -> bool:
+    start, end = item.get("start_line"), item.get("end_line")
+    if start is None or end is None:
+        # No position information; review it rather than risk missing a change
+        return True
+    # Grouped chunks (imports, global code) list the separate spans they were built from
+    spans = item.get("line_ranges") or [(start, end)]
+    return any(
+        span_start - context <= range_end and range_start <= span_end + context
+        for span_start, span_end in spans
+        for range_start, range_end in ranges
+    )
+
+def select_changed_chunks(chunks: List[Dict], ranges: List[Tuple[int, int]], context: int = 0) -> List[Dict]:
+    """
+    Keep only the chunks (and, for classes, the methods) that overlap a
+    changed line range, widened by `context` lines on each side.
+    """
+    selected = []
+    for chunk in chunks:
+        if not _overlaps(chunk, ranges, context):
+            continue
+        if chunk.get("methods"):
+            chunk = dict(chunk, methods=[method for method in chunk["methods"] if _overlaps(method, ranges, context)])
+        selected.append(chunk)
+    return selected
@@ -0,0 +1,441 @@
+import asyncio
+import hashlib
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+RETRY_STATUS_CODES = {500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# Not replayed from the ETag cache: they describe the original transfer
+TRANSFER_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+class RateLimitExceeded(Exception):
+    """
+    Raised when a GitHub call would have to wait longer than the client allows
+    for the token's rate limit to reset. retry_after is in seconds.
+    """
+
+    def __init__(self, retry_after: float, detail: str = ""):
+        super().__init__(f"GitHub rate limit exceeded; retry in {retry_after:.0f}s{': ' + detail if detail else ''}")
+        self.retry_after = retry_after
+
+def _token_key(authorization: str) -> str:
+    # Never keep raw tokens around as dict keys or in stats output
+    return hashlib.sha256(authorization.encode()).hexdigest()[:12] if authorization else "anonymous"
+
+class RateLimitTracker:
+    """
+    Per-token view of GitHub's core rate limit, updated from the X-RateLimit-*
+    headers of every response. Once a token's remaining budget drops below
+    pace_below of its limit, non-urgent calls are spaced out so the rest of
+    the budget lasts until the reset; the last `reserve` calls are kept for
+    urgent ones (creating issues).
+    """
+
+    def __init__(self, pace_below: float = 0.2, reserve: int = 20):
+        self.pace_below = pace_below
+        self.reserve = reserve
+        self._quotas: Dict[str, Dict] = {}
+
+    def update(self, token_key: str, headers: httpx.Headers):
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None or headers.get("X-RateLimit-Resource", "core") != "core":
+            return
+        quota = self._quotas.setdefault(token_key, {"next_slot": 0.0})
+        quota["remaining"] = int(remaining)
+        quota["limit"] = int(headers.get("X-RateLimit-Limit", quota.get("limit", 5000)))
+        quota["reset"] = float(reset)
+
+    def delay(self, token_key: str, urgent: bool) -> float:
+        """
+        Seconds to wait before the next call with this token, and claim its slot.
+        """
+        quota = self._quotas.get(token_key)
+        if quota is None or "remaining" not in quota:
+            return 0.0
+        now = time.time()
+        if quota["reset"] <= now:
+            # Window has rolled over; the next response brings fresh numbers
+            return 0.0
+        floor = 0 if urgent else self.reserve
+        if quota["remaining"] <= floor:
+            return quota["reset"] - now + 1
+        quota["remaining"] -= 1
+        if urgent or quota["remaining"] >= quota["limit"] * self.pace_below:
+            return 0.0
+        interval = (quota["reset"] - now) / max(quota["remaining"] - self.reserve, 1)
+        slot = max(quota["next_slot"], now)
+        quota["next_slot"] = slot + interval
+        return slot - now
+
+    def stats(self) -> Dict:
+        return {
+            token_key: {key: quota[key] for key in ("remaining", "limit", "reset") if key in quota}
+            for token_key, quota in self._quotas.items()
+        }
+
+class ETagCache:
+    """
+    LRU of GET responses that carried an ETag, bounded by total body size.
+    Entries are revalidated with If-None-Match; a 304 does not count against
+    the rate limit and is answered from here.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key(url: str, token_key: str, accept: str) -> str:
+        return f"{token_key} {accept} {url}"
+
+    def get(self, key: str) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, response: httpx.Response):
+        content = response.content
+        if len(content) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old["content"])
+        self._entries[key] = {
+            "etag": response.headers["ETag"],
+            "headers": [(name, value) for name, value in response.headers.items() if name.lower() not in TRANSFER_HEADERS],
+            "content": content,
+        }
+        self.size += len(content)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted["content"])
+
+    def replay(self, entry: Dict, request: httpx.Request) -> httpx.Response:
+        self.hits += 1
+        return httpx.Response(200, headers=entry["headers"], content=entry["content"], request=request)
+
+    def stats(self) -> Dict:
+        return {"entries": len(self._entries), "size_bytes": self.size, "not_modified": self.hits}
+
+class BlobCache:
+    """
+    In-memory LRU of decoded blob contents keyed by git blob SHA, bounded by
+    total size. Blob SHAs are content hashes, so entries never go stale.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sha: str) -> Optional[str]:
+        with self._lock:
+            content = self._entries.get(sha)
+            if content is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(sha)
+            self.hits += 1
+            return content
+
+    def put(self, sha: str, content: str):
+        size = len(content)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if sha in self._entries:
+                self._entries.move_to_end(sha)
+                return
+            self._entries[sha] = content
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+class GitHubClient:
+    """
+    Application-lifetime GitHub API client with keep-alive pooling, HTTP/2
+    (when the `h2` package is installed), retries with jittered exponential
+    backoff on 5xx responses, conditional GETs against an ETag cache, and
+    per-token rate-limit pacing. Rate-limited calls wait for the reset when it
+    is within max_rate_limit_wait and raise RateLimitExceeded otherwise.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "https://api.github.com",
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        verify: bool = False,
+        max_rate_limit_wait: float = 60.0,
+        etag_cache_max_bytes: int = 32 * 1024 * 1024,
+        rate_limit_pace_below: float = 0.2,
+        rate_limit_reserve: int = 20,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_rate_limit_wait = max_rate_limit_wait
+        self.etag_cache = ETagCache(etag_cache_max_bytes)
+        self.rate_limits = RateLimitTracker(rate_limit_pace_below, rate_limit_reserve)
+        self.conditional_requests = 0
+        self._client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            verify=verify,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        )
+        if not HTTP2_AVAILABLE:
+            logger.info("h2 is not installed; GitHub client falls back to HTTP/1.1 keep-alive")
+
+    def url(self, path: str) -> str:
+        """
+        Build an absolute API URL from a path such as /repos/{owner}/{repo}/issues.
+        """
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        # Full jitter: uniform in [0, base * 2^attempt]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _rate_limit_wait(self, attempt: int, response: httpx.Response) -> Optional[float]:
+        """
+        Seconds to wait before retrying a rate-limited (403/429) response, or
+        None if the response is not a rate-limit error.
+        """
+        if response.status_code not in (403, 429):
+            return None
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            reset = response.headers.get("X-RateLimit-Reset")
+            if reset and reset.isdigit():
+                return max(float(reset) - time.time(), 0.0) + 1
+        if response.status_code == 429:
+            return self._backoff(attempt, None)
+        if "rate limit" in response.text.lower():
+            # Secondary rate limit without Retry-After: GitHub asks for at least a minute
+            return 60.0 * (2 ** attempt)
+        return None
+
+    async def request(self, method: str, url: str, urgent: Optional[bool] = None, **kwargs) -> httpx.Response:
+        """
+        Send a request, retrying transient failures. Non-idempotent requests are
+        only retried on rate limits and failures to connect, where GitHub has not
+        acted on them; a dropped connection (RemoteProtocolError) may come after
+        the write was applied, so only idempotent requests retry on it. GETs are
+        sent conditionally when an ETag is cached. Calls are urgent (exempt from
+        pacing) unless they are GETs.
+        """
+        method = method.upper()
+        if not url.startswith(("http://", "https://")):
+            url = self.url(url)
+        if urgent is None:
+            urgent = method not in ("GET", "HEAD")
+        headers = dict(kwargs.pop("headers", None) or {})
+        token_key = _token_key(headers.get("Authorization", ""))
+        cache_key = cached = None
+        if method == "GET":
+            cache_key = ETagCache.key(url, token_key, headers.get("Accept", ""))
+            cached = self.etag_cache.get(cache_key)
+            if cached is not None:
+                headers["If-None-Match"] = cached["etag"]
+                self.conditional_requests += 1
+        attempt = 0
+        while True:
+            wait = self.rate_limits.delay(token_key, urgent)
+            if wait > self.max_rate_limit_wait:
+                raise RateLimitExceeded(wait, f"{method} {url}")
+            if wait > 0:
+                await asyncio.sleep(wait)
+            
+            response = None
+            try:
+                response = await self._client.request(method, url, headers=headers, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError) as e:
+                unsent = not isinstance(e, httpx.RemoteProtocolError)
+                if attempt >= self.max_retries or not (unsent or method in IDEMPOTENT_METHODS):
+                    raise
+                logger.warning(f"GitHub request {method} {url} failed: {e}; retrying")
+                delay = self._backoff(attempt, None)
+            else:
+                self.rate_limits.update(token_key, response.headers)
+                if response.status_code == 304 and cached is not None:
+                    return self.etag_cache.replay(cached, response.request)
+                delay = self._rate_limit_wait(attempt, response)
+                if delay is not None:
+                    if delay > self.max_rate_limit_wait or attempt >= self.max_retries:
+                        raise RateLimitExceeded(delay, f"{method} {url} returned {response.status_code}")
+                    logger.warning(f"GitHub rate limit on {method} {url}; retrying in {delay:.0f}s")
+                else:
+                    retryable = response.status_code in RETRY_STATUS_CODES and method in IDEMPOTENT_METHODS
+                    if not retryable or attempt >= self.max_retries:
+                        if cache_key is not None and response.status_code == 200 and "ETag" in response.headers:
+                            self.etag_cache.put(cache_key, response)
+                        return response
+                    logger.warning(f"GitHub request {method} {url} returned {response.status_code}; retrying")
+                    delay = self._backoff(attempt, response)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> Dict:
+        return {
+            "rate_limits": self.rate_limits.stats(),
+            "etag_cache": dict(self.etag_cache.stats(), conditional_requests=self.conditional_requests),
+        }
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def fetch_files_at_commit(
+        self,
+        owner: str,
+        repo: str,
+        commit_sha: str,
+        paths: Iterable[str],
+        access_token: str,
+        blob_cache: Optional[BlobCache] = None,
+        concurrency: int = 8,
+    ) -> Dict[str, str]:
+        """
+        Fetch the given files as they are at commit_sha.
+
+        The commit's tree is resolved once, then every distinct blob is
+        downloaded concurrently (files sharing a blob SHA are downloaded once)
+        and served from blob_cache when already known. Paths that do not exist
+        at the commit are left out of the result.
+        """
+        wanted = set(paths)
+        if not wanted:
+            return {}
+        headers = {
+            "Authorization": f"token {access_token}",
+            "Accept": "application/vnd.github.v3+json"
+        }
+        response = await self.get(f"/repos/{owner}/{repo}/git/trees/{commit_sha}?recursive=1", headers=headers)
+        if response.status_code != 200:
+            raise httpx.HTTPStatusError(
+                f"Failed to fetch tree {commit_sha}: {response.status_code}",
+                request=response.request,
+                response=response,
+            )
+        tree = response.json()
+        blob_shas = {
+            entry["path"]: entry["sha"]
+            for entry in tree.get("tree", [])
+            if entry.get("type") == "blob" and entry.get("path") in wanted
+        }
+
+        contents_by_sha = {}
+        to_download = set()
+        for sha in set(blob_shas.values()):
+            cached = blob_cache.get(sha) if blob_cache is not None else None
+            if cached is None:
+                to_download.add(sha)
+            else:
+                contents_by_sha[sha] = cached
+
+        raw_headers = {
+            "Authorization": f"token {access_token}",
+            "Accept": "application/vnd.github.v3.raw"
+        }
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def download(sha: str):
+            async with semaphore:
+                blob = await self.get(f"/repos/{owner}/{repo}/git/blobs/{sha}", headers=raw_headers)
+            if blob.status_code != 200:
+                logger.error(f"Failed to fetch blob {sha}: {blob.status_code}")
+                return
+            content = blob.content.decode("utf-8", errors="replace")
+            contents_by_sha[sha] = content
+            if blob_cache is not None:
+                blob_cache.put(sha, content)
+
+        await asyncio.gather(*(download(sha) for sha in to_download))
+
+        files = {path: contents_by_sha[sha] for path, sha in blob_shas.items() if sha in contents_by_sha}
+
+        # A truncated tree listing may omit files; fall back to the contents API for those
+        if tree.get("truncated"):
+            async def fetch_contents(path: str):
+                async with semaphore:
+                    resp = await self.get(f"/repos/{owner}/{repo}/contents/{path}?ref={commit_sha}", headers=raw_headers)
+                if resp.status_code == 200:
+                    files[path] = resp.text
+
+            await asyncio.gather(*(fetch_contents(path) for path in wanted - blob_shas.keys()))
+        return files
+
+    async def _collect_patches(self, url: str, access_token: str) -> Dict[str, Optional[str]]:
+        headers = {
+            "Authorization": f"token {access_token}",
+            "Accept": "application/vnd.github.v3+json"
+        }
+        patches = {}
+        while url:
+            response = await self.get(url, headers=headers)
+            if response.status_code != 200:
+                raise httpx.HTTPStatusError(
+                    f"Failed to fetch {url}: {response.status_code}",
+                    request=response.request,
+                    response=response,
+                )
+            for changed in response.json().get("files", []):
+                patches[changed["filename"]] = changed.get("patch")
+            url = response.links.get("next", {}).get("url")
+        return patches
+
+    async def get_commit_patches(self, owner: str, repo: str, commit_sha: str, access_token: str) -> Dict[str, Optional[str]]:
+        """
+        Map each file changed by a commit to its unified diff patch. The patch
+        is None when GitHub omits it (binary or very large diffs).
+        """
+        return await self._collect_patches(f"/repos/{owner}/{repo}/commits/{commit_sha}", access_token)
+
+    async def get_compare_patches(self, owner: str, repo: str, base_sha: str, head_sha: str, access_token: str) -> Dict[str, Optional[str]]:
+        """
+        Same as get_commit_patches, for the combined diff between two commits.
+        """
+        return await self._collect_patches(f"/repos/{owner}/{repo}/compare/{base_sha}...{head_sha}", access_token)
+
+    async def aclose(self):
+        await self._client.aclose()
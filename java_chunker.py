@@ -0,0 +1,346 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import javalang
+
+logger = logging.getLogger(__name__)
+
+# Files larger than this skip the full javalang parse and use the lexer-only path
+JAVA_FAST_PATH_BYTES = 200_000
+
+TYPE_KEYWORDS = {"class": "class", "interface": "interface", "enum": "enum"}
+DECLARATION_TYPES = {
+    javalang.tree.ClassDeclaration: "class",
+    javalang.tree.InterfaceDeclaration: "interface",
+    javalang.tree.EnumDeclaration: "enum",
+    javalang.tree.AnnotationDeclaration: "annotation",
+}
+
+def _is_sep(token, value: str) -> bool:
+    return isinstance(token, javalang.tokenizer.Separator) and token.value == value
+
+def brace_skeleton(lines: List[str], start_line: int, end_line: int, bodies: List[Tuple[int, int]]) -> str:
+    """
+    Lines start_line..end_line with the inside of each (open_line, close_line)
+    body replaced by `...`. Bodies nested in an elided one are skipped.
+    """
+    parts = []
+    line = start_line
+    for open_line, close_line in sorted(bodies):
+        if close_line <= open_line or open_line < line:
+            continue
+        parts.extend(lines[line - 1:open_line])
+        opening = lines[open_line - 1]
+        indent = opening[:len(opening) - len(opening.lstrip())]
+        closing = lines[close_line - 1].lstrip()
+        parts.append(f"{indent}    ...")
+        parts.append(indent + (closing if closing.startswith("}") else "}"))
+        line = close_line + 1
+    parts.extend(lines[line - 1:end_line])
+    return "\n".join(parts)
+
+class TokenIndex:
+    """
+    One tokenization of a Java file plus matching-bracket tables for braces
+    and parentheses. Strings, chars and comments are handled by the lexer, so
+    brackets inside them are never counted.
+    """
+
+    def __init__(self, file_content: str):
+        self.lines = file_content.splitlines()
+        self.tokens = list(javalang.tokenizer.tokenize(file_content))
+        self.match: Dict[int, int] = {}
+        self.by_position = {}
+        stacks = {"{": [], "(": []}
+        closers = {"}": "{", ")": "("}
+        for index, token in enumerate(self.tokens):
+            self.by_position[(token.position.line, token.position.column)] = index
+            if not isinstance(token, javalang.tokenizer.Separator):
+                continue
+            if token.value in stacks:
+                stacks[token.value].append(index)
+            elif token.value in closers:
+                stack = stacks[closers[token.value]]
+                if not stack:
+                    raise ValueError(f"Unbalanced '{token.value}' at line {token.position.line}")
+                opener = stack.pop()
+                self.match[opener] = index
+                self.match[index] = opener
+        if stacks["{"] or stacks["("]:
+            raise ValueError("Unbalanced brackets at end of file")
+
+    def declaration_start(self, index: int) -> int:
+        """
+        Walk back from a declaration's name/keyword token over its modifiers
+        and annotations to the previous member boundary.
+        """
+        j = index - 1
+        while j >= 0:
+            token = self.tokens[j]
+            if _is_sep(token, ")"):
+                j = self.match[j] - 1
+                continue
+            if isinstance(token, javalang.tokenizer.Separator) and token.value in ("{", "}", ";"):
+                break
+            j -= 1
+        return j + 1
+
+    def body_open(self, index: int) -> Optional[int]:
+        """
+        First '{' after index outside parentheses, or None if a ';' comes first
+        (abstract and interface methods).
+        """
+        j = index
+        while j < len(self.tokens):
+            token = self.tokens[j]
+            if _is_sep(token, "("):
+                j = self.match[j] + 1
+                continue
+            if _is_sep(token, "{"):
+                return j
+            if _is_sep(token, ";"):
+                return None
+            j += 1
+        return None
+
+    def span(self, start: int, end: int) -> Tuple[int, int, str]:
+        start_line = self.tokens[start].position.line
+        end_line = self.tokens[end].position.line
+        return start_line, end_line, "\n".join(self.lines[start_line - 1:end_line])
+
+    def skeleton(self, start_line: int, end_line: int, bodies: List[Tuple[int, int]]) -> str:
+        return brace_skeleton(self.lines, start_line, end_line, bodies)
+
+    def body_lines(self, index: int) -> Optional[Tuple[int, int]]:
+        """
+        Lines of the '{' and matching '}' of the body following token index.
+        """
+        open_brace = self.body_open(index)
+        if open_brace is None:
+            return None
+        return self.tokens[open_brace].position.line, self.tokens[self.match[open_brace]].position.line
+
+    def header_chunks(self) -> List[Dict]:
+        """
+        package and import statements, sliced from the source so static and
+        wildcard imports are kept as written.
+        """
+        chunks = []
+        imports = []
+        index = 0
+        while index < len(self.tokens):
+            token = self.tokens[index]
+            if _is_sep(token, "{"):
+                index = self.match[index] + 1
+                continue
+            if isinstance(token, javalang.tokenizer.Keyword) and token.value in ("package", "import"):
+                end = index
+                while end < len(self.tokens) and not _is_sep(self.tokens[end], ";"):
+                    end += 1
+                start = self.declaration_start(index) if token.value == "package" else index
+                start_line, end_line, code = self.span(start, min(end, len(self.tokens) - 1))
+                if token.value == "package":
+                    chunks.append({
+                        "type": "package",
+                        "name": "package",
+                        "code": code,
+                        "start_line": start_line,
+                        "end_line": end_line
+                    })
+                else:
+                    imports.append((start_line, end_line, code))
+                index = end + 1
+                continue
+            index += 1
+        if imports:
+            chunks.append({
+                "type": "imports",
+                "name": "imports",
+                "code": "\n".join(code for _, _, code in imports),
+                "start_line": imports[0][0],
+                "end_line": imports[-1][1],
+                "line_ranges": [(start, end) for start, end, _ in imports]
+            })
+        return chunks
+
+def _type_chunk(index: TokenIndex, kind: str, name: str, name_token: int, methods: List[Dict],
+                bodies: List[Tuple[int, int]]) -> Optional[Dict]:
+    open_brace = index.body_open(name_token)
+    if open_brace is None:
+        return None
+    start_line, end_line, code = index.span(index.declaration_start(name_token), index.match[open_brace])
+    return {
+        "type": kind,
+        "name": name,
+        "code": code,
+        "methods": methods,
+        "start_line": start_line,
+        "end_line": end_line,
+        # Fields and signatures only; method and nested type bodies are reviewed on their own
+        "skeleton": index.skeleton(start_line, end_line, bodies)
+    }
+
+def _method_chunk(index: TokenIndex, name: str, name_token: int) -> Optional[Dict]:
+    open_brace = index.body_open(name_token)
+    if open_brace is None:
+        return None
+    start_line, end_line, code = index.span(index.declaration_start(name_token), index.match[open_brace])
+    return {
+        "type": "method",
+        "name": name,
+        "code": code,
+        "start_line": start_line,
+        "end_line": end_line
+    }
+
+def _chunks_from_ast(index: TokenIndex, declarations, prefix: str = "") -> List[Dict]:
+    chunks = []
+    for declaration in declarations:
+        kind = DECLARATION_TYPES.get(type(declaration))
+        if kind is None or declaration.position is None:
+            continue
+        name = prefix + declaration.name
+        body = declaration.body
+        members = body.declarations if isinstance(body, javalang.tree.EnumBody) else (body or [])
+        methods = []
+        nested = []
+        bodies = []
+        for member in members:
+            if isinstance(member, (javalang.tree.MethodDeclaration, javalang.tree.ConstructorDeclaration)) and member.position:
+                member_token = index.by_position.get((member.position.line, member.position.column))
+                if member_token is None:
+                    continue
+                # The AST position points at the return type; the name token follows
+                while member_token < len(index.tokens) and index.tokens[member_token].value != member.name:
+                    member_token += 1
+                method = _method_chunk(index, member.name, member_token)
+                if method:
+                    methods.append(method)
+                    bodies.append(index.body_lines(member_token))
+            elif type(member) in DECLARATION_TYPES and member.position:
+                nested.append(member)
+                nested_token = index.by_position.get((member.position.line, member.position.column))
+                if nested_token is not None and index.body_lines(nested_token):
+                    bodies.append(index.body_lines(nested_token))
+        name_token = index.by_position.get((declaration.position.line, declaration.position.column))
+        if name_token is None:
+            continue
+        chunk = _type_chunk(index, kind, name, name_token, methods, bodies)
+        if chunk:
+            chunks.append(chunk)
+        chunks.extend(_chunks_from_ast(index, nested, prefix=name + "."))
+    return chunks
+
+def _scan_members(index: TokenIndex, start: int, end: int, owner: str = "",
+                  prefix: str = "") -> Tuple[List[Dict], List[Dict], List[Tuple[int, int]]]:
+    """
+    Lexer-only structure scan of the members between token indexes start and
+    end (exclusive). Returns the methods/constructors with bodies that belong
+    to the enclosing type `owner`, the chunks of the type declarations found
+    (including records, recursing into nested type bodies), and the
+    (open_line, close_line) of every member body for the owner's skeleton.
+    """
+    tokens = index.tokens
+    methods = []
+    chunks = []
+    bodies = []
+    type_decl = None    # (kind, name, name token) of a type header in the current member
+    method_name = None  # (name, name token) of a method header in the current member
+    is_field = False
+    i = start
+    while i < end:
+        token = tokens[i]
+        previous = tokens[i - 1] if i > start else None
+        if isinstance(token, javalang.tokenizer.Separator):
+            if token.value == "(":
+                if method_name is None and type_decl is None and not is_field \
+                        and isinstance(previous, javalang.tokenizer.Identifier):
+                    before = tokens[i - 2].value if i - 1 > start else "{"
+                    # Enum constants look like calls; only a constructor may follow a boundary directly
+                    is_boundary = before in ("{", "}", ";", ",")
+                    if before not in ("new", ".", "@") and (not is_boundary or previous.value == owner):
+                        method_name = (previous.value, i - 1)
+                i = index.match[i] + 1
+                continue
+            if token.value == "{":
+                close = index.match[i]
+                if type_decl is not None:
+                    kind, name, name_token = type_decl
+                    qualified = prefix + name
+                    start_line, end_line, code = index.span(index.declaration_start(name_token), close)
+                    own_methods, nested, own_bodies = _scan_members(index, i + 1, close, owner=name, prefix=qualified + ".")
+                    chunks.append({
+                        "type": kind,
+                        "name": qualified,
+                        "code": code,
+                        "methods": own_methods,
+                        "start_line": start_line,
+                        "end_line": end_line,
+                        "skeleton": index.skeleton(start_line, end_line, own_bodies)
+                    })
+                    chunks.extend(nested)
+                    bodies.append((token.position.line, tokens[close].position.line))
+                elif method_name is not None:
+                    name, name_token = method_name
+                    start_line, end_line, code = index.span(index.declaration_start(name_token), close)
+                    methods.append({
+                        "type": "method",
+                        "name": name,
+                        "code": code,
+                        "start_line": start_line,
+                        "end_line": end_line
+                    })
+                    bodies.append((token.position.line, tokens[close].position.line))
+                type_decl, method_name, is_field = None, None, False
+                i = close + 1
+                continue
+            if token.value == ";":
+                type_decl, method_name, is_field = None, None, False
+        elif type_decl is None and method_name is None:
+            if isinstance(token, javalang.tokenizer.Keyword) and token.value in TYPE_KEYWORDS \
+                    and not (previous is not None and previous.value == ".") and i + 1 < end:
+                annotation = token.value == "interface" and previous is not None and previous.value == "@"
+                type_decl = ("annotation" if annotation else TYPE_KEYWORDS[token.value], tokens[i + 1].value, i + 1)
+            elif isinstance(token, javalang.tokenizer.Identifier) and token.value == "record" and i + 2 < end \
+                    and isinstance(tokens[i + 1], javalang.tokenizer.Identifier) and tokens[i + 2].value in ("(", "<"):
+                type_decl = ("record", tokens[i + 1].value, i + 1)
+            elif isinstance(token, javalang.tokenizer.Operator) and token.value == "=":
+                is_field = True
+        i += 1
+    return methods, chunks, bodies
+
+def split_java_code(file_content: str, fast: Optional[bool] = None) -> List[Dict]:
+    """
+    Split Java source into package, imports and one chunk per type declaration
+    (classes, interfaces, enums, records, annotation types, nested types under
+    qualified names), each with its methods and constructors and a `skeleton`
+    with their bodies elided.
+
+    The file is tokenized once; a brace/parenthesis index built from the
+    tokens gives every span without rescanning lines. Large files (or
+    fast=True) skip the javalang parser and derive structure from the tokens
+    alone; the lexer path is also used when the parser rejects the file.
+    """
+    try:
+        index = TokenIndex(file_content)
+    except (javalang.tokenizer.LexerError, ValueError) as e:
+        logger.error(f"Java chunking error: {e}")
+        return [{
+            "type": "code_block",
+            "name": "full_code",
+            "code": file_content,
+            "start_line": 1,
+            "end_line": max(len(file_content.splitlines()), 1)
+        }]
+
+    chunks = index.header_chunks()
+    if fast is None:
+        fast = len(file_content) > JAVA_FAST_PATH_BYTES
+    if not fast:
+        try:
+            tree = javalang.parser.Parser(index.tokens).parse()
+            return chunks + _chunks_from_ast(index, tree.types)
+        except javalang.parser.JavaSyntaxError as e:
+            logger.warning(f"Java parsing error, falling back to lexer-only chunking: {e.description} at {e.at}")
+    _, type_chunks, _ = _scan_members(index, 0, len(index.tokens))
+    return chunks + type_chunks
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+class LLMExecutor:
+    """
+    Bounded thread pool for blocking LLM calls (CrewAI kickoff) so they never
+    run on the event loop. Tracks queue depth and time spent waiting for a
+    free thread.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    def _call(self, submitted_at: float, fn: Callable, args: tuple):
+        started_at = time.monotonic()
+        waited = started_at - submitted_at
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        ok = False
+        try:
+            result = fn(*args)
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.total_run_seconds += time.monotonic() - started_at
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    async def run(self, fn: Callable, *args):
+        """
+        Run fn(*args) on the pool and await its result. Cancelling the await
+        drops the call if it has not started yet; a running call finishes in
+        its thread and its result is discarded.
+        """
+        with self._lock:
+            self.queued += 1
+        future = self._executor.submit(self._call, time.monotonic(), fn, args)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if future.cancel():
+                with self._lock:
+                    self.queued -= 1
+            raise
+
+    def stats(self) -> Dict:
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                "max_workers": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_wait_seconds": self.total_wait_seconds / finished if finished else 0.0,
+                "max_wait_seconds": self.max_wait_seconds,
+                "avg_run_seconds": self.total_run_seconds / finished if finished else 0.0,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List
+
+from review_backends import ReviewBackend
+
+logger = logging.getLogger(__name__)
+
+class Endpoint:
+    """
+    One model endpoint with its outstanding-request count and an AIMD
+    concurrency limit: +1/limit per good response, x0.9 when latency drifts
+    above its long-run average, x0.5 on errors.
+    """
+
+    def __init__(self, backend: ReviewBackend, initial_limit: int, max_limit: int):
+        self.backend = backend
+        self.url = getattr(backend, "base_url", backend.name)
+        self.limit = float(initial_limit)
+        self.max_limit = max_limit
+        self.outstanding = 0
+        self.healthy = True
+        self.ejected_until = 0.0
+        self.consecutive_failures = 0
+        self.short_latency = None  # fast EWMA, tracks current load
+        self.long_latency = None  # slow EWMA, the endpoint's normal latency
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def has_capacity(self) -> bool:
+        return self.outstanding < max(int(self.limit), 1)
+
+    def on_success(self, latency: float, tolerance: float):
+        self.completed += 1
+        self.consecutive_failures = 0
+        if self.short_latency is None:
+            self.short_latency = self.long_latency = latency
+        else:
+            self.short_latency += 0.3 * (latency - self.short_latency)
+            self.long_latency += 0.02 * (latency - self.long_latency)
+        if self.short_latency > self.long_latency * tolerance:
+            self.limit = max(self.limit * 0.9, 1.0)
+        else:
+            self.limit = min(self.limit + 1.0 / self.limit, float(self.max_limit))
+
+    def on_failure(self):
+        self.failed += 1
+        self.consecutive_failures += 1
+        self.limit = max(self.limit * 0.5, 1.0)
+
+    def stats(self) -> Dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "ejected": self.ejected_until > time.monotonic(),
+            "outstanding": self.outstanding,
+            "limit": round(self.limit, 2),
+            "completed": self.completed,
+            "failed": self.failed,
+            "latency_ms": round(self.short_latency * 1000, 1) if self.short_latency is not None else None,
+        }
+
+class LLMRouter(ReviewBackend):
+    """
+    Spreads review calls over several model endpoints. Each call goes to the
+    eligible endpoint with the fewest outstanding requests that is under its
+    concurrency limit, waiting for a slot when all are full. Endpoints are
+    ejected after repeated failures or a failed health check and readmitted
+    once healthy; if every endpoint is down, all of them are tried anyway.
+    """
+
+    name = "router"
+
+    def __init__(
+        self,
+        backends: List[ReviewBackend],
+        initial_limit: int = 4,
+        max_limit: int = 16,
+        latency_tolerance: float = 2.0,
+        failure_threshold: int = 3,
+        ejection_seconds: float = 30.0,
+        health_interval: float = 10.0,
+        max_attempts: int = 2,
+    ):
+        super().__init__()
+        self.endpoints = [Endpoint(backend, initial_limit, max_limit) for backend in backends]
+        self.latency_tolerance = latency_tolerance
+        self.failure_threshold = failure_threshold
+        self.ejection_seconds = ejection_seconds
+        self.health_interval = health_interval
+        self.max_attempts = max_attempts
+        self._condition = asyncio.Condition()
+        self._health_task = None
+
+    def start(self):
+        if self._health_task is None and self.health_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    def _eligible(self) -> List[Endpoint]:
+        now = time.monotonic()
+        up = [endpoint for endpoint in self.endpoints if endpoint.healthy and endpoint.ejected_until <= now]
+        return up or self.endpoints
+
+    async def _acquire(self, tried: List[Endpoint]) -> Endpoint:
+        async with self._condition:
+            while True:
+                open_endpoints = [endpoint for endpoint in self._eligible() if endpoint.has_capacity]
+                # Retries prefer an endpoint that has not failed this call yet
+                candidates = [endpoint for endpoint in open_endpoints if endpoint not in tried] or open_endpoints
+                if candidates:
+                    endpoint = min(candidates, key=lambda e: (e.outstanding, e.outstanding / e.limit))
+                    endpoint.outstanding += 1
+                    return endpoint
+                try:
+                    # Wake up periodically so expiring ejections are noticed
+                    await asyncio.wait_for(self._condition.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _release(self, endpoint: Endpoint):
+        async with self._condition:
+            endpoint.outstanding -= 1
+            self._condition.notify_all()
+
+    async def review(self, task: Dict) -> str:
+        tried = []
+        error = None
+        for attempt in range(self.max_attempts):
+            endpoint = await self._acquire(tried)
+            started = time.monotonic()
+            try:
+                result = await endpoint.backend.review(task)
+            except Exception as e:
+                error = e
+                tried.append(endpoint)
+                endpoint.on_failure()
+                logger.warning(f"Review call to {endpoint.url} failed (attempt {attempt + 1}): {e!r}")
+                if endpoint.consecutive_failures >= self.failure_threshold:
+                    endpoint.ejected_until = time.monotonic() + self.ejection_seconds
+                    logger.warning(f"Ejecting {endpoint.url} for {self.ejection_seconds:.0f}s after {endpoint.consecutive_failures} failures")
+                continue
+            else:
+                endpoint.on_success(time.monotonic() - started, self.latency_tolerance)
+                return result
+            finally:
+                await self._release(endpoint)
+        raise error
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            results = await asyncio.gather(*(endpoint.backend.health() for endpoint in self.endpoints), return_exceptions=True)
+            for endpoint, ok in zip(self.endpoints, results):
+                ok = ok is True
+                if ok != endpoint.healthy:
+                    logger.warning(f"Model endpoint {endpoint.url} is {'healthy again' if ok else 'failing health checks'}")
+                endpoint.healthy = ok
+            async with self._condition:
+                self._condition.notify_all()
+
+    def stats(self) -> Dict:
+        totals = [endpoint.backend.stats() for endpoint in self.endpoints]
+        return {
+            "backend": self.name,
+            "calls": sum(total["calls"] for total in totals),
+            "prompt_tokens": sum(total["prompt_tokens"] for total in totals),
+            "completion_tokens": sum(total["completion_tokens"] for total in totals),
+            "endpoints": [endpoint.stats() for endpoint in self.endpoints],
+        }
+
+    async def aclose(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        for endpoint in self.endpoints:
+            await endpoint.backend.aclose()
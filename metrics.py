@@ -0,0 +1,171 @@
+import contextvars
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+# Repository the current review belongs to; set once per review and inherited
+# by every task it spawns, so deep call sites can label metrics without
+# threading the repo through
+repo_label: contextvars.ContextVar = contextvars.ContextVar("repo_label", default="")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+
+    def _labels(self, key: Tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    """
+    Monotonic counter. Labels are passed as a tuple in labelnames order.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, labels: Tuple = (), amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in list(self._values.items()):
+            lines.append(f"{self.name}{self._labels(key)} {value}")
+        return lines
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: Tuple = (), amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) - amount
+
+    def set(self, labels: Tuple = (), value: float = 0.0):
+        self._values[labels] = value
+
+class Histogram(_Metric):
+    """
+    Fixed-bucket histogram. observe() is one bisect and two additions; the
+    cumulative bucket counts are only built at scrape time.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List] = {}  # labels -> [per-bucket counts (+Inf last), sum]
+
+    def observe(self, labels: Tuple, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def time(self, labels: Tuple = ()) -> "_Timer":
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, (counts, total) in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{self._labels(key, bucket_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {total}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: Tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(self.labels, time.perf_counter() - self.started)
+        return False
+
+class Registry:
+    """
+    Metrics owned by this process. Recording is not locked: all of it happens
+    on the event loop thread.
+    """
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self._add(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self._add(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self._add(Histogram(*args, **kwargs))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# One registry per process: nothing is shared between uvicorn workers or
+# worker.py processes, so each process must be scraped on its own
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "review_stage_seconds", "Time spent in each review pipeline stage", ("stage", "repo", "language")
+)
+LLM_CALL_SECONDS = registry.histogram(
+    "review_llm_call_seconds", "Latency of model review calls, excluding cache hits", ("repo", "language", "kind")
+)
+LLM_CALLS = registry.counter(
+    "review_llm_calls_total", "Review calls by outcome (ok, cached, error, skipped by static checks)", ("repo", "language", "kind", "result")
+)
+PROMPT_TOKENS = registry.counter(
+    "review_prompt_tokens_total", "Prompt tokens sent to the model", ("repo", "language")
+)
+COMPLETION_TOKENS = registry.counter(
+    "review_completion_tokens_total", "Completion tokens generated by the model", ("repo", "language")
+)
+REVIEWS_IN_FLIGHT = registry.gauge(
+    "reviews_in_flight", "Pushes currently being reviewed", ("repo",)
+)
+QUEUE_DEPTH = registry.gauge(
+    "review_queue_depth", "Review jobs pending or running"
+)
+WEBHOOK_DELIVERIES = registry.counter(
+    "review_webhook_deliveries_total", "Webhook deliveries by event and outcome", ("event", "result")
+)
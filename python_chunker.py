@@ -0,0 +1,149 @@
+import ast
+from typing import Dict, List, Optional, Tuple
+
+SCOPE_NODES = (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)
+
+def _span(node: ast.AST) -> Tuple[int, int]:
+    """
+    1-based line span of a node, including its decorators.
+    """
+    start = min([node.lineno] + [dec.lineno for dec in getattr(node, 'decorator_list', [])])
+    return start, node.end_lineno
+
+class _ChunkVisitor(ast.NodeVisitor):
+    """
+    Builds the chunk hierarchy in a single pass. Only module and class bodies
+    are descended into; function bodies are kept whole inside their chunk, so
+    every node is looked at once at most.
+    """
+
+    def __init__(self, lines: List[str]):
+        self.lines = lines
+        self.parents: List[Optional[Dict]] = []  # chunk of each enclosing scope, None for non-chunk scopes
+        self.chunks: List[Dict] = []
+        self.import_spans: List[Tuple[int, int]] = []
+        self.global_spans: List[Tuple[int, int]] = []
+
+    def segment(self, start: int, end: int) -> str:
+        return "".join(self.lines[start - 1:end]).rstrip("\n")
+
+    def skeleton(self, start: int, end: int, elisions: List[Tuple[int, int, str]]) -> str:
+        """
+        Source of lines start..end with each (keep_through, body_end, indent)
+        method body replaced by a single `...` line.
+        """
+        parts = []
+        line = start
+        for keep_through, body_end, indent in elisions:
+            parts.append("".join(self.lines[line - 1:keep_through]))
+            parts.append(f"{indent}    ...\n")
+            line = body_end + 1
+        parts.append("".join(self.lines[line - 1:end]))
+        return "".join(parts).rstrip("\n")
+
+    def visit_Module(self, node: ast.Module):
+        for index, statement in enumerate(node.body):
+            if isinstance(statement, (ast.Import, ast.ImportFrom)):
+                self.import_spans.append(_span(statement))
+            elif isinstance(statement, SCOPE_NODES):
+                self.visit(statement)
+            elif index == 0 and isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Constant) \
+                    and isinstance(statement.value.value, str):
+                continue  # module docstring
+            else:
+                self.global_spans.append(_span(statement))
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        start, end = _span(node)
+        # A nested class is already part of its enclosing class chunk
+        chunk = None
+        if not self.parents:
+            chunk = {
+                "type": "class",
+                "name": node.name,
+                "code": self.segment(start, end),
+                "start_line": start,
+                "end_line": end,
+            }
+            self.chunks.append(chunk)
+        self.parents.append(chunk)
+        for statement in node.body:
+            if isinstance(statement, SCOPE_NODES):
+                self.visit(statement)
+        self.parents.pop()
+        if chunk is not None:
+            # Signatures, fields and docstrings only; method bodies are reviewed on their own
+            chunk["skeleton"] = self.skeleton(start, end, chunk.pop("_elisions", []))
+
+    def _visit_function(self, node):
+        start, end = _span(node)
+        if not self.parents:
+            self.chunks.append({
+                "type": "function",
+                "name": node.name,
+                "code": self.segment(start, end),
+                "start_line": start,
+                "end_line": end,
+            })
+            return
+        parent = self.parents[-1]
+        if parent is not None and parent["type"] == "class":
+            parent.setdefault("methods", []).append({
+                "type": "method",
+                "name": node.name,
+                "code": self.segment(start, end),
+                "start_line": start,
+                "end_line": end,
+            })
+            body = node.body
+            has_docstring = isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+                and isinstance(body[0].value.value, str)
+            keep_through = body[0].end_lineno if has_docstring else body[0].lineno - 1
+            if keep_through >= node.lineno and keep_through < end:
+                def_line = self.lines[node.lineno - 1]
+                indent = def_line[:len(def_line) - len(def_line.lstrip())]
+                parent.setdefault("_elisions", []).append((keep_through, end, indent))
+
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+
+    def grouped_chunk(self, chunk_type: str, spans: List[Tuple[int, int]]) -> Dict:
+        return {
+            "type": chunk_type,
+            "name": chunk_type,
+            "code": "\n".join(self.segment(start, end) for start, end in spans),
+            "start_line": spans[0][0],
+            "end_line": spans[-1][1],
+            "line_ranges": spans,
+        }
+
+def split_python_code(file_content: str) -> List[Dict]:
+    """
+    Split Python source into imports, top-level classes (with their methods),
+    top-level functions and remaining module-level code. Chunk code is sliced
+    from the original source, so comments and formatting are preserved, and
+    every chunk carries its 1-based start_line/end_line. Class chunks also
+    carry a `skeleton` with the method bodies elided.
+    """
+    try:
+        tree = ast.parse(file_content)
+    except SyntaxError:
+        # Fallback: review the file as a single block
+        return [{
+            "type": "code_block",
+            "name": "full_code",
+            "code": file_content,
+            "start_line": 1,
+            "end_line": max(len(file_content.splitlines()), 1),
+        }]
+
+    visitor = _ChunkVisitor(file_content.splitlines(keepends=True))
+    visitor.visit(tree)
+
+    chunks = []
+    if visitor.import_spans:
+        chunks.append(visitor.grouped_chunk("imports", visitor.import_spans))
+    chunks.extend(visitor.chunks)
+    if visitor.global_spans:
+        chunks.append(visitor.grouped_chunk("global_code", visitor.global_spans))
+    return chunks
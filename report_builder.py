@@ -0,0 +1,117 @@
+from typing import Dict, List
+
+# GitHub rejects issue and comment bodies longer than this many characters
+GITHUB_BODY_LIMIT = 65536
+# Room kept on every page for the continuation heading / footer
+PAGE_OVERHEAD = 200
+# GitHub rejects issue titles longer than this many characters
+GITHUB_TITLE_LIMIT = 256
+
+def review_title(commit_hash: str, authors: List[str], limit: int = GITHUB_TITLE_LIMIT) -> str:
+    """
+    Issue title for a review. A push by several authors names the first one
+    and counts the rest; the author part is cut short to fit the limit.
+    """
+    author = authors[0] if authors else "unknown"
+    others = f" and {len(authors) - 1} other{'s' if len(authors) > 2 else ''}" if len(authors) > 1 else ""
+    prefix, suffix = "Code Review: ", f"{others} - {commit_hash[:8]}"
+    room = limit - len(prefix) - len(suffix)
+    if len(author) > room:
+        author = author[:room - 3] + "..."
+    return f"{prefix}{author}{suffix}"
+
+def file_section(file_name: str, high_level_review: str, detailed_reviews: List[Dict]) -> str:
+    """
+    Markdown report section for one reviewed file.
+    """
+    parts = [
+        f"## File: {file_name}\n\n",
+        f"**High-Level Review:**\n\n{high_level_review}\n\n**Detailed Reviews:**\n\n",
+    ]
+    for review in detailed_reviews:
+        parts.append(f"**{review['type']}: {review['name']}**\n\n{review['review']}\n\n")
+        if review.get('findings'):
+            parts.append("**Static Checks:**\n\n")
+            for finding in review['findings']:
+                parts.append(f"- Line {finding['line']} [{finding['severity']}] `{finding['rule']}`: {finding['message']}\n")
+            parts.append("\n")
+        if review.get('method_reviews'):
+            parts.append("**Methods:**\n\n")
+            for method in review['method_reviews']:
+                parts.append(f"▸ {method['method']}:\n{method['review']}\n\n")
+    parts.append("\n---\n\n")
+    return "".join(parts)
+
+def unchanged_file_section(file_name: str) -> str:
+    return f"## File: {file_name}\n\n_No reviewable code changed in this commit._\n\n---\n\n"
+
+def _split_section(section: str, budget: int) -> List[str]:
+    """
+    Cut a section that is too long for one page at line boundaries. A cut
+    inside a code fence closes the fence and reopens it on the next piece.
+    """
+    if len(section) <= budget:
+        return [section]
+    pieces = []
+    current: List[str] = []
+    size = 0
+    fence = None  # opening line of the code fence we are inside, if any
+    for line in section.splitlines(keepends=True):
+        while len(line) > budget - 8:
+            # A single enormous line: hard-cut it
+            head, line = line[:budget - 8], line[budget - 8:]
+            if current:
+                pieces.append("".join(current))
+            pieces.append(head + "\n")
+            current, size = [], 0
+        if current and size + len(line) + 8 > budget:
+            if fence is not None:
+                current.append("```\n")
+            pieces.append("".join(current))
+            current = [fence] if fence is not None else []
+            size = sum(len(part) for part in current)
+        current.append(line)
+        size += len(line)
+        if line.lstrip().startswith("```"):
+            fence = None if fence is not None else line.lstrip()
+    if current:
+        pieces.append("".join(current))
+    return pieces
+
+class ReviewReport:
+    """
+    Collects a review report as a list of sections (never one growing
+    string) and lays it out as pages that each fit GitHub's body limit: the
+    first page is the issue body, the rest are posted as comments.
+    """
+
+    def __init__(self, title: str, header: str, limit: int = GITHUB_BODY_LIMIT):
+        self.title = title
+        self.header = header
+        self.limit = limit
+        self.sections: List[str] = []
+
+    def add_section(self, section: str):
+        self.sections.append(section)
+
+    def pages(self) -> List[str]:
+        budget = self.limit - PAGE_OVERHEAD
+        pages: List[List[str]] = [[self.header]]
+        size = len(self.header)
+        for section in self.sections:
+            for piece in _split_section(section, budget):
+                if size + len(piece) > budget:
+                    pages.append([])
+                    size = 0
+                pages[-1].append(piece)
+                size += len(piece)
+
+        total = len(pages)
+        bodies = []
+        for number, parts in enumerate(pages, start=1):
+            if number > 1:
+                parts.insert(0, f"**{self.title} (continued, part {number}/{total})**\n\n")
+            if number == 1 and total > 1:
+                parts.append(f"\n_Report continues in {total - 1} comment(s) below._\n")
+            bodies.append("".join(parts))
+        return bodies
@@ -0,0 +1,177 @@
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict
+
+import httpx
+
+# The personas reviews are run as; built once per backend and reused for every call
+AGENT_PROFILES = {
+    "high_level": {
+        "role": "Code Review Expert",
+        "goal": "Perform a concise high-level review of the entire codebase, highlighting only critical issues.",
+        "backstory": "You are an experienced software engineer with expertise in code reviews.",
+    },
+    "detailed": {
+        "role": "Code Enhancement Expert",
+        "goal": "Quickly identify and highlight code issues with specific, actionable suggestions.",
+        "backstory": "You are a code optimization specialist with a focus on improving code quality.",
+    },
+}
+
+def review_task(agent: str, description: str, expected_output: str) -> Dict:
+    """
+    A backend-independent review request for one of the AGENT_PROFILES.
+    Backends fill in task["usage"] with the call's token counts.
+    """
+    return {"agent": agent, "description": description, "expected_output": expected_output}
+
+class ReviewBackend(ABC):
+    """
+    Interface for the model backends that run review tasks.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def _record(self, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    @abstractmethod
+    async def review(self, task: Dict) -> str:
+        """
+        Run one review task and return the review text.
+        """
+
+    async def health(self) -> bool:
+        return True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+            }
+
+    async def aclose(self):
+        pass
+
+class OllamaBackend(ReviewBackend):
+    """
+    Native async backend talking to Ollama's /api/chat over one pooled
+    connection set. keep_alive keeps the model loaded between reviews and
+    num_ctx/num_predict bound the context and the answer length.
+    """
+
+    name = "ollama"
+
+    def __init__(
+        self,
+        base_url: str = "http://127.0.0.1:11434",
+        model: str = "codellama",
+        keep_alive: str = "30m",
+        num_ctx: int = 4096,
+        num_predict: int = 512,
+        temperature: float = 0.1,
+        timeout: float = 300.0,
+        max_connections: int = 16,
+    ):
+        super().__init__()
+        self.base_url = base_url.rstrip("/")
+        self.model = model.split("/", 1)[1] if model.startswith("ollama/") else model
+        self.keep_alive = keep_alive
+        self.options = {"num_ctx": num_ctx, "num_predict": num_predict, "temperature": temperature}
+        self.system_prompts = {
+            agent: f"You are a {profile['role']}. {profile['backstory']} Your goal: {profile['goal']}"
+            for agent, profile in AGENT_PROFILES.items()
+        }
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def review(self, task: Dict) -> str:
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": self.system_prompts[task["agent"]]},
+                {"role": "user", "content": f"{task['description']}\n\nExpected output: {task['expected_output']}"},
+            ],
+            "stream": False,
+            "keep_alive": self.keep_alive,
+            "options": self.options,
+        }
+        response = await self._client.post(f"{self.base_url}/api/chat", json=payload)
+        response.raise_for_status()
+        data = response.json()
+        task["usage"] = {"prompt_tokens": data.get("prompt_eval_count", 0), "completion_tokens": data.get("eval_count", 0)}
+        self._record(task["usage"]["prompt_tokens"], task["usage"]["completion_tokens"])
+        return data["message"]["content"]
+
+    async def health(self) -> bool:
+        try:
+            response = await self._client.get(f"{self.base_url}/api/tags", timeout=5.0)
+        except httpx.HTTPError:
+            return False
+        return response.status_code == 200
+
+    async def aclose(self):
+        await self._client.aclose()
+
+class CrewAIBackend(ReviewBackend):
+    """
+    Runs review tasks through CrewAI on a bounded thread pool. crewai is only
+    imported when this backend is selected.
+    """
+
+    name = "crewai"
+
+    def __init__(self, executor, model: str = "ollama/codellama",
+                 base_url: str = "http://127.0.0.1:11434/api/generate", verbose: bool = True):
+        super().__init__()
+        from crewai import Agent, LLM
+
+        self.executor = executor
+        self.verbose = verbose
+        llm = LLM(model=model, base_url=base_url)
+        self.agents = {
+            agent: Agent(tools=[], verbose=verbose, llm=llm, **profile)
+            for agent, profile in AGENT_PROFILES.items()
+        }
+
+    async def review(self, task: Dict) -> str:
+        from crewai import Crew, Task
+
+        agent = self.agents[task["agent"]]
+        crew = Crew(
+            agents=[agent],
+            tasks=[Task(description=task["description"], agent=agent, expected_output=task["expected_output"])],
+            verbose=self.verbose
+        )
+        result = await self.executor.run(crew.kickoff)
+        usage = getattr(result, "token_usage", None)
+        task["usage"] = {
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        }
+        self._record(task["usage"]["prompt_tokens"], task["usage"]["completion_tokens"])
+        return str(result)
+
+def create_review_backend(kind: str, executor=None, **options) -> ReviewBackend:
+    """
+    Build the backend named by `kind` ("ollama" or "crewai").
+    """
+    if kind == "ollama":
+        return OllamaBackend(**options)
+    if kind == "crewai":
+        return CrewAIBackend(executor, **options)
+    raise ValueError(f"Unknown review backend: {kind}")
@@ -0,0 +1,141 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+def review_cache_key(kind: str, language: str, code: str, prompt_version: str, model: str) -> str:
+    """
+    Content address of a review: identical code reviewed with the same prompt
+    and model always maps to the same key.
+    """
+    digest = hashlib.sha256()
+    for part in (kind, language, prompt_version, model, code):
+        digest.update(part.encode("utf-8", errors="replace"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class ReviewCache:
+    """
+    Persistent SQLite cache of LLM review outputs with size-bounded LRU
+    eviction. Safe to share between processes; the total size is kept by
+    triggers so eviction never scans the table.
+    """
+
+    def __init__(self, db_path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS reviews (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                language TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                model TEXT NOT NULL,
+                review TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_reviews_last_access ON reviews (last_access);
+            CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL);
+            INSERT OR IGNORE INTO cache_size (id, total) SELECT 0, COALESCE(SUM(size), 0) FROM reviews;
+            CREATE TRIGGER IF NOT EXISTS reviews_size_insert AFTER INSERT ON reviews
+            BEGIN UPDATE cache_size SET total = total + NEW.size WHERE id = 0; END;
+            CREATE TRIGGER IF NOT EXISTS reviews_size_delete AFTER DELETE ON reviews
+            BEGIN UPDATE cache_size SET total = total - OLD.size WHERE id = 0; END;
+        """)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT review FROM reviews WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE reviews SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, kind: str, language: str, prompt_version: str, model: str, review: str):
+        size = len(review.encode("utf-8", errors="replace"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO reviews "
+                    "(key, kind, language, prompt_version, model, review, size, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, kind, language, prompt_version, model, review, size, now, now),
+                )
+                evicted = self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self.evictions += evicted
+
+    def _evict(self) -> int:
+        evicted = 0
+        while True:
+            total = self._conn.execute("SELECT total FROM cache_size WHERE id = 0").fetchone()[0]
+            if total <= self.max_bytes:
+                return evicted
+            cursor = self._conn.execute(
+                "DELETE FROM reviews WHERE key IN (SELECT key FROM reviews ORDER BY last_access LIMIT 64)"
+            )
+            if cursor.rowcount == 0:
+                return evicted
+            evicted += cursor.rowcount
+
+    def invalidate(self, key: Optional[str] = None, model: Optional[str] = None,
+                   prompt_version: Optional[str] = None, language: Optional[str] = None) -> int:
+        """
+        Drop cached reviews. With no arguments everything is dropped; otherwise
+        only entries matching all the given fields. Returns the number removed.
+        """
+        conditions = []
+        params = []
+        for column, value in (("key", key), ("model", model), ("prompt_version", prompt_version), ("language", language)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        query = "DELETE FROM reviews"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+            removed = cursor.rowcount
+        logger.info(f"Invalidated {removed} cached reviews")
+        return removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+            total = self._conn.execute("SELECT total FROM cache_size WHERE id = 0").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
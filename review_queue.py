@@ -0,0 +1,316 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ReviewJobQueue:
+    """
+    Durable SQLite-backed queue of review jobs shared by the webhook and the workers.
+
+    Jobs are claimed with a lease: a worker that dies mid-review stops renewing
+    its lease and the job becomes claimable again once the lease expires.
+
+    Jobs carry the git ref they review. A newer job for the same (repo, ref)
+    can supersede the older ones: pending ones are parked as 'superseded' and
+    running ones get superseded_by set, which their worker polls for.
+
+    Jobs created from a webhook delivery record its X-GitHub-Delivery ID under
+    a unique index, so a redelivery (to any process, or after a restart)
+    returns the existing job instead of queueing a duplicate review.
+
+    Finished jobs (done, failed, superseded) are deleted retention_seconds
+    after their last update, checked every sweep_every claims. Keep the
+    retention above GitHub's redelivery window (3 days) or a late redelivery
+    is reviewed again.
+    """
+
+    def __init__(self, db_path: str, max_attempts: int = 3, retention_seconds: float = 7 * 24 * 3600,
+                 sweep_every: int = 1000):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_seconds
+        self.sweep_every = sweep_every
+        self._claims = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS review_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                repo_url TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                lease_owner TEXT,
+                lease_expires REAL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(review_jobs)")}
+        if "ref" not in columns:
+            self._conn.execute("ALTER TABLE review_jobs ADD COLUMN ref TEXT")
+        if "superseded_by" not in columns:
+            self._conn.execute("ALTER TABLE review_jobs ADD COLUMN superseded_by INTEGER")
+        if "delivery_id" not in columns:
+            self._conn.execute("ALTER TABLE review_jobs ADD COLUMN delivery_id TEXT")
+        if "progress" not in columns:
+            self._conn.execute("ALTER TABLE review_jobs ADD COLUMN progress TEXT")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_review_jobs_status ON review_jobs (status, available_at)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_review_jobs_ref ON review_jobs (repo_url, ref, status)"
+        )
+        self._conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_review_jobs_delivery ON review_jobs (delivery_id)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_review_jobs_updated ON review_jobs (status, updated_at)"
+        )
+
+    def enqueue(self, repo_url: str, payload: Dict, ref: Optional[str] = None, supersede: bool = False,
+                merge: Optional[Callable[[List[Dict], Dict], Dict]] = None,
+                delivery_id: Optional[str] = None) -> Tuple[int, bool]:
+        """
+        Add a job and return (its id, True). With supersede, unfinished jobs for
+        the same (repo_url, ref) are superseded by it in the same transaction;
+        merge(older payloads, payload) can fold their work into the new job first.
+
+        Idempotent on delivery_id: if a job was already created for it, nothing
+        changes and (that job's id, False) is returned.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if delivery_id:
+                    existing = self._conn.execute(
+                        "SELECT id FROM review_jobs WHERE delivery_id = ?", (delivery_id,)
+                    ).fetchone()
+                    if existing is not None:
+                        self._conn.execute("COMMIT")
+                        return existing["id"], False
+                older = []
+                if supersede and ref:
+                    older = self._conn.execute(
+                        "SELECT id, payload, status FROM review_jobs "
+                        "WHERE repo_url = ? AND ref = ? AND status IN ('pending', 'running') AND superseded_by IS NULL "
+                        "ORDER BY id",
+                        (repo_url, ref),
+                    ).fetchall()
+                    if older and merge is not None:
+                        payload = merge([json.loads(row["payload"]) for row in older], payload)
+                cursor = self._conn.execute(
+                    "INSERT INTO review_jobs (repo_url, ref, delivery_id, payload, available_at, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (repo_url, ref, delivery_id or None, json.dumps(payload), now, now, now),
+                )
+                job_id = cursor.lastrowid
+                for row in older:
+                    # Running jobs keep their status until their worker notices and cancels
+                    status = "superseded" if row["status"] == "pending" else row["status"]
+                    self._conn.execute(
+                        "UPDATE review_jobs SET status = ?, superseded_by = ?, updated_at = ? WHERE id = ?",
+                        (status, job_id, now, row["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if older:
+            logger.info(f"Job {job_id} supersedes jobs {[row['id'] for row in older]} for {repo_url} {ref}")
+        return job_id, True
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Dict]:
+        """
+        Atomically take the oldest runnable job, or return None when the queue is empty.
+        A running job whose lease has expired counts as runnable, unless it has
+        used up max_attempts (its worker keeps dying on it) and is parked as 'failed'.
+        """
+        self._claims += 1
+        if self.sweep_every and self._claims % self.sweep_every == 0:
+            self.purge(self.retention_seconds)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # A superseded job whose worker died is not worth reclaiming
+                self._conn.execute(
+                    "UPDATE review_jobs SET status = 'superseded', lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                    "WHERE status = 'running' AND lease_expires < ? AND superseded_by IS NOT NULL",
+                    (now, now),
+                )
+                crashed = self._conn.execute(
+                    "UPDATE review_jobs SET status = 'failed', lease_owner = NULL, lease_expires = NULL, "
+                    "last_error = 'Lease expired on the last attempt', updated_at = ? "
+                    "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+                    (now, now, self.max_attempts),
+                ).rowcount
+                row = self._conn.execute(
+                    "SELECT * FROM review_jobs "
+                    "WHERE (status = 'pending' AND available_at <= ?) "
+                    "OR (status = 'running' AND lease_expires < ?) "
+                    "ORDER BY id LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE review_jobs SET status = 'running', attempts = attempts + 1, "
+                    "lease_owner = ?, lease_expires = ?, updated_at = ? WHERE id = ?",
+                    (worker_id, now + lease_seconds, now, row["id"]),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if crashed:
+            logger.error(f"Parked {crashed} jobs as failed: their lease expired on the last attempt")
+        return {
+            "id": row["id"],
+            "repo_url": row["repo_url"],
+            "payload": json.loads(row["payload"]),
+            "attempts": row["attempts"] + 1,
+            "progress": json.loads(row["progress"]) if row["progress"] else {},
+        }
+
+    def renew(self, job_id: int, worker_id: str, lease_seconds: float) -> bool:
+        """
+        Extend the lease of a running job. Returns False if the lease was lost.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE review_jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'running' AND lease_owner = ?",
+                (now + lease_seconds, now, job_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def record_progress(self, job_id: int, worker_id: str, progress: Dict) -> bool:
+        """
+        Save what a running job has already done outside the queue (e.g. the
+        issue it opened), handed back by claim if the job is retried. Returns
+        False if the lease was lost.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE review_jobs SET progress = ?, updated_at = ? WHERE id = ? AND status = 'running' AND lease_owner = ?",
+                (json.dumps(progress), time.time(), job_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker_id: str, status: str = "done") -> bool:
+        """
+        Finish a job this worker holds. Returns False if the lease was lost
+        (the job was reclaimed by another worker) and nothing was changed.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE review_jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, "
+                "updated_at = ? WHERE id = ? AND status = 'running' AND lease_owner = ?",
+                (status, time.time(), job_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def superseded_by(self, job_id: int) -> Optional[int]:
+        """
+        Id of the newer job that replaces this one, if any.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT superseded_by FROM review_jobs WHERE id = ?", (job_id,)).fetchone()
+            return row["superseded_by"] if row is not None else None
+
+    def jobs_for_ref(self, repo_url: str, ref: str, limit: int = 20) -> List[Dict]:
+        """
+        Most recent jobs for a (repo_url, ref), newest first.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, status, attempts, superseded_by, last_error, created_at, updated_at "
+                "FROM review_jobs WHERE repo_url = ? AND ref = ? ORDER BY id DESC LIMIT ?",
+                (repo_url, ref, limit),
+            ).fetchall()
+            return [dict(row) for row in rows]
+
+    def fail(self, job_id: int, worker_id: str, error: str, retry_delay: float = 30.0) -> bool:
+        """
+        Record a failed attempt. The job is retried after retry_delay until
+        max_attempts is reached, then parked as 'failed'. Returns False if the
+        lease was lost and nothing was changed.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempts, superseded_by FROM review_jobs WHERE id = ? AND status = 'running' AND lease_owner = ?",
+                (job_id, worker_id),
+            ).fetchone()
+            if row is None:
+                return False
+            if row["superseded_by"] is not None:
+                status = "superseded"
+            else:
+                status = "failed" if row["attempts"] >= self.max_attempts else "pending"
+            self._conn.execute(
+                "UPDATE review_jobs SET status = ?, available_at = ?, last_error = ?, "
+                "lease_owner = NULL, lease_expires = NULL, updated_at = ? WHERE id = ?",
+                (status, now + retry_delay, error, now, job_id),
+            )
+        if status == "failed":
+            logger.error(f"Review job {job_id} failed permanently: {error}")
+        return True
+
+    def defer(self, job_id: int, worker_id: str, delay: float, reason: str = "") -> bool:
+        """
+        Put a job back without counting the attempt, e.g. when its repository
+        is not configured on this instance yet. Returns False if the lease was
+        lost and nothing was changed.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE review_jobs SET status = CASE WHEN superseded_by IS NULL THEN 'pending' ELSE 'superseded' END, "
+                "attempts = attempts - 1, available_at = ?, "
+                "last_error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND status = 'running' AND lease_owner = ?",
+                (now + delay, reason, now, job_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def purge(self, older_than: float) -> int:
+        """
+        Delete finished jobs last updated more than older_than seconds ago and
+        return how many were removed. Their delivery IDs go with them.
+        """
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM review_jobs WHERE status IN ('done', 'failed', 'superseded') AND updated_at < ?",
+                (time.time() - older_than,),
+            ).rowcount
+        if removed:
+            logger.info(f"Purged {removed} finished review jobs")
+        return removed
+
+    def depth(self) -> int:
+        """
+        Number of jobs waiting or running.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM review_jobs WHERE status IN ('pending', 'running')"
+            ).fetchone()
+            return row[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
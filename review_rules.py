@@ -0,0 +1,506 @@
+import ast
+import re
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import javalang
+
+# Registered checks per language; see rule()
+RULES: Dict[str, List[Dict]] = {"python": [], "java": []}
+
+# Statement shapes rather than bare keywords, so messages like "Create issue: {e}" do not match
+SQL_START = re.compile(
+    r"^\s*(SELECT\b.+\bFROM\b|INSERT\s+INTO\b|UPDATE\s+\S+\s+SET\b|DELETE\s+FROM\b|(REPLACE|MERGE)\s+INTO\b"
+    r"|(CREATE|DROP|ALTER|TRUNCATE)\s+(TABLE|INDEX|VIEW|DATABASE|SCHEMA)\b)",
+    re.IGNORECASE | re.DOTALL,
+)
+SECRET_NAME = re.compile(r"secret|passw(or)?d|passwd|token|api_?key|access_?key|private_?key|credential", re.IGNORECASE)
+# Names that mention a secret but hold something else (header names, env var names, paths...)
+NOT_SECRET_NAME = re.compile(r"(header|url|uri|name|path|file|env|var|field|prefix|pattern|type|format|len|length)s?$", re.IGNORECASE)
+ENV_NAME_VALUE = re.compile(r"^[A-Z][A-Z0-9_]*$")
+SECRET_VALUE = re.compile(
+    r"^(sk-[A-Za-z0-9_-]{8,}|gsk_[A-Za-z0-9]{20,}|gh[pousr]_[A-Za-z0-9]{20,}|AKIA[0-9A-Z]{16}|xox[abpr]-[A-Za-z0-9-]{10,}"
+    r"|-----BEGIN [A-Z ]*PRIVATE KEY-----)"
+)
+SHELL_CALLS = {("os", "system"), ("os", "popen"), ("commands", "getoutput")}
+SUBPROCESS_CALLS = {"run", "call", "check_call", "check_output", "Popen"}
+WEAK_HASHES = {"md5", "sha1"}
+JAVA_BINARY_OPERATORS = {"+", "-", "*", "/", "%"}
+# Most statements a function may have and still count as trivial
+TRIVIAL_MAX_STATEMENTS = 8
+
+def rule(language: str, name: str, severity: str, nodes: Tuple[type, ...]):
+    """
+    Register a check. Python checks are called with every AST node of one of
+    the `nodes` types; Java checks with (tokens, index) for every token of
+    one of those token classes. A check returns a message when it fires.
+    """
+    def register(check: Callable) -> Callable:
+        RULES[language].append({"name": name, "severity": severity, "nodes": nodes, "check": check})
+        return check
+    return register
+
+def _finding(found_rule: Dict, line: int, message: str) -> Dict:
+    return {"rule": found_rule["name"], "severity": found_rule["severity"], "line": line, "message": message}
+
+# --- Python rules
+
+def _dotted(node: ast.AST) -> Tuple[str, ...]:
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return tuple(reversed(parts))
+    return ()
+
+def _interpolated_text(node: ast.AST) -> Optional[str]:
+    """
+    Literal text of a string built by interpolation (f-string, %, + or
+    .format()), or None if the node is not such a string.
+    """
+    if isinstance(node, ast.JoinedStr):
+        if any(isinstance(value, ast.FormattedValue) for value in node.values):
+            return "".join(value.value for value in node.values if isinstance(value, ast.Constant))
+        return None
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Mod, ast.Add)):
+        left = node.left
+        while isinstance(left, ast.BinOp) and isinstance(left.op, ast.Add):
+            left = left.left
+        if isinstance(left, ast.Constant) and isinstance(left.value, str):
+            return left.value
+        return None
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "format" \
+            and isinstance(node.func.value, ast.Constant) and isinstance(node.func.value.value, str):
+        return node.func.value.value
+    return None
+
+def _looks_like_secret(name: str, value: object) -> bool:
+    if not isinstance(value, str):
+        return False
+    if SECRET_VALUE.match(value):
+        return True
+    return bool(SECRET_NAME.search(name)) and not NOT_SECRET_NAME.search(name) \
+        and len(value) >= 6 and " " not in value and not ENV_NAME_VALUE.match(value)
+
+@rule("python", "sql-interpolation", "H", (ast.JoinedStr, ast.BinOp, ast.Call))
+def _python_sql(node) -> Optional[str]:
+    text = _interpolated_text(node)
+    if text is not None and SQL_START.match(text):
+        return "SQL query built by string interpolation; pass the values as query parameters"
+    return None
+
+@rule("python", "hardcoded-secret", "H", (ast.Assign, ast.AnnAssign, ast.keyword))
+def _python_secret(node) -> Optional[str]:
+    if isinstance(node, ast.keyword):
+        names = [node.arg or ""]
+    elif isinstance(node, ast.Assign):
+        names = [".".join(_dotted(target)) for target in node.targets]
+    else:
+        names = [".".join(_dotted(node.target))]
+    value = node.value
+    if isinstance(value, ast.Constant) and any(_looks_like_secret(name.rsplit(".", 1)[-1], value.value) for name in names):
+        return "Secret hardcoded in source; load it from the environment or a secret store"
+    return None
+
+@rule("python", "shell-injection", "H", (ast.Call,))
+def _python_shell(node: ast.Call) -> Optional[str]:
+    if not node.args:
+        return None
+    name = _dotted(node.func)
+    command = node.args[0]
+    if name in SHELL_CALLS and _interpolated_text(command) is not None:
+        return f"Shell command built by string interpolation in {'.'.join(name)}(); use subprocess with an argument list"
+    if len(name) == 2 and name[0] == "subprocess" and name[1] in SUBPROCESS_CALLS:
+        shell = any(keyword.arg == "shell" and isinstance(keyword.value, ast.Constant) and keyword.value.value
+                    for keyword in node.keywords)
+        if shell and not isinstance(command, ast.Constant):
+            return "subprocess call with shell=True on a non-literal command; pass an argument list instead"
+    return None
+
+@rule("python", "eval-exec", "H", (ast.Call,))
+def _python_eval(node: ast.Call) -> Optional[str]:
+    if isinstance(node.func, ast.Name) and node.func.id in ("eval", "exec") and node.args \
+            and not isinstance(node.args[0], ast.Constant):
+        return f"{node.func.id}() on a dynamic value can run arbitrary code"
+    return None
+
+@rule("python", "weak-hash", "M", (ast.Call,))
+def _python_weak_hash(node: ast.Call) -> Optional[str]:
+    name = _dotted(node.func)
+    algorithm = None
+    if len(name) == 2 and name[0] == "hashlib" and name[1] in WEAK_HASHES:
+        algorithm = name[1]
+    elif name == ("hashlib", "new") and node.args and isinstance(node.args[0], ast.Constant) \
+            and str(node.args[0].value).lower() in WEAK_HASHES:
+        algorithm = node.args[0].value
+    if algorithm:
+        return f"{algorithm.upper()} is broken for security use; prefer SHA-256 (or a password hash for credentials)"
+    return None
+
+# --- Java rules
+
+def _closing_paren(tokens, index: int) -> int:
+    depth = 0
+    for j in range(index, len(tokens)):
+        if tokens[j].value == "(":
+            depth += 1
+        elif tokens[j].value == ")":
+            depth -= 1
+            if depth == 0:
+                return j
+    return len(tokens) - 1
+
+def _string_value(token) -> str:
+    return token.value[1:-1]
+
+@rule("java", "sql-interpolation", "H", (javalang.tokenizer.String,))
+def _java_sql(tokens, i: int) -> Optional[str]:
+    if not SQL_START.match(_string_value(tokens[i])):
+        return None
+    concatenated = i + 1 < len(tokens) and tokens[i + 1].value == "+"
+    formatted = i >= 2 and tokens[i - 1].value == "(" and tokens[i - 2].value == "format"
+    if concatenated or formatted:
+        return "SQL query built by string concatenation; use a PreparedStatement with parameters"
+    return None
+
+@rule("java", "hardcoded-secret", "H", (javalang.tokenizer.String,))
+def _java_secret(tokens, i: int) -> Optional[str]:
+    value = _string_value(tokens[i])
+    name = tokens[i - 2].value if i >= 2 and tokens[i - 1].value == "=" else ""
+    if SECRET_VALUE.match(value) or (name and _looks_like_secret(name, value)):
+        return "Secret hardcoded in source; load it from the environment or a secret store"
+    return None
+
+@rule("java", "shell-injection", "H", (javalang.tokenizer.Identifier,))
+def _java_shell(tokens, i: int) -> Optional[str]:
+    token = tokens[i]
+    is_exec = token.value == "exec" and i >= 1 and tokens[i - 1].value == "."
+    is_builder = token.value == "ProcessBuilder" and i >= 1 and tokens[i - 1].value == "new"
+    if not (is_exec or is_builder) or i + 1 >= len(tokens) or tokens[i + 1].value != "(":
+        return None
+    arguments = tokens[i + 1:_closing_paren(tokens, i + 1)]
+    if any(argument.value in ("+", "format") for argument in arguments):
+        return "Process command built by string concatenation; pass a fixed argument array"
+    return None
+
+@rule("java", "weak-hash", "M", (javalang.tokenizer.Identifier,))
+def _java_weak_hash(tokens, i: int) -> Optional[str]:
+    if tokens[i].value != "getInstance" or i < 2 or tokens[i - 2].value != "MessageDigest" or i + 2 >= len(tokens):
+        return None
+    argument = tokens[i + 2]
+    if isinstance(argument, javalang.tokenizer.String) and _string_value(argument).upper() in ("MD5", "MD2", "SHA1", "SHA-1"):
+        return f"{_string_value(argument)} is broken for security use; prefer SHA-256"
+    return None
+
+# --- Trivial code
+
+def _simple_expression(node: ast.AST) -> bool:
+    """
+    Names, constants, attribute reads and plain combinations of them
+    (operators, f-strings): no calls, subscripts or comprehensions.
+    """
+    if isinstance(node, (ast.Name, ast.Constant)):
+        return True
+    if isinstance(node, ast.Attribute):
+        return _simple_expression(node.value)
+    if isinstance(node, ast.UnaryOp):
+        return _simple_expression(node.operand)
+    if isinstance(node, ast.BinOp):
+        return _simple_expression(node.left) and _simple_expression(node.right)
+    if isinstance(node, ast.JoinedStr):
+        return all(isinstance(value, ast.Constant) or _simple_expression(value.value) for value in node.values)
+    if isinstance(node, ast.BoolOp):
+        return all(_simple_expression(value) for value in node.values)
+    if isinstance(node, ast.Compare):
+        return _simple_expression(node.left) and all(_simple_expression(value) for value in node.comparators)
+    if isinstance(node, ast.IfExp):
+        return _simple_expression(node.test) and _simple_expression(node.body) and _simple_expression(node.orelse)
+    if isinstance(node, (ast.Tuple, ast.List, ast.Set)):
+        return len(node.elts) <= TRIVIAL_MAX_STATEMENTS and all(_simple_expression(value) for value in node.elts)
+    return False
+
+def _simple_decorator(node: ast.AST) -> bool:
+    if isinstance(node, ast.Call):
+        return bool(_dotted(node.func)) and all(isinstance(arg, ast.Constant) for arg in node.args) \
+            and all(isinstance(keyword.value, ast.Constant) for keyword in node.keywords)
+    return bool(_dotted(node))
+
+def _is_docstring(statement: ast.stmt) -> bool:
+    return isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Constant) \
+        and isinstance(statement.value.value, str)
+
+def _simple_assignment(statement: ast.stmt) -> bool:
+    if isinstance(statement, ast.Assign):
+        return all(_dotted(target) for target in statement.targets) and _simple_expression(statement.value)
+    if isinstance(statement, ast.AnnAssign):
+        return bool(_dotted(statement.target)) and (statement.value is None or _simple_expression(statement.value))
+    return False
+
+def _trivial_function(node: ast.AST) -> bool:
+    """
+    Accessors and the like: a body that is only a docstring, pass/..., a
+    NotImplementedError, simple attribute assignments or one simple return.
+    """
+    if not all(_simple_decorator(decorator) for decorator in node.decorator_list):
+        return False
+    body = [statement for statement in node.body if not _is_docstring(statement)]
+    if len(body) > TRIVIAL_MAX_STATEMENTS:
+        return False
+    for position, statement in enumerate(body):
+        if isinstance(statement, ast.Pass) or (isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Constant)):
+            continue
+        if isinstance(statement, ast.Return):
+            if position != len(body) - 1 or (statement.value is not None and not _simple_expression(statement.value)):
+                return False
+            continue
+        if isinstance(statement, ast.Raise) and statement.exc is not None and \
+                _dotted(statement.exc.func if isinstance(statement.exc, ast.Call) else statement.exc) == ("NotImplementedError",):
+            continue
+        if not _simple_assignment(statement):
+            return False
+    return True
+
+def _trivial_class(node: ast.ClassDef) -> bool:
+    if not all(_simple_decorator(decorator) for decorator in node.decorator_list):
+        return False
+    for statement in node.body:
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            if not _trivial_function(statement):
+                return False
+        elif not (_is_docstring(statement) or isinstance(statement, ast.Pass) or _simple_assignment(statement)):
+            return False
+    return True
+
+def _java_statements(tokens) -> Optional[List[List]]:
+    """
+    Top-level statements of a method body given its tokens, or None if the
+    body has nested blocks.
+    """
+    statements = [[]]
+    for token in tokens:
+        if token.value in ("{", "}"):
+            return None
+        if token.value == ";":
+            statements.append([])
+        else:
+            statements[-1].append(token)
+    if statements[-1]:
+        return None
+    return statements[:-1]
+
+def _java_operand(tokens) -> bool:
+    values = [token.value for token in tokens]
+    if len(tokens) == 1:
+        return isinstance(tokens[0], (javalang.tokenizer.Identifier, javalang.tokenizer.Literal)) \
+            or values[0] in ("true", "false", "null", "this")
+    if len(tokens) == 2 and values[0] == "-":
+        return isinstance(tokens[1], javalang.tokenizer.Literal)
+    return len(tokens) == 3 and values[0] == "this" and values[1] == "." \
+        and isinstance(tokens[2], javalang.tokenizer.Identifier)
+
+def _java_expression(tokens) -> bool:
+    """
+    Simple operands joined by arithmetic or string concatenation.
+    """
+    operand = []
+    for token in tokens:
+        if token.value in JAVA_BINARY_OPERATORS and operand:
+            if not _java_operand(operand):
+                return False
+            operand = []
+        else:
+            operand.append(token)
+    return bool(operand) and _java_operand(operand)
+
+def _trivial_java_method(tokens) -> bool:
+    """
+    Getters, setters and constructors that only copy parameters into fields.
+    tokens cover the whole declaration, annotations included.
+    """
+    depth = 0
+    open_brace = None
+    for j, token in enumerate(tokens):
+        if token.value == "(":
+            depth += 1
+        elif token.value == ")":
+            depth -= 1
+        elif token.value == "{" and depth == 0:
+            open_brace = j
+            break
+    if open_brace is None or tokens[-1].value != "}":
+        return False
+    statements = _java_statements(tokens[open_brace + 1:-1])
+    if statements is None or len(statements) > TRIVIAL_MAX_STATEMENTS:
+        return False
+    for position, statement in enumerate(statements):
+        values = [token.value for token in statement]
+        if values and values[0] == "return":
+            if position != len(statements) - 1 or (len(values) > 1 and not _java_expression(statement[1:])):
+                return False
+        elif "=" in values:
+            split = values.index("=")
+            if split not in (1, 3) or not _java_operand(statement[:split]) or not _java_expression(statement[split + 1:]):
+                return False
+        else:
+            return False
+    return True
+
+def _trivial_java_type(tokens) -> bool:
+    """
+    A type whose tokens, once its methods are removed, are only declarations:
+    fields initialized (if at all) with literals and no blocks of code.
+    """
+    braces = parens = 0
+    for j, token in enumerate(tokens):
+        value = token.value
+        if value == "{":
+            braces += 1
+        elif value == "}":
+            braces -= 1
+        elif value == "(":
+            parens += 1
+        elif value == ")":
+            parens -= 1
+        elif braces >= 2:
+            return False
+        elif braces == 1 and parens == 0 and value == "=":
+            rest = tokens[j + 1:j + 4]
+            operand = rest[:2] if len(rest) > 1 and rest[0].value == "-" else rest[:1]
+            if not operand or not _java_operand(operand) or len(rest) <= len(operand) \
+                    or rest[len(operand)].value not in (";", ","):
+                return False
+    return True
+
+# --- Engine
+
+def _spans(item: Dict) -> List[Tuple[int, int]]:
+    return list(item.get("line_ranges") or [(item["start_line"], item["end_line"])])
+
+def _python_findings(tree: ast.AST, disabled) -> List[Dict]:
+    by_type: Dict[type, List[Dict]] = {}
+    for registered in RULES["python"]:
+        if registered["name"] in disabled:
+            continue
+        for node_type in registered["nodes"]:
+            by_type.setdefault(node_type, []).append(registered)
+    findings = []
+    for node in ast.walk(tree):
+        for registered in by_type.get(type(node), ()):
+            message = registered["check"](node)
+            if message:
+                findings.append(_finding(registered, getattr(node, "lineno", 0), message))
+    return findings
+
+def _java_findings(tokens, disabled) -> List[Dict]:
+    rules = [registered for registered in RULES["java"] if registered["name"] not in disabled]
+    by_type: Dict[type, List[Dict]] = {}
+    findings = []
+    for i, token in enumerate(tokens):
+        token_type = type(token)
+        if token_type not in by_type:
+            by_type[token_type] = [registered for registered in rules if isinstance(token, registered["nodes"])]
+        for registered in by_type[token_type]:
+            message = registered["check"](tokens, i)
+            if message:
+                findings.append(_finding(registered, token.position.line, message))
+    return findings
+
+def _python_trivial(tree: ast.Module, chunks: List[Dict]) -> Dict[Tuple, bool]:
+    scopes = {(node.name, node.end_lineno): node for node in tree.body if hasattr(node, "name")}
+    trivial = {}
+    for i, chunk in enumerate(chunks):
+        node = scopes.get((chunk["name"], chunk["end_line"]))
+        if chunk["type"] == "imports":
+            trivial[("chunk", i)] = True
+        elif chunk["type"] == "global_code":
+            lines = {line for start, end in _spans(chunk) for line in range(start, end + 1)}
+            statements = [statement for statement in tree.body if statement.lineno in lines]
+            trivial[("chunk", i)] = all(_is_docstring(statement) or _simple_assignment(statement) for statement in statements)
+        elif isinstance(node, ast.ClassDef):
+            trivial[("chunk", i)] = _trivial_class(node)
+            methods = {(method.name, method.end_lineno): method for method in node.body if hasattr(method, "name")}
+            for j, method in enumerate(chunk.get("methods") or []):
+                method_node = methods.get((method["name"], method["end_line"]))
+                trivial[("method", i, j)] = method_node is not None and not isinstance(method_node, ast.ClassDef) \
+                    and _trivial_function(method_node)
+        elif node is not None:
+            trivial[("chunk", i)] = _trivial_function(node)
+    return trivial
+
+def _java_trivial(tokens, chunks: List[Dict]) -> Dict[Tuple, bool]:
+    trivial = {}
+    token_lines = [token.position.line for token in tokens]
+
+    def tokens_between(start_line: int, end_line: int):
+        return tokens[bisect_left(token_lines, start_line):bisect_right(token_lines, end_line)]
+
+    for i, chunk in enumerate(chunks):
+        if chunk["type"] in ("package", "imports"):
+            trivial[("chunk", i)] = True
+            continue
+        methods = chunk.get("methods") or []
+        for j, method in enumerate(methods):
+            trivial[("method", i, j)] = _trivial_java_method(tokens_between(method["start_line"], method["end_line"]))
+        if chunk.get("skeleton") is not None and all(trivial[("method", i, j)] for j in range(len(methods))):
+            method_lines = {line for method in methods for line in range(method["start_line"], method["end_line"] + 1)}
+            own_tokens = [token for token in tokens_between(chunk["start_line"], chunk["end_line"])
+                          if token.position.line not in method_lines]
+            trivial[("chunk", i)] = _trivial_java_type(own_tokens)
+    return trivial
+
+def analyze_chunks(language: str, source: str, chunks: List[Dict], disabled: Iterable[str] = ()) -> Dict[Tuple, Dict]:
+    """
+    Run the static rules over a file, parsed once, and report per chunk key
+    (("chunk", i) or ("method", i, j), as used by pack_chunks) its findings
+    and whether it is trivial enough to skip the model review. Findings are
+    attached to the innermost chunk or method containing their line and carry
+    file line numbers; code with a finding is never trivial. Findings outside
+    the given chunks (e.g. unchanged code in diff mode) are dropped.
+    """
+    disabled = frozenset(disabled)
+    try:
+        if language == "python":
+            tree = ast.parse(source)
+            findings = _python_findings(tree, disabled)
+            trivial = _python_trivial(tree, chunks)
+        elif language == "java":
+            tokens = list(javalang.tokenizer.tokenize(source))
+            findings = _java_findings(tokens, disabled)
+            trivial = _java_trivial(tokens, chunks)
+        else:
+            return {}
+    except (SyntaxError, ValueError, javalang.tokenizer.LexerError):
+        # Unparseable files go to the model as they are
+        return {}
+
+    items = []
+    for i, chunk in enumerate(chunks):
+        items.append((("chunk", i), _spans(chunk)))
+        for j, method in enumerate(chunk.get("methods") or []):
+            items.append((("method", i, j), _spans(method)))
+    results = {key: {"trivial": trivial.get(key, False), "findings": []} for key, _ in items}
+
+    seen = set()
+    for finding in sorted(findings, key=lambda finding: finding["line"]):
+        if (finding["rule"], finding["line"]) in seen:
+            continue
+        seen.add((finding["rule"], finding["line"]))
+        containing = [
+            (end - start, key) for key, spans in items for start, end in spans if start <= finding["line"] <= end
+        ]
+        if not containing:
+            continue
+        key = min(containing)[1]
+        results[key]["findings"].append(finding)
+        # The enclosing class (and its skeleton review) is not trivial either
+        for outer, spans in items:
+            if any(start <= finding["line"] <= end for start, end in spans):
+                results[outer]["trivial"] = False
+    return results
+
+def format_findings(findings: List[Dict]) -> str:
+    return "\n".join(
+        f"- line {finding['line']} [{finding['severity']}] {finding['rule']}: {finding['message']}" for finding in findings
+    )
@@ -0,0 +1,478 @@
+import importlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from diff_ranges import hunk_spans
+from java_chunker import brace_skeleton
+
+logger = logging.getLogger(__name__)
+
+try:
+    from tree_sitter import Language, Parser
+    TREE_SITTER_AVAILABLE = True
+except ImportError:
+    TREE_SITTER_AVAILABLE = False
+
+# Grammar name -> (grammar package, function returning the language pointer)
+GRAMMAR_MODULES = {
+    "python": ("tree_sitter_python", "language"),
+    "java": ("tree_sitter_java", "language"),
+    "javascript": ("tree_sitter_javascript", "language"),
+    "typescript": ("tree_sitter_typescript", "language_typescript"),
+    "tsx": ("tree_sitter_typescript", "language_tsx"),
+}
+EXTENSION_GRAMMARS = {
+    ".py": "python",
+    ".java": "java",
+    ".js": "javascript",
+    ".jsx": "javascript",
+    ".mjs": "javascript",
+    ".cjs": "javascript",
+    ".ts": "typescript",
+    ".tsx": "tsx",
+}
+# Language name used in prompts, metrics and review rules
+GRAMMAR_LANGUAGES = {"tsx": "typescript"}
+
+PYTHON_IMPORTS = ("import_statement", "import_from_statement", "future_import_statement")
+JAVA_TYPES = {
+    "class_declaration": "class",
+    "interface_declaration": "interface",
+    "enum_declaration": "enum",
+    "record_declaration": "record",
+    "annotation_type_declaration": "annotation",
+}
+JAVA_METHODS = ("method_declaration", "constructor_declaration", "compact_constructor_declaration")
+JS_CLASSES = ("class_declaration", "abstract_class_declaration")
+JS_FUNCTIONS = ("function_declaration", "generator_function_declaration")
+JS_FUNCTION_VALUES = ("arrow_function", "function_expression", "function", "generator_function")
+JS_FIELDS = ("field_definition", "public_field_definition")
+TS_TYPES = {"interface_declaration": "interface", "type_alias_declaration": "type", "enum_declaration": "enum"}
+
+def _load_grammars() -> Dict[str, "Language"]:
+    """
+    Grammars whose packages are installed; a missing one only disables its
+    file types.
+    """
+    grammars = {}
+    if not TREE_SITTER_AVAILABLE:
+        return grammars
+    for name, (module_name, function) in GRAMMAR_MODULES.items():
+        try:
+            grammars[name] = Language(getattr(importlib.import_module(module_name), function)())
+        except (ImportError, AttributeError, TypeError, ValueError) as e:
+            logger.info(f"tree-sitter grammar {name} unavailable: {e}")
+    return grammars
+
+GRAMMARS = _load_grammars()
+
+def _new_parser(language) -> "Parser":
+    try:
+        return Parser(language)
+    except TypeError:
+        # py-tree-sitter before 0.22 takes the language afterwards
+        parser = Parser()
+        parser.set_language(language)
+        return parser
+
+def _point(data: bytes, offset: int) -> Tuple[int, int]:
+    """
+    (row, byte column) of a byte offset, as tree-sitter counts them.
+    """
+    return data.count(b"\n", 0, offset), offset - (data.rfind(b"\n", 0, offset) + 1)
+
+def _line_offsets(data: bytes) -> List[int]:
+    """
+    Byte offset of the start of every line, plus the end of the data.
+    """
+    offsets = [0]
+    position = data.find(b"\n")
+    while position != -1:
+        offsets.append(position + 1)
+        position = data.find(b"\n", position + 1)
+    if offsets[-1] != len(data):
+        offsets.append(len(data))
+    return offsets
+
+def _common_prefix(old: bytes, new: bytes) -> int:
+    old_view, new_view = memoryview(old), memoryview(new)
+    low, high = 0, min(len(old), len(new))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old_view[:middle] == new_view[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def _common_suffix(old: bytes, new: bytes, limit: int) -> int:
+    old_view, new_view = memoryview(old), memoryview(new)
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old_view[len(old) - middle:] == new_view[len(new) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def diff_edit(old: bytes, new: bytes) -> Tuple:
+    """
+    A single tree edit covering everything between the common prefix and
+    suffix of old and new.
+    """
+    prefix = _common_prefix(old, new)
+    suffix = _common_suffix(old, new, min(len(old), len(new)) - prefix)
+    old_end, new_end = len(old) - suffix, len(new) - suffix
+    return prefix, old_end, new_end, _point(old, prefix), _point(old, old_end), _point(new, new_end)
+
+def hunk_edits(old: bytes, new: bytes, patch: str) -> Optional[List[Tuple]]:
+    """
+    Tree edits for the hunks of a unified diff from old to new, last hunk
+    first so each one's positions are still valid when it is applied. None
+    when the patch does not describe old -> new exactly (a truncated patch,
+    a different base, a missing final newline), checked by comparing every
+    unchanged stretch between hunks.
+    """
+    spans = hunk_spans(patch)
+    if not spans:
+        return None
+    old_offsets, new_offsets = _line_offsets(old), _line_offsets(new)
+    regions = []
+    for old_start, old_count, new_start, new_count in spans:
+        # A zero-count side names the line before the change point
+        old_line = old_start - 1 if old_count else old_start
+        new_line = new_start - 1 if new_count else new_start
+        if old_line + old_count >= len(old_offsets) or new_line + new_count >= len(new_offsets):
+            return None
+        regions.append((old_offsets[old_line], old_offsets[old_line + old_count],
+                        new_offsets[new_line], new_offsets[new_line + new_count]))
+    old_position = new_position = 0
+    for old_begin, old_end, new_begin, new_end in regions + [(len(old), len(old), len(new), len(new))]:
+        if old_begin < old_position or old[old_position:old_begin] != new[new_position:new_begin]:
+            return None
+        old_position, new_position = old_end, new_end
+    edits = []
+    for old_begin, old_end, new_begin, new_end in reversed(regions):
+        # Regions start at a line start, so only the end column can be non-zero
+        start_row = _point(old, old_begin)[0]
+        new_end_row, new_end_column = _point(new, new_end)
+        edits.append((
+            old_begin, old_end, old_begin + (new_end - new_begin),
+            (start_row, 0), _point(old, old_end),
+            (start_row + new_end_row - _point(new, new_begin)[0], new_end_column),
+        ))
+    return edits
+
+class _ChunkBuilder:
+    """
+    Maps a syntax tree onto the chunk dicts the Python and Java chunkers
+    produce: imports and global code grouped with their line_ranges, classes
+    with their methods and a skeleton, functions and other definitions.
+    """
+
+    def __init__(self, source: bytes):
+        self.source = source
+        self.lines = source.decode("utf-8", errors="replace").split("\n")
+        self.chunks: List[Dict] = []
+        self.import_spans: List[Tuple[int, int]] = []
+        self.global_spans: List[Tuple[int, int]] = []
+
+    def text(self, node) -> str:
+        return self.source[node.start_byte:node.end_byte].decode("utf-8", errors="replace")
+
+    def span(self, node) -> Tuple[int, int]:
+        """
+        1-based first and last line of a node.
+        """
+        start = node.start_point[0] + 1
+        end_row, end_column = node.end_point
+        return start, max(end_row + 1 if end_column else end_row, start)
+
+    def segment(self, start: int, end: int) -> str:
+        return "\n".join(self.lines[start - 1:end])
+
+    def chunk(self, chunk_type: str, name: str, node) -> Dict:
+        start, end = self.span(node)
+        return {"type": chunk_type, "name": name, "code": self.segment(start, end), "start_line": start, "end_line": end}
+
+    def grouped_chunk(self, chunk_type: str, spans: List[Tuple[int, int]]) -> Dict:
+        return {
+            "type": chunk_type,
+            "name": chunk_type,
+            "code": "\n".join(self.segment(start, end) for start, end in spans),
+            "start_line": spans[0][0],
+            "end_line": spans[-1][1],
+            "line_ranges": spans,
+        }
+
+    def result(self) -> List[Dict]:
+        chunks = []
+        if self.import_spans:
+            chunks.append(self.grouped_chunk("imports", self.import_spans))
+        chunks.extend(self.chunks)
+        if self.global_spans:
+            chunks.append(self.grouped_chunk("global_code", self.global_spans))
+        return chunks
+
+    # Python
+
+    def python(self, root) -> List[Dict]:
+        first = True
+        for node in root.named_children:
+            if node.type == "comment":
+                continue
+            definition = node.child_by_field_name("definition") if node.type == "decorated_definition" else node
+            if node.type in PYTHON_IMPORTS:
+                self.import_spans.append(self.span(node))
+            elif definition is not None and definition.type == "class_definition":
+                self.chunks.append(self.python_class(node, definition))
+            elif definition is not None and definition.type == "function_definition":
+                self.chunks.append(self.chunk("function", self.text(definition.child_by_field_name("name")), node))
+            elif first and node.type == "expression_statement" and node.named_children[0].type == "string":
+                pass  # module docstring
+            else:
+                self.global_spans.append(self.span(node))
+            first = False
+        return self.result()
+
+    def python_class(self, outer, node) -> Dict:
+        chunk = self.chunk("class", self.text(node.child_by_field_name("name")), outer)
+        methods = []
+        elisions = []
+        for statement in node.child_by_field_name("body").named_children:
+            function = statement.child_by_field_name("definition") if statement.type == "decorated_definition" else statement
+            if function is None or function.type != "function_definition":
+                continue
+            start, end = self.span(statement)
+            methods.append(self.chunk("method", self.text(function.child_by_field_name("name")), statement))
+            body = [child for child in function.child_by_field_name("body").named_children if child.type != "comment"]
+            if not body:
+                continue
+            has_docstring = body[0].type == "expression_statement" and body[0].named_children[0].type == "string"
+            keep_through = self.span(body[0])[1] if has_docstring else body[0].start_point[0]
+            def_line = function.start_point[0] + 1
+            if def_line <= keep_through < end:
+                indent = self.lines[def_line - 1][:len(self.lines[def_line - 1]) - len(self.lines[def_line - 1].lstrip())]
+                elisions.append((keep_through, end, indent))
+        if methods:
+            chunk["methods"] = methods
+        # Signatures, fields and docstrings only; method bodies are reviewed on their own
+        parts = []
+        line = chunk["start_line"]
+        for keep_through, body_end, indent in elisions:
+            parts.extend(self.lines[line - 1:keep_through])
+            parts.append(f"{indent}    ...")
+            line = body_end + 1
+        parts.extend(self.lines[line - 1:chunk["end_line"]])
+        chunk["skeleton"] = "\n".join(parts)
+        return chunk
+
+    # Java
+
+    def java(self, root) -> List[Dict]:
+        for node in root.named_children:
+            if node.type == "package_declaration":
+                self.chunks.append(self.chunk("package", "package", node))
+            elif node.type == "import_declaration":
+                self.import_spans.append(self.span(node))
+            elif node.type in JAVA_TYPES:
+                self.chunks.extend(self.java_type(node))
+        # Package first, then imports, then the types
+        packages = [chunk for chunk in self.chunks if chunk["type"] == "package"]
+        types = [chunk for chunk in self.chunks if chunk["type"] != "package"]
+        return packages + ([self.grouped_chunk("imports", self.import_spans)] if self.import_spans else []) + types
+
+    def java_type(self, node, prefix: str = "") -> List[Dict]:
+        name = prefix + self.text(node.child_by_field_name("name"))
+        body = node.child_by_field_name("body")
+        members = []
+        for child in body.named_children:
+            members.extend(child.named_children if child.type == "enum_body_declarations" else [child])
+        methods = []
+        nested = []
+        bodies = []
+        for member in members:
+            member_body = member.child_by_field_name("body")
+            if member.type in JAVA_METHODS and member_body is not None:
+                methods.append(self.chunk("method", self.text(member.child_by_field_name("name")), member))
+                bodies.append(self.span(member_body))
+            elif member.type in JAVA_TYPES:
+                nested.append(member)
+                bodies.append(self.span(member_body))
+        chunk = self.chunk(JAVA_TYPES[node.type], name, node)
+        chunk["methods"] = methods
+        # Fields and signatures only; method and nested type bodies are reviewed on their own
+        chunk["skeleton"] = brace_skeleton(self.lines, chunk["start_line"], chunk["end_line"], bodies)
+        chunks = [chunk]
+        for member in nested:
+            chunks.extend(self.java_type(member, prefix=name + "."))
+        return chunks
+
+    # JavaScript and TypeScript
+
+    def javascript(self, root) -> List[Dict]:
+        for node in root.named_children:
+            if node.type in ("comment", "hash_bang_line"):
+                continue
+            if node.type == "import_statement":
+                self.import_spans.append(self.span(node))
+                continue
+            # `export` is kept in the chunk's code; the declaration decides its kind
+            declaration = node.child_by_field_name("declaration") if node.type == "export_statement" else node
+            chunk = self.javascript_definition(node, declaration) if declaration is not None else None
+            if chunk is not None:
+                self.chunks.append(chunk)
+            else:
+                self.global_spans.append(self.span(node))
+        return self.result()
+
+    def javascript_definition(self, outer, node) -> Optional[Dict]:
+        name = node.child_by_field_name("name")
+        if node.type in JS_CLASSES and name is not None:
+            return self.javascript_class(outer, node)
+        if node.type in JS_FUNCTIONS and name is not None:
+            return self.chunk("function", self.text(name), outer)
+        if node.type in TS_TYPES and name is not None:
+            return self.chunk(TS_TYPES[node.type], self.text(name), outer)
+        if node.type in ("lexical_declaration", "variable_declaration"):
+            declarators = [child for child in node.named_children if child.type == "variable_declarator"]
+            if len(declarators) == 1:
+                value = declarators[0].child_by_field_name("value")
+                if value is not None and value.type in JS_FUNCTION_VALUES:
+                    return self.chunk("function", self.text(declarators[0].child_by_field_name("name")), outer)
+        return None
+
+    def javascript_class(self, outer, node) -> Dict:
+        chunk = self.chunk("class", self.text(node.child_by_field_name("name")), outer)
+        methods = []
+        bodies = []
+        for member in node.child_by_field_name("body").named_children:
+            if member.type == "method_definition":
+                name, body = member.child_by_field_name("name"), member.child_by_field_name("body")
+            elif member.type in JS_FIELDS:
+                # Arrow-function fields are methods bound to the instance
+                value = member.child_by_field_name("value")
+                if value is None or value.type not in JS_FUNCTION_VALUES:
+                    continue
+                name = member.child_by_field_name("property") or member.child_by_field_name("name")
+                body = value.child_by_field_name("body")
+            else:
+                continue
+            if name is None or body is None:
+                continue  # abstract and overload signatures
+            methods.append(self.chunk("method", self.text(name), member))
+            if body.type == "statement_block":
+                bodies.append(self.span(body))
+        chunk["methods"] = methods
+        chunk["skeleton"] = brace_skeleton(self.lines, chunk["start_line"], chunk["end_line"], bodies)
+        return chunk
+
+    def build(self, grammar: str, root) -> List[Dict]:
+        if grammar == "python":
+            return self.python(root)
+        if grammar == "java":
+            return self.java(root)
+        return self.javascript(root)
+
+class TreeSitterChunker:
+    """
+    Chunks Python, Java, JavaScript and TypeScript with tree-sitter grammars
+    into the same chunk dicts as split_python_code / split_java_code.
+
+    The last syntax tree of each (repo, path) is kept (LRU, max_trees), so the
+    next version of a file is parsed incrementally: the old tree is edited
+    with the diff hunks when the file's patch against the remembered commit is
+    known, otherwise with one edit spanning the changed bytes, and
+    tree-sitter reuses every subtree outside the edits.
+
+    Each grammar has its own parser and lock, held while a file is parsed and
+    its tree walked (parsers are not thread-safe, and a cached tree is edited
+    in place), so files of different languages are chunked in parallel; the
+    tree cache has a lock of its own. split is blocking: call it from a thread.
+    """
+
+    def __init__(self, max_trees: int = 256):
+        self.max_trees = max_trees
+        self._parsers = {name: _new_parser(language) for name, language in GRAMMARS.items()}
+        self._grammar_locks = {name: threading.Lock() for name in self._parsers}
+        self._trees: "OrderedDict[Tuple, Tuple]" = OrderedDict()  # key -> (grammar, commit, source, tree)
+        self._lock = threading.Lock()
+        self._counts = {"full": 0, "incremental_hunks": 0, "incremental_diff": 0, "unchanged": 0}
+
+    def grammar_for(self, path: str) -> Optional[str]:
+        grammar = EXTENSION_GRAMMARS.get(os.path.splitext(path)[1].lower())
+        return grammar if grammar in self._parsers else None
+
+    def language_for(self, path: str) -> Optional[str]:
+        grammar = self.grammar_for(path)
+        return GRAMMAR_LANGUAGES.get(grammar, grammar)
+
+    def extensions(self) -> Tuple[str, ...]:
+        return tuple(extension for extension, grammar in EXTENSION_GRAMMARS.items() if grammar in self._parsers)
+
+    def _parse(self, grammar: str, source: bytes, key, commit: Optional[str], base_commit: Optional[str], patch: Optional[str]):
+        """
+        Parse source, reusing key's cached tree. The caller holds the grammar's lock.
+        """
+        with self._lock:
+            # Taken out while it is edited, so a failed parse never leaves an edited tree cached
+            previous = self._trees.pop(key, None) if key is not None else None
+        if previous is not None and previous[0] == grammar and previous[2] == source:
+            count = "unchanged"
+            tree = previous[3]
+        elif previous is not None and previous[0] == grammar:
+            _, previous_commit, old_source, tree = previous
+            edits = None
+            if patch and base_commit and previous_commit == base_commit:
+                edits = hunk_edits(old_source, source, patch)
+            count = "incremental_hunks" if edits else "incremental_diff"
+            for start_byte, old_end_byte, new_end_byte, start_point, old_end_point, new_end_point in edits or [diff_edit(old_source, source)]:
+                tree.edit(
+                    start_byte=start_byte, old_end_byte=old_end_byte, new_end_byte=new_end_byte,
+                    start_point=start_point, old_end_point=old_end_point, new_end_point=new_end_point,
+                )
+            tree = self._parsers[grammar].parse(source, tree)
+        else:
+            count = "full"
+            tree = self._parsers[grammar].parse(source)
+        with self._lock:
+            self._counts[count] += 1
+            if key is not None:
+                self._trees[key] = (grammar, commit, source, tree)
+                while len(self._trees) > self.max_trees:
+                    self._trees.popitem(last=False)
+        return tree
+
+    def split(self, path: str, file_content: str, key=None, commit: Optional[str] = None,
+              base_commit: Optional[str] = None, patch: Optional[str] = None) -> List[Dict]:
+        """
+        Chunk file_content, a version of path. key (e.g. (repo, path)) names
+        the file across versions for incremental reparsing; commit is this
+        version's commit, and patch its unified diff from base_commit. A file
+        with syntax errors is returned as a single code_block, as the Python
+        chunker does.
+        """
+        grammar = self.grammar_for(path)
+        if grammar is None:
+            raise ValueError(f"No tree-sitter grammar for {path}")
+        source = file_content.encode("utf-8")
+        with self._grammar_locks[grammar]:
+            tree = self._parse(grammar, source, key, commit, base_commit, patch)
+            if not tree.root_node.has_error:
+                return _ChunkBuilder(source).build(grammar, tree.root_node)
+        logger.warning(f"tree-sitter found syntax errors in {path}; reviewing it as a single block")
+        return [{
+            "type": "code_block",
+            "name": "full_code",
+            "code": file_content,
+            "start_line": 1,
+            "end_line": max(len(file_content.splitlines()), 1),
+        }]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"grammars": sorted(self._parsers), "trees": len(self._trees), "max_trees": self.max_trees, "parses": dict(self._counts)}
@@ -0,0 +1,37 @@
+import json
+from typing import Dict
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+def loads(body: bytes):
+    """
+    Parse a JSON request body, with orjson when it is installed.
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.loads(body)
+    return json.loads(body)
+
+def push_job_from_payload(payload: Dict, repo_url: str) -> Dict:
+    """
+    Keep only what a review job needs from a push event payload.
+    """
+    return {
+        "repo_url": repo_url,
+        "ref": payload.get("ref", ""),
+        "before": payload.get("before", ""),
+        "after": payload.get("after", ""),
+        "commits": [
+            {
+                "id": commit.get("id", ""),
+                "author": (commit.get("author") or {}).get("name", "Unknown Author"),
+                "added": commit.get("added", []),
+                "modified": commit.get("modified", []),
+                "removed": commit.get("removed", []),
+            }
+            for commit in payload.get("commits") or []
+        ],
+    }
@@ -0,0 +1,39 @@
+"""
+Standalone review worker.
+
+Drains the SQLite review queue written by the `/webhook/` endpoint so reviews
+can be scaled independently of the web process:
+
+    REVIEW_QUEUE_DB=review_jobs.db CONFIG_STORE_URL=sqlite:///webhook_configs.db python worker.py --workers 4
+
+Repository configurations are read from the same config store as the web
+process. Run the web app with IN_PROCESS_WORKERS=0 when all reviews should
+happen here. With --metrics-port, this process's Prometheus metrics are
+served on /metrics. Metrics are kept per process, so give each worker
+process its own port and scrape them all; the web app only serves /metrics
+when it runs as a single process (see WEB_METRICS in app.py).
+"""
+import argparse
+import asyncio
+
+from app import prometheus_metrics, run_workers
+
+async def main(workers: int, metrics_port: int):
+    if not metrics_port:
+        await run_workers(workers)
+        return
+
+    import uvicorn
+    from fastapi import FastAPI
+
+    metrics_app = FastAPI()
+    metrics_app.get("/metrics")(prometheus_metrics)
+    server = uvicorn.Server(uvicorn.Config(metrics_app, host="0.0.0.0", port=metrics_port, log_level="warning"))
+    await asyncio.gather(run_workers(workers), server.serve())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drain the code review job queue")
+    parser.add_argument("--workers", type=int, default=1, help="Concurrent jobs handled by this process")
+    parser.add_argument("--metrics-port", type=int, default=0, help="Serve Prometheus metrics on this port (0 = off)")
+    args = parser.parse_args()
+    asyncio.run(main(args.workers, args.metrics_port))